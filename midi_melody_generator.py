@@ -0,0 +1,7327 @@
+import bisect
+import collections
+import copy
+import functools
+import hashlib
+import io
+import itertools
+import json
+import math
+import queue
+import re
+import struct
+import threading
+import time
+import os
+import sys
+from array import array
+from contextlib import closing
+from enum import Enum
+import random
+from pathlib import Path
+
+# mido, multiprocessing, sqlite3 and tracemalloc are imported inside the functions that use them, so commands that do
+# not need them start faster
+
+'''
+
+MIDI Melody Generator - A program that just generates the midi file for a melody
+
+Whole note: 4 beats
+Half note: 2 beats
+Quarter note: 1 beat
+Eighth note: 0.5 beats
+Sixteenth note: 0.25 beats
+Thirty-second note: 0.125 beats
+And so on...
+
+'''
+
+# region constants
+
+SEED_MOD_ADD_RANDOM_KEYS = 296847654
+SEED_MOD_GENERATE_MELODY_RUN_COMMANDS = 836501245
+SEED_MOD_GENERATE_TIME_PATTERN_COMMAND = 481726453
+SEED_MOD_GENERATE_DIRECTION_PATTERN_COMMAND = 573920184
+
+# number of beats every generated melody is filled to
+MELODY_BEAT_COUNT = 8
+
+# default most loop steps (notes planned, pattern values rolled) a job can take before it is stopped
+MELODY_STEP_BUDGET = 200000
+
+
+# endregion
+
+
+# region Data-types
+
+
+class Pattern:
+    def __init__(self, name, time_signature, p_note_times):
+        """
+        name: string\n
+        time_signature: string\n
+        p_note_times: PNT[]
+        """
+        self.name = name
+        self.time_signature = time_signature
+        self.p_note_times = p_note_times
+
+    def __str__(self):
+        pnt_str = ", ".join(str(pnt) for pnt in self.p_note_times)
+        return f"Pattern(name={self.name}, time_signature={self.time_signature}, p_note_times=[{pnt_str}])"
+
+
+# PNT for Pattern Note Time
+class PNT:
+    def __init__(self, play_time, rest_time):
+        """
+        play_time: float - Time in beats\n
+        rest_time: float - Time in beats
+        """
+        self.play_time = play_time
+        self.rest_time = rest_time
+
+    def __str__(self):
+        return f"({self.play_time}, {self.rest_time})"
+
+
+class ScaleDefinition:
+    def __init__(self, intervals):
+        """
+        intervals: int[] the pitch changes that happen in a scale
+        """
+        self.intervals = intervals
+
+
+class Key(Enum):
+    A = 1
+    ASharp = 2
+    B = 3
+    C = 4
+    CSharp = 5
+    D = 6
+    DSharp = 7
+    E = 8
+    F = 9
+    FSharp = 10
+    G = 11
+    GSharp = 12
+
+
+class Note:
+    def __init__(self, octave, key, beats, after_wait_beats):
+        """
+        octave: int\n
+        key: Key\n
+        beats: float - time in beats\n
+        after_wait_beats: float - time in beats
+        """
+        self.octave = octave
+        self.key = key
+        self.beats = beats
+        self.after_wait_beats = after_wait_beats
+
+    def __str__(self):
+        return f"Octave {self.octave}, Key {self.key}, Beats {self.beats}, After_wait_beats {self.after_wait_beats}"
+
+
+class TimeSignature(Enum):
+    FourFour = (4, 4)
+    ThreeFour = (3, 4)
+    SixEight = (6, 8)
+
+
+class Melody:
+    def __init__(self, tempo=120):
+        """
+        notes: Note[]\n
+        key_signature: Key\n
+        time_signature: (int,int)\n
+        tempo: int\n
+        beat_count: float - length of the melody in beats, the MIDI file is cut off or filled up to it
+        """
+        self.notes = []
+        self.key_signature = Key.C
+        self.time_signature = (4, 4)
+        self.tempo = tempo
+        self.beat_count = MELODY_BEAT_COUNT
+
+
+class PitchPattern:
+    def __init__(self, name, pitch_changes):
+        """
+        name: string\n
+        pitch_changes: int[]
+        """
+        self.name = name  # string
+        self.pitch_changes = pitch_changes  # integer list
+
+    def __str__(self):
+        pitch_changes_str = ', '.join(map(str, self.pitch_changes))
+        return f"name {self.name}, pitch_changes [{pitch_changes_str}]"
+
+
+class DirectionPattern:
+    def __init__(self, name, direction_changes):
+        """
+        name: string\n
+        direction_changes: int[]
+        """
+        self.name = name  # string
+        self.direction_changes = direction_changes  # integer list
+
+    def __str__(self):
+        direction_changes_str = ', '.join(map(str, self.direction_changes))
+        return f"name {self.name}, direction_changes [{direction_changes_str}]"
+
+
+class TimePattern:
+    def __init__(self, name, key_signature, beat_times):
+        """
+        name: string\n
+        key_signature: string\n
+        beat_times: PNT[]
+        """
+        self.name = name
+        self.key_signature = key_signature
+        self.beat_times = beat_times
+
+    def __str__(self):
+        beat_times_str = ', '.join([f"({pnt.play_time}, {pnt.rest_time})" for pnt in self.beat_times])
+        return f"name {self.name}, key_signature {self.key_signature}, " \
+               f"beat_times [{beat_times_str}]"
+
+
+class MelodyRunSettings:
+    def __init__(self):
+        """
+        Holds the '-generate melody' run commands, set to their defaults.\n
+        add_extra_keys: Key[] - keys that are forcibly added to the scale if needed
+        """
+        self.scale = "major"
+        self.key = Key.C
+        self.octave = 3
+
+        # Option A
+        self.direction_patterns_file = "example"
+        self.min_direction_patterns = 1
+        self.max_direction_patterns = 3
+
+        # Option B
+        self.direction_probabilities_file = ""
+        self.direction_pattern_size = 8
+        self.direction_pattern_count = 60
+
+        # Option A
+        self.time_patterns_file = "example"
+        self.min_time_patterns = 1
+        self.max_time_patterns = 3
+
+        # Option B
+        self.time_probabilities_file = ""
+        self.time_pattern_size = 8
+        self.time_pattern_count = 60
+
+        # Option C, picking patterns from a pattern database instead of a file
+        self.direction_query = None
+        self.time_query = None
+
+        # rendering the same melody into many keys, scales and octaves at once
+        self.fan_out_keys = []
+        self.fan_out_scales = []
+        self.fan_out_octaves = []
+        self.fan_out_output = "files"
+
+        # (lowest, highest) MIDI pitch the melody has to stay between, or None for no limit
+        self.note_range = None
+
+        # generating many candidate melodies and only keeping the best scoring ones
+        self.candidates = 1
+        self.keep = 1
+        # metric name -> weight, empty uses every metric in MELODY_METRICS with a weight of 1
+        self.metric_weights = {}
+
+        # the file inside the variations folder whose variations are made of the generated melody
+        self.variation_file = ""
+
+        # storing the run commands of the melody inside this recipe store instead of generating it
+        self.recipe_store = ""
+
+        # Option D, walking pitch patterns (semitone changes) up and down from the key, instead of walking
+        # direction patterns around the scale
+        self.pitch_patterns_file = ""
+        self.min_pitch_patterns = 1
+        self.max_pitch_patterns = 3
+        # length of a pitch pattern melody, 0 for the usual MELODY_BEAT_COUNT beats
+        self.length_in_seconds = 0.0
+
+        # the most loop steps and seconds (0 for no limit) generating the melody may take before it is stopped
+        self.step_budget = MELODY_STEP_BUDGET
+        self.time_budget = 0.0
+
+        self.output_filename = "melody_generated"
+        self.scale_percentage = 1
+        self.seed = random.randint(100000000, 999999999)
+        self.add_random_keys = 0
+        self.add_extra_keys = []
+
+
+class MelodyPlan:
+    def __init__(self):
+        """
+        start_index: int - index of the starting key inside the scale keys\n
+        scale_size: int - number of scale keys the plan was sampled with\n
+        direction_changes: int[] - jump around the scale made for each note after the first\n
+        play_times: float[] - time in beats\n
+        rest_times: float[] - time in beats
+        """
+        self.start_index = 0
+        self.scale_size = 0
+        self.direction_changes = []
+        self.play_times = []
+        self.rest_times = []
+
+
+class BatchJob:
+    def __init__(self, index, segments):
+        """
+        index: int - line position of the job inside the batch file\n
+        segments: string[] - the '-generate melody' run commands of the job
+        """
+        self.index = index
+        self.segments = segments
+        self.output_filename = None
+        # the seed, scale and key name the job was generated with, set once it is generated
+        self.seed = None
+        self.scale = None
+        self.key = None
+        self.midi_bytes = None
+        self.generate_seconds = 0.0
+        self.write_seconds = 0.0
+        self.error = None
+        # index of the earlier job this one is a near duplicate of, and their estimated similarity
+        self.duplicate_of = None
+        self.similarity = None
+
+
+class GenerationStopped(Exception):
+    """ Input a melody or its patterns can never be generated from, the message says what and why """
+
+
+class GenerationBudgetExceeded(GenerationStopped):
+    """ Generating one melody took more than its step or time budget """
+
+
+class DataFileError(GenerationStopped):
+    """ A line of a data file that cannot be read, the message starts with file:line:column """
+
+
+class GenerationBudget:
+    def __init__(self, max_steps, max_seconds):
+        """
+        Counts the steps of the loops generating one job, so input that can never finish a melody stops
+        with an error instead of running forever.\n
+        max_steps: int - the most steps\n
+        max_seconds: float - the most seconds from now, 0 for no limit
+        """
+        self.max_steps = max_steps
+        self.steps = 0
+        self.deadline = time.perf_counter() + max_seconds if max_seconds > 0 else None
+        self.max_seconds = max_seconds
+
+    def step(self, doing, count=1):
+        self.steps += count
+        if self.steps > self.max_steps:
+            raise GenerationBudgetExceeded(doing + " took more than the step budget of " + str(self.max_steps) +
+                                           " steps, check the pattern and probability files or raise -step_budget")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise GenerationBudgetExceeded(doing + " took more than the time budget of " + str(self.max_seconds) +
+                                           " seconds, check the pattern and probability files or raise -time_budget")
+
+
+# endregion
+
+# region Variables
+
+""" direction_patterns refers to jumps from the current position in the scale """
+
+# Define scales, the interval lists are only turned into scale tables by the scale registry when used
+scales = {
+    'major': [2, 2, 1, 2, 2, 2, 1],  # Common in classical, pop, and happy/festive music
+    'minor': [2, 1, 2, 2, 1, 2, 2],
+    # Versatile and used in various genres, can convey a sad or dramatic mood
+
+    'dorian': [2, 1, 2, 2, 2, 1, 2],
+    # Often used in medieval and Celtic music, has a slightly folkloric feel
+    'mixolydian': [2, 2, 1, 2, 2, 1, 2],
+    # Common in rock, blues, and folk music, has a bluesy sound
+    'phrygian': [1, 2, 2, 2, 1, 2, 2],
+    # Used in flamenco and Spanish music, has a distinctive exotic quality
+
+    'harmonic_minor': [2, 1, 2, 2, 1, 3, 1],
+    # Has a mysterious and exotic quality, often used in fantasy and horror music
+    'melodic_minor': [2, 1, 2, 2, 2, 2, 1],
+    # Used in jazz and various contemporary genres, provides a unique flavor
+    'whole_tone': [2, 2, 2, 2, 2, 2],
+    # Has a dreamy and surreal quality, often used in impressionistic music
+
+    'pentatonic_major': [2, 2, 3, 2, 3],
+    # Simple and widely used in folk, country, and blues music
+    'pentatonic_minor': [3, 2, 2, 3, 2],
+    # Versatile and often used in various world music traditions
+
+    'octatonic_whole_half': [2, 2, 1, 2, 2, 1, 2, 2],
+    # Used in horror and suspenseful music, provides an eerie and unsettling atmosphere
+    'octatonic_half_whole': [1, 2, 2, 2, 1, 2, 2, 2],
+    # Similar to the whole-half variant, also used in horror and mysterious contexts
+
+    'enigmatic': [1, 3, 2, 2, 2, 1, 1],
+    # Uncommon and exotic, used for creating tension and intrigue
+    'neapolitan_major': [1, 2, 2, 2, 2, 2, 1],
+    # Has a classical and rich sound, used in classical and romantic music
+    'neapolitan_minor': [1, 2, 2, 2, 1, 3, 1],
+    # Similar to neapolitan major but with a minor third
+
+
+    'diminished': [1, 2, 1, 2, 1, 2, 1, 2],
+    # Dissonant and unstable, commonly used to create tension and a sense of unease, often associated with scary or suspenseful music
+
+    'locrian': [1, 2, 1, 2, 2, 2, 2],
+    # Unstable and mysterious, the diminished fifth degree contributes to its unsettling quality, often used in contexts that require a dark or eerie atmosphere
+
+    'prometheus': [2, 2, 2, 1, 3, 1],
+    # Ambiguous and exotic, the augmented fourth degree adds tension and unpredictability, suitable for creating a sense of mystery or otherworldliness
+
+    'natural_minor': [2, 1, 2, 2, 1, 2, 2],
+    # Melancholic and dark, commonly associated with somber and emotional contexts, often used in music with a serious or ominous tone
+
+    'chromatic': [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+    # Highly dissonant and unpredictable, chromaticism involves the use of all twelve pitches, often employed to create a sense of instability and unease in music
+
+    # maybe implement chords in the future 'diminished_seventh': ChordDefinition([3, 3, 3]), Dissonant and tense,
+    # the diminished seventh chord is often used in horror and suspenseful music to create a sense of fear and
+    # anticipation
+
+
+
+    # Add more scales as needed
+}
+
+
+# endregion
+
+# region Data file parsing
+
+DATA_FILE_CHUNK_SIZE = 1 << 20
+
+
+def report_data_error(file_path, offset, message):
+    """ Raises a DataFileError pointing at the line and column of the byte offset inside file_path """
+    # only taken on bad input, so the file is read again to count the lines before the offset
+    with open(file_path, 'rb') as file:
+        before = file.read(offset)
+    line_start = before.rfind(b"\n") + 1
+    line_number = before.count(b"\n") + 1
+    column = len(before[line_start:].decode("utf-8", errors="replace")) + 1
+    raise DataFileError(file_path + ":" + str(line_number) + ":" + str(column) + ": " + message)
+
+
+def iterate_data_lines(data, base_offset=0):
+    """
+    Yields (offset, line) for every line of the bytes data that is not blank or a # comment, with the line
+    stripped and offset the byte position of its first character in the file data starts at base_offset of.
+    """
+    position = base_offset
+    for raw_line in data.split(b"\n"):
+        line = raw_line.strip()
+        if line and line[0] != 0x23:
+            yield position if raw_line[0] == line[0] else position + raw_line.find(line[:1]), line
+        position += len(raw_line) + 1
+
+
+def iterate_file_lines(file_path):
+    """ iterate_data_lines over a whole file, read in large chunks cut after their last full line """
+    with open(file_path, 'rb') as file:
+        position = 0
+        remainder = b""
+        while True:
+            chunk = file.read(DATA_FILE_CHUNK_SIZE)
+            if len(chunk) == 0:
+                break
+            data = remainder + chunk
+            cut = data.rfind(b"\n") + 1
+            yield from iterate_data_lines(data[:cut], position)
+            position += cut
+            remainder = data[cut:]
+        yield from iterate_data_lines(remainder, position)
+
+
+def find_bad_data_token(line, offset, file_path, typecode, start=0, stop=None):
+    """ Raises a DataFileError at the first token of the line from start up to stop that is not of typecode """
+    convert = int if typecode == 'q' else float
+    for match in list(re.finditer(rb"\S+", line))[start:stop]:
+        try:
+            convert(match.group())
+        except (ValueError, OverflowError):
+            report_data_error(file_path, offset + match.start(),
+                              "expected " + ("an integer" if typecode == 'q' else "a number") + ", found '" +
+                              match.group().decode("utf-8", errors="replace") + "'")
+
+
+def parse_data_numbers(line, offset, file_path, typecode):
+    """
+    The whitespace separated numbers of a stripped data line starting at offset inside file_path, as a list
+    of typecode: 'q' for integers or 'd' for any number.
+    """
+    try:
+        return list(map(int if typecode == 'q' else float, line.split()))
+    except (ValueError, OverflowError):
+        find_bad_data_token(line, offset, file_path, typecode)
+        raise
+
+
+def parse_data_fields(line, offset, file_path, typecodes):
+    """
+    The fields of a stripped data line that has exactly one field per character of typecodes: 'q' for an
+    integer, 'd' for any number or 's' for a word kept as a string.
+    """
+    fields = line.split()
+    if len(fields) != len(typecodes):
+        report_data_error(file_path, offset, "expected " + str(len(typecodes)) + " fields, found " +
+                          str(len(fields)))
+    try:
+        return [field.decode("utf-8") if typecode == 's' else int(field) if typecode == 'q' else float(field)
+                for field, typecode in zip(fields, typecodes)]
+    except (ValueError, OverflowError, UnicodeDecodeError):
+        for i, typecode in enumerate(typecodes):
+            if typecode != 's':
+                find_bad_data_token(line, offset, file_path, typecode, i, i + 1)
+        report_data_error(file_path, offset, "the line is not valid UTF-8")
+
+
+def iterate_patterns(lines, file_path, kind):
+    """
+    Builds the patterns of kind ('direction', 'time' or 'pitch') from the (offset, line) pairs of
+    iterate_data_lines, yielding each pattern once the next 'pattern=' line or the end is reached.
+    """
+    pattern = None
+    for offset, line in lines:
+        if line.startswith(b"pattern="):
+            if pattern is not None:
+                yield pattern
+            name = line[len(b"pattern="):].decode("utf-8", errors="replace")
+            if kind == "direction":
+                pattern = DirectionPattern(name, [])
+            elif kind == "time":
+                pattern = TimePattern(name, None, [])
+            else:
+                pattern = PitchPattern(name, [])
+        elif pattern is None:
+            report_data_error(file_path, offset, "data before the first 'pattern=' line")
+        elif kind == "direction":
+            pattern.direction_changes.extend(parse_data_numbers(line, offset, file_path, 'q'))
+        elif kind == "pitch":
+            pattern.pitch_changes.extend(parse_data_numbers(line, offset, file_path, 'q'))
+        elif line.startswith(b"time_signature="):
+            pattern.key_signature = line[len(b"time_signature="):].decode("utf-8", errors="replace")
+        else:
+            times = parse_data_numbers(line, offset, file_path, 'd')
+            if len(times) & 1:
+                report_data_error(file_path, offset + len(line), "play and rest times come in pairs, found " +
+                                  str(len(times)) + " times")
+            pattern.beat_times.extend(map(PNT, times[0::2], times[1::2]))
+    if pattern is not None:
+        yield pattern
+
+
+def iterate_pattern_file(file_path, kind):
+    """ Streams the patterns of a file one at a time, so importing never holds the whole file in memory """
+    return iterate_patterns(iterate_file_lines(file_path), file_path, kind)
+
+
+def load_pattern_file(file_path, kind):
+    if not Path(file_path).exists():
+        print("File not found: " + file_path)
+        return None
+    return list(iterate_pattern_file(file_path, kind))
+
+
+# endregion
+
+# region Data sorting functions
+
+def get_time_probabilities(file_name):
+    if not file_name.endswith(".timeprobabilities"):
+        file_name += ".timeprobabilities"
+    file_path = "time_probabilities/" + file_name
+    if not Path(file_path).exists():
+        print(f"Error: File '{file_name}' not found.")
+        return None
+    beat_probabilities = []
+    wait_probabilities = []
+    for offset, line in iterate_file_lines(file_path):
+        kind, value, magnitude = parse_data_fields(line, offset, file_path, "sdd")
+        if kind == "Beat":
+            beat_probabilities.append([value, magnitude])
+        elif kind == "Rest":
+            wait_probabilities.append([value, magnitude])
+        else:
+            report_data_error(file_path, offset, "expected 'Beat' or 'Rest', found '" + kind + "'")
+    return beat_probabilities, wait_probabilities
+
+
+def get_direction_probabilities(file_name):
+    if not file_name.endswith(".directionprobabilities"):
+        file_name += ".directionprobabilities"
+    file_path = "direction_probabilities/" + file_name
+    if not Path(file_path).exists():
+        print(f"Error: File '{file_name}' not found.")
+        return None
+    return [parse_data_fields(line, offset, file_path, "qd") for offset, line in iterate_file_lines(file_path)]
+
+
+def check_direction_probabilities(probabilities, file_name):
+    """
+    Raises GenerationStopped when direction patterns could never be generated from the probabilities: no
+    direction has weight, or only the 9999 wildcard does, which the first pattern rolls again on forever.
+    """
+    if any(weight < 0 for _, weight in probabilities):
+        raise GenerationStopped(file_name + " has a direction with a weight below 0")
+    if sum(weight for value, weight in probabilities if value != PROBABILITY_WILDCARD) <= 0:
+        raise GenerationStopped("no direction of " + file_name + " other than the 9999 wildcard has a weight " +
+                                "above 0, the first pattern would roll again forever")
+
+
+def check_time_probabilities(beat_probabilities, rest_probabilities, file_name):
+    """
+    Raises GenerationStopped when time patterns could never be generated from the probabilities, or every
+    note of them would last 0 beats so a melody could never be filled.
+    """
+    if any(weight < 0 for _, weight in beat_probabilities + rest_probabilities):
+        raise GenerationStopped(file_name + " has a Beat or Rest with a weight below 0")
+    plain_beats = [value for value, weight in beat_probabilities if value != PROBABILITY_WILDCARD and weight > 0]
+    if len(plain_beats) == 0:
+        raise GenerationStopped("no Beat of " + file_name + " other than the 9999 wildcard has a weight above 0, " +
+                                "the first note would roll again forever")
+
+    # the rest roll only goes up to the total beat weight, and the first note rolls again on a wildcard rest
+    total_beats_weight = sum(weight for _, weight in beat_probabilities)
+    wildcard_span = 0
+    start = 0
+    for value, weight in rest_probabilities:
+        if value == PROBABILITY_WILDCARD:
+            wildcard_span += max(0, min(start + weight, total_beats_weight) - min(start, total_beats_weight))
+        start += weight
+    if wildcard_span >= total_beats_weight:
+        raise GenerationStopped("the Rest roll of " + file_name + " always lands on the 9999 wildcard, " +
+                                "the first note would roll again forever")
+
+    plain_rests = [value for value, weight in rest_probabilities if value != PROBABILITY_WILDCARD and weight > 0]
+    if all(value == 0 for value in plain_beats) and all(value == 0 for value in plain_rests):
+        raise GenerationStopped("every Beat and Rest of " + file_name + " with a weight lasts 0 beats, " +
+                                "a melody could never be filled")
+
+
+def check_generation_patterns(direction_patterns, time_patterns):
+    """ Raises GenerationStopped on chosen patterns a melody could never be planned from """
+    for pattern in direction_patterns:
+        if len(pattern.direction_changes) == 0:
+            raise GenerationStopped("direction pattern " + str(pattern.name) + " has no direction changes")
+    for pattern in time_patterns:
+        if len(pattern.beat_times) == 0 or sum(pnt.play_time + pnt.rest_time for pnt in pattern.beat_times) <= 0:
+            raise GenerationStopped("time pattern " + str(pattern.name) + " lasts 0 beats, a melody could never be " +
+                                    "filled with it")
+
+
+def read_file(file_path):
+    try:
+        with open(file_path, 'r') as file:
+            # Read all lines into a list
+            lines = file.readlines()
+            return lines
+    except FileNotFoundError:
+        print(f"Error: File '{file_path}' not found.")
+        return None
+
+
+def get_time_patterns(time_patterns_file):
+    return load_pattern_file("time_patterns/" + time_patterns_file, "time")
+
+
+def get_pitch_patterns(pitch_patterns_file):
+    return load_pattern_file("pitch_patterns/" + pitch_patterns_file, "pitch")
+
+
+def get_direction_patterns(direction_patterns_file):
+    return load_pattern_file("direction_patterns/" + direction_patterns_file, "direction")
+
+
+# endregion
+
+# region Pattern file indexes
+
+PATTERN_INDEX_MAGIC = b"MMGIDX01"
+PATTERN_INDEX_HEADER = struct.Struct("<8sqqq")
+
+
+def get_pattern_index(file_path):
+    """
+    Returns the byte offset of every 'pattern=' line inside file_path. The offsets are kept in a sidecar
+    file (file_path + '.index') and only rebuilt when the pattern file's size or modified time changes.
+    """
+    stat = os.stat(file_path)
+    index_path = file_path + ".index"
+
+    # region Reading the sidecar file if it is still valid
+    try:
+        with open(index_path, 'rb') as file:
+            magic, file_size, modified_ns, count = PATTERN_INDEX_HEADER.unpack(file.read(PATTERN_INDEX_HEADER.size))
+            if magic == PATTERN_INDEX_MAGIC and file_size == stat.st_size and modified_ns == stat.st_mtime_ns:
+                offsets = array('q')
+                offsets.fromfile(file, count)
+                return offsets
+    except (OSError, struct.error, EOFError):
+        pass
+    # endregion
+
+    # region Building the index
+    offsets = array('q')
+    position = 0
+    with open(file_path, 'rb') as file:
+        for line in file:
+            if line.lstrip().startswith(b"pattern="):
+                offsets.append(position)
+            position += len(line)
+
+    # written to a temporary file first so another process never reads half an index
+    temp_path = index_path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(PATTERN_INDEX_HEADER.pack(PATTERN_INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(offsets)))
+            offsets.tofile(file)
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        # a read-only pattern folder still works, the index just gets rebuilt next time
+        print("WARNING: could not write pattern index " + index_path + ": " + str(e))
+    # endregion
+
+    return offsets
+
+
+def parse_direction_pattern_block(data, file_path, offset=0):
+    """ The pattern held by data, the bytes of file_path from offset on """
+    return next(iterate_patterns(iterate_data_lines(data, offset), file_path, "direction"), None)
+
+
+def parse_time_pattern_block(data, file_path, offset=0):
+    """ The pattern held by data, the bytes of file_path from offset on """
+    return next(iterate_patterns(iterate_data_lines(data, offset), file_path, "time"), None)
+
+
+def parse_pitch_pattern_block(data, file_path, offset=0):
+    """ The pattern held by data, the bytes of file_path from offset on """
+    return next(iterate_patterns(iterate_data_lines(data, offset), file_path, "pitch"), None)
+
+
+class IndexedPatternFile:
+    def __init__(self, file_path, parse_block):
+        """
+        file_path: string - a .directionpatterns, .timepatterns or .pitchpatterns file\n
+        parse_block: function - turns the bytes of one pattern into its pattern object
+        """
+        self.file_path = file_path
+        self.parse_block = parse_block
+        self.offsets = get_pattern_index(file_path)
+        self.file_size = os.path.getsize(file_path)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def load(self, indexes):
+        """ Seeks to and parses only the patterns at the given indexes, in the given order """
+        parse_start = time.perf_counter()
+        patterns = []
+        with open(self.file_path, 'rb') as file:
+            for i in indexes:
+                start = self.offsets[i]
+                end = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.file_size
+                file.seek(start)
+                patterns.append(self.parse_block(file.read(end - start), self.file_path, start))
+        metric_patterns_parsed.inc(len(patterns))
+        metric_parse_seconds.observe(time.perf_counter() - parse_start)
+        return patterns
+
+
+def open_pattern_file(folder, file_name, parse_block):
+    file_path = folder + file_name
+    # worker processes of a batch read the pattern files the batch put into shared memory
+    if file_path in shared_pattern_tables:
+        return shared_pattern_tables[file_path]
+    if not Path(file_path).exists():
+        print("File not found: " + file_path)
+        return None
+    # a watched batch keeps the patterns it parsed until the file changes
+    if file_path in watched_pattern_files:
+        if watched_pattern_files[file_path] is None:
+            watched_pattern_files[file_path] = SharedPatternSource(IndexedPatternFile(file_path, parse_block))
+        return watched_pattern_files[file_path]
+    return IndexedPatternFile(file_path, parse_block)
+
+
+# endregion
+
+# region Shared pattern tables
+
+SHARED_PATTERN_TABLE_MAGIC = b"MMGTBL01"
+# magic, kind, pattern count, value count, text size
+SHARED_PATTERN_TABLE_HEADER = struct.Struct("<8sqqqq")
+SHARED_TABLE_DIRECTIONS = 0
+SHARED_TABLE_TIMES = 1
+
+# file path -> SharedPatternTable, filled inside batch worker processes and used by open_pattern_file
+shared_pattern_tables = {}
+
+
+class SharedPatternTable:
+    def __init__(self, memory):
+        """
+        A pattern file compiled into one block of shared memory and read through array views of it, so
+        every process reading the table uses the same memory instead of its own copy. Has the same
+        len() and load(indexes) as IndexedPatternFile.\n
+        memory: SharedMemory - laid out as the header, the start of each pattern's values (count + 1),
+        every value (direction changes, or play and rest times), the start of each pattern's text
+        (count + 1) and the text (the name, a 0 byte, then '=' and the time signature if there is one)
+        """
+        self.memory = memory
+        self.name = memory.name
+        magic, self.kind, self.count, value_count, text_size = SHARED_PATTERN_TABLE_HEADER.unpack_from(memory.buf)
+        if magic != SHARED_PATTERN_TABLE_MAGIC:
+            raise ValueError("shared memory " + memory.name + " is not a pattern table")
+
+        buffer = memoryview(memory.buf)
+        position = SHARED_PATTERN_TABLE_HEADER.size
+        self.offsets = buffer[position:position + (self.count + 1) * 8].cast('q')
+        position += (self.count + 1) * 8
+        self.values = buffer[position:position + value_count * 8].cast('q' if self.kind == SHARED_TABLE_DIRECTIONS
+                                                                       else 'd')
+        position += value_count * 8
+        self.text_offsets = buffer[position:position + (self.count + 1) * 8].cast('q')
+        position += (self.count + 1) * 8
+        self.text = buffer[position:position + text_size]
+        self.views = [self.offsets, self.values, self.text_offsets, self.text, buffer]
+
+    def __len__(self):
+        return self.count
+
+    def load(self, indexes):
+        """ Builds pattern objects for only the given indexes, in the given order """
+        patterns = []
+        for i in indexes:
+            name, _, time_signature = bytes(self.text[self.text_offsets[i]:self.text_offsets[i + 1]]).decode(
+                "utf-8").partition("\x00")
+            values = self.values[self.offsets[i]:self.offsets[i + 1]]
+            if self.kind == SHARED_TABLE_DIRECTIONS:
+                patterns.append(DirectionPattern(name, list(values)))
+            else:
+                patterns.append(TimePattern(name, time_signature[1:] if len(time_signature) > 0 else None,
+                                            [PNT(values[j], values[j + 1]) for j in range(0, len(values), 2)]))
+        return patterns
+
+    def close(self):
+        # the views have to go before the memory can be closed
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.memory.close()
+
+
+def create_shared_pattern_table(file_path, kind):
+    """ Parses every pattern of a pattern file once into a new SharedPatternTable """
+    from multiprocessing import shared_memory
+    offsets = array('q', [0])
+    values = array('q' if kind == SHARED_TABLE_DIRECTIONS else 'd')
+    text_offsets = array('q', [0])
+    text = bytearray()
+    # streamed a pattern at a time in file order, the same order as the pattern file's index
+    for pattern in iterate_pattern_file(file_path, "direction" if kind == SHARED_TABLE_DIRECTIONS else "time"):
+        text += pattern.name.encode("utf-8") + b"\x00"
+        if kind == SHARED_TABLE_DIRECTIONS:
+            values.extend(pattern.direction_changes)
+        else:
+            for pnt in pattern.beat_times:
+                values.append(pnt.play_time)
+                values.append(pnt.rest_time)
+            if pattern.key_signature is not None:
+                text += b"=" + pattern.key_signature.encode("utf-8")
+        offsets.append(len(values))
+        text_offsets.append(len(text))
+
+    count = len(offsets) - 1
+    header = SHARED_PATTERN_TABLE_HEADER.pack(SHARED_PATTERN_TABLE_MAGIC, kind, count, len(values), len(text))
+    data = [header, offsets.tobytes(), values.tobytes(), text_offsets.tobytes(), bytes(text)]
+    size = sum(len(part) for part in data)
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    position = 0
+    for part in data:
+        memory.buf[position:position + len(part)] = part
+        position += len(part)
+    return SharedPatternTable(memory)
+
+
+def attach_shared_pattern_table(name):
+    from multiprocessing import shared_memory
+    return SharedPatternTable(shared_memory.SharedMemory(name=name))
+
+
+# endregion
+
+# region Pattern database
+
+DIRECTION_PATTERN_COLUMNS = ["step_count", "max_jump", "net_drift", "abs_net_drift", "total_movement", "range_size"]
+TIME_PATTERN_COLUMNS = ["note_count", "total_duration", "play_duration", "rest_duration", "rest_ratio",
+                        "syncopation", "time_signature"]
+PATTERN_QUERY_OPERATORS = ["<=", ">=", "!=", "=", "<", ">"]
+PATTERN_DATABASE_INSERT_CHUNK = 10000
+
+
+def get_pattern_database_path(database_name):
+    if not database_name.endswith(".db"):
+        database_name += ".db"
+    return "pattern_databases/" + database_name
+
+
+def get_direction_pattern_statistics(direction_changes):
+    position = 0
+    lowest = 0
+    highest = 0
+    for change in direction_changes:
+        position += change
+        lowest = min(lowest, position)
+        highest = max(highest, position)
+    return {
+        "step_count": len(direction_changes),
+        "max_jump": max((abs(change) for change in direction_changes), default=0),
+        "net_drift": position,
+        "abs_net_drift": abs(position),
+        "total_movement": sum(abs(change) for change in direction_changes),
+        "range_size": highest - lowest,
+    }
+
+
+def get_time_pattern_statistics(beat_times):
+    play_duration = 0.0
+    rest_duration = 0.0
+    off_beat_notes = 0
+    onset = 0.0
+    for pnt in beat_times:
+        # a note is syncopated when it starts between beats
+        if abs(onset - round(onset)) > 0.001:
+            off_beat_notes += 1
+        play_duration += pnt.play_time
+        rest_duration += pnt.rest_time
+        onset += pnt.play_time + pnt.rest_time
+    total_duration = play_duration + rest_duration
+    return {
+        "note_count": len(beat_times),
+        "total_duration": total_duration,
+        "play_duration": play_duration,
+        "rest_duration": rest_duration,
+        "rest_ratio": rest_duration / total_duration if total_duration > 0 else 0.0,
+        "syncopation": off_beat_notes / len(beat_times) if len(beat_times) > 0 else 0.0,
+    }
+
+
+def open_pattern_database(database_name):
+    import sqlite3
+    path = Path(get_pattern_database_path(database_name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE IF NOT EXISTS direction_patterns ("
+                       "id INTEGER PRIMARY KEY, source_file TEXT, name TEXT, direction_changes TEXT, "
+                       "step_count INTEGER, max_jump INTEGER, net_drift INTEGER, abs_net_drift INTEGER, "
+                       "total_movement INTEGER, range_size INTEGER)")
+    connection.execute("CREATE TABLE IF NOT EXISTS time_patterns ("
+                       "id INTEGER PRIMARY KEY, source_file TEXT, name TEXT, time_signature TEXT, beat_times TEXT, "
+                       "note_count INTEGER, total_duration REAL, play_duration REAL, rest_duration REAL, "
+                       "rest_ratio REAL, syncopation REAL)")
+    connection.execute("CREATE TABLE IF NOT EXISTS query_cache ("
+                       "table_name TEXT, conditions TEXT, ids BLOB, PRIMARY KEY (table_name, conditions))")
+    # every statistic is indexed together with the id, so selection can walk the index in order
+    for table, columns in [("direction_patterns", DIRECTION_PATTERN_COLUMNS), ("time_patterns", TIME_PATTERN_COLUMNS)]:
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_source_file ON {table} (source_file)")
+        for column in columns:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column}, id)")
+    connection.commit()
+    return connection
+
+
+def import_pattern_file(connection, table, file_path, source_file):
+    # importing a file again replaces what it imported last time
+    connection.execute(f"DELETE FROM {table} WHERE source_file = ?", (source_file,))
+    # any stored query results are out of date once the patterns change
+    connection.execute("DELETE FROM query_cache WHERE table_name = ?", (table,))
+    rows = []
+    count = 0
+    for pattern in iterate_pattern_file(file_path, "direction" if table == "direction_patterns" else "time"):
+        if table == "direction_patterns":
+            stats = get_direction_pattern_statistics(pattern.direction_changes)
+            rows.append((source_file, pattern.name, ' '.join(map(str, pattern.direction_changes)),
+                         stats["step_count"], stats["max_jump"], stats["net_drift"], stats["abs_net_drift"],
+                         stats["total_movement"], stats["range_size"]))
+        else:
+            stats = get_time_pattern_statistics(pattern.beat_times)
+            rows.append((source_file, pattern.name, pattern.key_signature,
+                         ' '.join(str(pnt.play_time) + " " + str(pnt.rest_time) for pnt in pattern.beat_times),
+                         stats["note_count"], stats["total_duration"], stats["play_duration"],
+                         stats["rest_duration"], stats["rest_ratio"], stats["syncopation"]))
+        if len(rows) >= PATTERN_DATABASE_INSERT_CHUNK:
+            count += insert_pattern_rows(connection, table, rows)
+            rows = []
+    count += insert_pattern_rows(connection, table, rows)
+    connection.commit()
+    return count
+
+
+def insert_pattern_rows(connection, table, rows):
+    if len(rows) == 0:
+        return 0
+    if table == "direction_patterns":
+        connection.executemany("INSERT INTO direction_patterns (source_file, name, direction_changes, step_count, "
+                               "max_jump, net_drift, abs_net_drift, total_movement, range_size) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    else:
+        connection.executemany("INSERT INTO time_patterns (source_file, name, time_signature, beat_times, "
+                               "note_count, total_duration, play_duration, rest_duration, rest_ratio, syncopation) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+class PatternQuery:
+    def __init__(self, database_name, table, conditions):
+        """
+        database_name: string - the file inside the pattern_databases folder\n
+        table: string - 'direction_patterns' or 'time_patterns'\n
+        conditions: string - e.g. 'max_jump <= 2, net_drift > 0', an empty string matches every pattern
+        """
+        self.database_name = database_name
+        self.table = table
+        self.conditions = conditions
+        self.where, self.parameters, self.order_column = parse_pattern_query_conditions(table, conditions)
+        self.ids = None
+
+    def __str__(self):
+        return f"PatternQuery(database={self.database_name}, table={self.table}, conditions={self.conditions})"
+
+    def __len__(self):
+        return len(self.get_ids())
+
+    def get_ids(self):
+        """
+        The ids of every matching pattern. They are stored in the database the first time a query is used,
+        so later runs of the same query only read them back instead of scanning the table again.
+        """
+        import sqlite3
+        if self.ids is not None:
+            return self.ids
+        cache_key = self.where + " " + repr(self.parameters)
+        with closing(sqlite3.connect(get_pattern_database_path(self.database_name))) as connection:
+            row = connection.execute("SELECT ids FROM query_cache WHERE table_name = ? AND conditions = ?",
+                                     (self.table, cache_key)).fetchone()
+            self.ids = array('q')
+            if row is not None:
+                self.ids.frombytes(row[0])
+            else:
+                order = "id" if self.order_column is None else self.order_column + ", id"
+                for (pattern_id,) in connection.execute(f"SELECT id FROM {self.table}{self.where} ORDER BY {order}",
+                                                        self.parameters):
+                    self.ids.append(pattern_id)
+                connection.execute("INSERT OR REPLACE INTO query_cache (table_name, conditions, ids) VALUES (?, ?, ?)",
+                                   (self.table, cache_key, self.ids.tobytes()))
+                connection.commit()
+        return self.ids
+
+    def load(self, indexes):
+        """ Returns the patterns at the given positions among the patterns matching the conditions """
+        import sqlite3
+        ids = self.get_ids()
+        if self.table == "direction_patterns":
+            columns = "name, direction_changes"
+        else:
+            columns = "name, time_signature, beat_times"
+        patterns = []
+        with closing(sqlite3.connect(get_pattern_database_path(self.database_name))) as connection:
+            for i in indexes:
+                row = connection.execute(f"SELECT {columns} FROM {self.table} WHERE id = ?", (ids[i],)).fetchone()
+                if self.table == "direction_patterns":
+                    patterns.append(DirectionPattern(row[0], [int(change) for change in row[1].split()]))
+                else:
+                    times = [float(value) for value in row[2].split()]
+                    patterns.append(TimePattern(row[0], row[1],
+                                                [PNT(times[j], times[j + 1]) for j in range(0, len(times), 2)]))
+        return patterns
+
+
+def parse_pattern_query_conditions(table, conditions):
+    allowed_columns = DIRECTION_PATTERN_COLUMNS if table == "direction_patterns" else TIME_PATTERN_COLUMNS
+    clauses = []
+    parameters = []
+    order_column = None
+    for condition in re.split(r",|\band\b", conditions):
+        condition = condition.strip()
+        if len(condition) == 0:
+            continue
+        match = re.fullmatch(r"(\w+)\s*(" + "|".join(map(re.escape, PATTERN_QUERY_OPERATORS)) + r")\s*(\S+)",
+                             condition)
+        if match is None or match.group(1) not in allowed_columns:
+            raise GenerationStopped("Invalid pattern query condition: " + condition + ", must be 'column operator " +
+                                    "value' using one of the columns: " + ", ".join(allowed_columns))
+        column, operator, value = match.groups()
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+        clauses.append(f"{column} {operator} ?")
+        parameters.append(value)
+        if order_column is None:
+            order_column = column
+    if len(clauses) == 0:
+        return "", [], None
+    return " WHERE " + " AND ".join(clauses), parameters, order_column
+
+
+def import_patterns_command(segments):
+    print("RUNNING  ARGUMENTS FOR import_patterns_command ")
+
+    # region Setting defaults
+
+    database_name = "example"
+    direction_files = []
+    time_files = []
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-import patterns':
+            i += 1
+        elif segment.startswith('-database'):
+            database_name = segments[i][len('-database'):].strip()
+            i += 1
+        elif segment.startswith('-directions'):
+            direction_files.append(segments[i][len('-directions'):].strip())
+            i += 1
+        elif segment.startswith('-times'):
+            time_files.append(segments[i][len('-times'):].strip())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    if len(direction_files) == 0 and len(time_files) == 0:
+        direction_files.append("example")
+        time_files.append("example")
+
+    print("database=" + str(database_name))
+    print("direction_files=" + str(direction_files))
+    print("time_files=" + str(time_files))
+
+    # endregion
+
+    # region Running command
+
+    with closing(open_pattern_database(database_name)) as connection:
+        for table, folder, extension, files in [("direction_patterns", "direction_patterns/", ".directionpatterns",
+                                                 direction_files),
+                                                ("time_patterns", "time_patterns/", ".timepatterns", time_files)]:
+            for file_name in files:
+                if not file_name.endswith(extension):
+                    file_name += extension
+                if not Path(folder + file_name).exists():
+                    print("ERROR: File not found: " + folder + file_name)
+                    sys.exit(1)
+                start = time.perf_counter()
+                count = import_pattern_file(connection, table, folder + file_name, file_name)
+                print("Imported " + str(count) + " patterns from " + folder + file_name + " in " +
+                      str(round(time.perf_counter() - start, 3)) + " seconds")
+
+    # endregion
+
+
+# endregion
+
+# region Scale registry
+
+class ScaleTable:
+    def __init__(self, scale_name, root_key, intervals):
+        """
+        Every lookup for one scale in one key, built once and never changed afterwards.\n
+        keys: Key[] - the scale keys, ending on the root key again like generate_scale_keys\n
+        walk_keys: Key[] - the scale keys without the repeated last key\n
+        degree_by_key_value: int[] - degree of each key value (index 1 to 12) inside walk_keys, -1 if not in the scale\n
+        nearest_degree_by_key_value: int[] - the same, with keys outside the scale moved to the closest degree
+        """
+        self.scale_name = scale_name
+        self.root_key = root_key
+
+        keys = [root_key]
+        for interval in intervals:
+            keys.append(Key((keys[-1].value + interval - 1) % len(Key) + 1))
+        self.keys = tuple(keys)
+        walk_keys = list(keys)
+        if len(walk_keys) > 1 and walk_keys[len(walk_keys) - 1] == walk_keys[0]:
+            del walk_keys[len(walk_keys) - 1]
+        self.walk_keys = tuple(walk_keys)
+        self.key_values = tuple(key.value for key in self.walk_keys)
+
+        degree_by_key_value = [-1] * (len(Key) + 1)
+        for degree, key in enumerate(self.walk_keys):
+            degree_by_key_value[key.value] = degree
+        self.degree_by_key_value = tuple(degree_by_key_value)
+
+        nearest_degree_by_key_value = [-1]
+        for key_value in range(1, len(Key) + 1):
+            best_degree = 0
+            best_distance = None
+            for degree, degree_value in enumerate(self.key_values):
+                up = (degree_value - key_value) % len(Key)
+                down = (key_value - degree_value) % len(Key)
+                # distance around the circle of keys, the degree above wins a tie
+                distance = (min(up, down), up > down)
+                if best_distance is None or distance < best_distance:
+                    best_degree = degree
+                    best_distance = distance
+            nearest_degree_by_key_value.append(best_degree)
+        self.nearest_degree_by_key_value = tuple(nearest_degree_by_key_value)
+
+
+class ScaleRegistry:
+    def __init__(self, definitions):
+        """
+        definitions: {string: ScaleDefinition} - every scale that can be used, by name
+        """
+        self.definitions = dict(definitions)
+        # (scale name, key) -> ScaleTable, each built the first time it's looked up
+        self.tables = {}
+
+    def names(self):
+        return list(self.definitions)
+
+    def __contains__(self, scale_name):
+        return scale_name in self.definitions
+
+    def get_table(self, scale_name, key):
+        scale_name = scale_name.lower()
+        table = self.tables.get((scale_name, key))
+        if table is None:
+            definition = self.definitions.get(scale_name)
+            if definition is None:
+                raise ValueError(f"Unknown scale: {scale_name}")
+            # threads building the same table at once all end up using the one setdefault kept
+            table = self.tables.setdefault((scale_name, key), ScaleTable(scale_name, key, definition.intervals))
+        return table
+
+
+scale_registry = None
+scale_registry_lock = threading.Lock()
+
+
+def get_scale_definitions_from_files(folder="scales/"):
+    """ Reads the extra scales inside every .scales file of the scales folder """
+    definitions = {}
+    if not Path(folder).is_dir():
+        return definitions
+    for file_path in sorted(str(path) for path in Path(folder).glob("*.scales")):
+        scale_name = None
+        for offset, line in iterate_file_lines(file_path):
+            if line.startswith(b"scale="):
+                scale_name = line[len(b"scale="):].strip().lower().decode("utf-8", errors="replace")
+                continue
+            if scale_name is None:
+                report_data_error(file_path, offset, "intervals before the first 'scale=' line")
+            intervals = parse_data_numbers(line, offset, file_path, 'q')
+            for interval, match in zip(intervals, re.finditer(rb"\S+", line)):
+                if interval < 1:
+                    report_data_error(file_path, offset + match.start(), "every interval of a scale has to be at " +
+                                      "least 1, found " + str(interval))
+            if sum(intervals) != 12:
+                print("WARNING: the intervals of scale " + scale_name + " in " + file_path +
+                      " add up to " + str(sum(intervals)) + " instead of 12")
+            if scale_name in scales or scale_name in definitions:
+                print("WARNING: scale " + scale_name + " in " + file_path + " replaces an existing scale")
+            definitions[scale_name] = ScaleDefinition(intervals)
+    return definitions
+
+
+def get_scale_registry():
+    """ The built in scales and the scales folder, with every (scale, key) table built the first time it's used """
+    global scale_registry
+    if scale_registry is None:
+        with scale_registry_lock:
+            if scale_registry is None:
+                definitions = {scale_name: ScaleDefinition(intervals) for scale_name, intervals in scales.items()}
+                definitions.update(get_scale_definitions_from_files())
+                scale_registry = ScaleRegistry(definitions)
+    return scale_registry
+
+
+# endregion
+
+# region Helper functions
+
+
+def get_all_scale_values_print():
+    scale_names = get_scale_registry().names()
+    help_text = "All possible scale values: \n       "
+    for i in range(len(scale_names)):
+        help_text += scale_names[i]
+        if i < (len(scale_names) - 1):
+            help_text += ", "
+        if i % 4 == 0 and i != (len(scale_names) - 1) and i != 0:
+            help_text += "\n       "
+    help_text += "\n"
+    return help_text
+
+
+def get_all_key_values_print():
+    help_text = "All possible key values:\n       "
+    key_values = [key.name for key in Key]
+    for i, key in enumerate(key_values):
+        help_text += key
+        if i < (len(key_values) - 1):
+            help_text += ", "
+        if i % 7 == 0 and i != (len(key_values) - 1) and i != 0:
+            help_text += "\n       "
+    help_text += "\n"
+    return help_text
+
+
+def lehmer_seed_combine(seed, i):
+    a, m = 23, 4567  # Adjust these parameters as needed
+    combined_seed = (a * seed) % m
+    combined_seed ^= i
+    return combined_seed
+
+
+def transpose_note(note, pitch_shift):
+    new_key_value = (note.key.value + pitch_shift - 1) % 12 + 1
+    new_octave = note.octave + (note.key.value + pitch_shift - 1) // 12
+
+    new_key = Key(new_key_value)
+    new_note = Note(new_octave, new_key, note.beats, note.after_wait_beats)
+
+    return new_note
+
+
+def generate_scale_keys(scale_name, key, starting_octave=1):
+    """ Returns a new list of the scale keys, safe to change, copied from the scale registry's table """
+    return list(get_scale_registry().get_table(scale_name, key).keys)
+
+
+def key_below(current_key):
+    # Get the previous key based on enum values
+    previous_key_value = (current_key.value - 1) % len(Key)
+
+    # If the current key is the first one (enum value 1), return the last key
+    if current_key.value == 1:
+        return Key(len(Key))
+
+    # Otherwise, return the key with the calculated value
+    return Key(previous_key_value)
+
+
+def note_exists_in_scale(note, scale_keys):
+    # getting current position inside the scale
+    current_index_in_scale_keys = -1
+    for i in range(len(scale_keys)):
+        if scale_keys[i].value == note.key.value:
+            current_index_in_scale_keys = i
+    if current_index_in_scale_keys == -1:
+        return False
+    return True
+
+
+def jump_notes_position_in_scale(note, scale_keys, jump_direction):
+    # if the scale contains a final key which is the same as the first key, just remove it
+    if scale_keys[len(scale_keys) - 1] == scale_keys[0]:
+        del scale_keys[len(scale_keys) - 1]
+
+    # show user info about the generate operation
+    print("jump_notes_position_in_scale() ================================================== \n" +
+          "note=" + str(note) + ", "
+                                "scale_keys=" + str(scale_keys) + ", "
+                                                                  "jump_direction=" + str(jump_direction))
+
+    # getting current position inside the scale
+    current_index_in_scale_keys = 0
+    for i in range(len(scale_keys)):
+        if scale_keys[i].value == note.key.value:
+            current_index_in_scale_keys = i
+    if jump_direction > 0:  # going forwards
+        for i in range(jump_direction):
+            current_index_in_scale_keys += 1
+            if current_index_in_scale_keys == len(scale_keys):
+                current_index_in_scale_keys = 0
+                note.octave += 1
+            note.key = scale_keys[current_index_in_scale_keys]
+    elif jump_direction < 0:  # going backwards
+        for i in range(abs(jump_direction)):
+            current_index_in_scale_keys -= 1
+            # this works this way because the last note of every scale is the first note, so skip it
+            if current_index_in_scale_keys == -1:
+                current_index_in_scale_keys = len(scale_keys) - 1
+                note.octave -= 1
+            note.key = scale_keys[current_index_in_scale_keys]
+    print("Jumped to " + str(note))
+    return note
+
+
+def get_note_below(note):
+    # Get the previous key using the key_below function
+    previous_key = key_below(note.key)
+
+    # Adjust the octave if the key was reduced from 'A' to 'GSharp'
+    new_octave = note.octave - 1 if previous_key == Key.GSharp else note.octave
+
+    # Create a new Note with the reduced key and adjusted octave
+    new_note = Note(new_octave, previous_key, note.beats)
+    return new_note
+
+
+def write_to_midi(path, melody, beat_count):
+    start = time.perf_counter()
+    midi = build_midi_file(melody, beat_count)
+
+    path = "output/" + path
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    midi.save(path)
+    metric_write_seconds.observe(time.perf_counter() - start)
+    metric_bytes_written.inc(os.path.getsize(path))
+
+
+def midi_to_bytes(midi):
+    buffer = io.BytesIO()
+    midi.save(file=buffer)
+    return buffer.getvalue()
+
+
+def build_midi_file(melody, beat_count):
+    from mido import MidiFile
+    midi = MidiFile()
+    midi.tracks.append(build_melody_track(melody, beat_count))
+    return midi
+
+
+# the General MIDI drum channel (channel 10, counted from 0), not melodies
+MIDI_DRUM_CHANNEL = 9
+# the MIDI channels melodies are played on, every one except the drum channel
+MELODY_CHANNELS = [channel for channel in range(16) if channel != MIDI_DRUM_CHANNEL]
+
+
+def build_multitrack_midi_file(melodies, beat_count, track_names, tempo_track=False):
+    """
+    One SMF type 1 file with a track, and a channel, for each melody. With tempo_track the tempo and time
+    signature of the first melody go into a track of their own ahead of the melodies, shared by all of them.
+    """
+    from mido import MidiFile, MidiTrack, MetaMessage
+    if len(melodies) > len(MELODY_CHANNELS):
+        raise GenerationStopped("a multitrack file can hold at most " + str(len(MELODY_CHANNELS)) + " melodies, " +
+                                "one for each MIDI channel except the drum channel, not " + str(len(melodies)))
+    midi = MidiFile(type=1)
+    if tempo_track:
+        track = MidiTrack()
+        track.append(MetaMessage('time_signature', numerator=melodies[0].time_signature[0],
+                                 denominator=melodies[0].time_signature[1]))
+        track.append(MetaMessage('set_tempo', tempo=int(60000000 / melodies[0].tempo)))
+        midi.tracks.append(track)
+    for i in range(len(melodies)):
+        track = build_melody_track(melodies[i], beat_count, channel=MELODY_CHANNELS[i], include_tempo=not tempo_track)
+        track.insert(0, MetaMessage('track_name', name=track_names[i]))
+        midi.tracks.append(track)
+    return midi
+
+
+def build_melody_track(melody, beat_count, channel=0, include_tempo=True):
+    import mido
+    from mido import MidiTrack, MetaMessage
+    track = MidiTrack()
+    ticks_per_beat = 480  # You may adjust this based on your tempo and desired resolution
+
+    # in case the pitch is off in the output and needs to be shifted
+    library_alignment_value = -4
+    max_tick = beat_count * ticks_per_beat
+    ticks_added = 0
+
+    # players use the tempo from the tick it is set at, so it comes before the first note
+    if include_tempo:
+        microseconds_per_minute = 60000000  # Number of microseconds in a minute
+        tempo_microseconds_per_beat = int(microseconds_per_minute / melody.tempo)
+        track.append(MetaMessage('set_tempo', tempo=tempo_microseconds_per_beat))
+
+    for note in melody.notes:
+        pitch = note.key.value + (note.octave + 1) * 12 + library_alignment_value
+        duration_in_ticks = int(note.beats * ticks_per_beat)
+
+        # checking if there is enough space left
+        ticks_added += duration_in_ticks
+        if ticks_added > max_tick:
+            ticks_added -= duration_in_ticks
+            break
+        track.append(mido.Message('note_on', note=pitch, velocity=64, time=0, channel=channel))
+        track.append(mido.Message('note_off', note=pitch, velocity=64, time=duration_in_ticks, channel=channel))
+
+        # checking if there is enough space left
+        ticks_added += int(note.after_wait_beats * ticks_per_beat)
+        if ticks_added > max_tick:
+            ticks_added -= int(note.after_wait_beats * ticks_per_beat)
+            break
+        # should add equal blank space to the length of the beat
+        track.append(mido.Message('note_on', note=0, velocity=0, time=int(note.after_wait_beats * ticks_per_beat),
+                                   channel=channel))
+        track.append(mido.Message('note_off', note=0, velocity=0, time=0, channel=channel))
+
+    if ticks_added < max_tick:
+        unfilled_space = max_tick - ticks_added
+        track.append(mido.Message('note_on', note=0, velocity=0, time=int(unfilled_space), channel=channel))
+        track.append(mido.Message('note_off', note=0, velocity=0, time=0, channel=channel))
+        print("Added " + str(unfilled_space) + " of blank space.")
+
+    return track
+
+
+def generate_random_indexes(input_list, seed, min_to_max_time_pattern_count, rng=random):
+    """
+    Picks between min and max indexes of input_list without replacement. Only the picked indexes are
+    kept, so the cost depends on how many are picked and not on how long input_list is.
+    """
+    rng.seed(seed)
+
+    list_size = len(input_list)
+
+    selected_indexes = []
+    count = rng.randint(min_to_max_time_pattern_count[0], min_to_max_time_pattern_count[1])
+
+    for _ in range(count):
+        if len(selected_indexes) == list_size:
+            break
+        # position inside the indexes that are still left, same draw as random.choice on the remaining list
+        position = rng.randrange(list_size - len(selected_indexes))
+        selected_index = position
+        for taken in sorted(selected_indexes):
+            if taken <= selected_index:
+                selected_index += 1
+        selected_indexes.append(selected_index)
+
+    return selected_indexes
+
+
+# endregion
+
+# region run parameter processing
+
+def generate_melody_run_commands(segments):
+    settings = parse_melody_run_commands(segments)
+
+    # region Error checking
+
+    check_melody_settings(settings)
+
+    variation_definitions = None
+    if len(settings.variation_file) > 0:
+        if uses_fan_out(settings):
+            print("ERROR: -variation_file cannot be combined with the -fan_out_... commands")
+            sys.exit(1)
+        variation_definitions = get_variation_definitions(settings.variation_file)
+        if variation_definitions is None or len(variation_definitions) == 0:
+            print("ERROR, cannot find file in variations folder or no variations are inside the file.")
+            sys.exit(1)
+
+    if len(settings.recipe_store) > 0 and (uses_fan_out(settings) or variation_definitions is not None):
+        print("ERROR: -recipe_store cannot be combined with -variation_file or the -fan_out_... commands")
+        sys.exit(1)
+
+    # endregion
+
+    if len(settings.recipe_store) > 0:
+        with closing(open_recipe_store(settings.recipe_store)) as connection:
+            recipe_id = add_recipes(connection, [(settings, segments)])[0]
+        print("STORED RECIPE " + str(recipe_id) + " IN " + get_recipe_store_path(settings.recipe_store))
+        return
+
+    prepare_generated_pattern_files(settings)
+    if uses_fan_out(settings):
+        generate_fan_out(settings)
+    else:
+        melody = run_melody_settings(settings)
+        if variation_definitions is not None:
+            write_melody_variations(settings, melody, variation_definitions)
+
+
+def check_melody_settings(settings):
+    """ Raises GenerationStopped on '-generate melody' run commands that can not be used together """
+    if settings.note_range is not None and not 0 <= settings.note_range[0] <= settings.note_range[1] <= 127:
+        raise GenerationStopped("-min_note and -max_note must be MIDI notes from 0 to 127, with -min_note not above " +
+                                "-max_note")
+
+    if settings.candidates < 1 or settings.keep < 1 or settings.keep > settings.candidates:
+        raise GenerationStopped("-candidates and -keep must be at least 1, with -keep not above -candidates")
+
+    if settings.candidates > 1 and uses_fan_out(settings):
+        raise GenerationStopped("-candidates cannot be combined with the -fan_out_... commands")
+
+    if settings.fan_out_output == "multitrack" and len(get_fan_out_targets(settings)) > len(MELODY_CHANNELS):
+        raise GenerationStopped("-fan_out_output multitrack can hold at most " + str(len(MELODY_CHANNELS)) +
+                                " targets, one for each MIDI channel except the drum channel, not " +
+                                str(len(get_fan_out_targets(settings))) + ", use -fan_out_output files instead")
+
+    if len(settings.pitch_patterns_file) > 0:
+        if settings.candidates > 1 or uses_fan_out(settings) or settings.note_range is not None or \
+                len(settings.variation_file) > 0:
+            raise GenerationStopped("-pitches cannot be combined with -candidates, -min_note, -max_note, " +
+                                    "-variation_file or the -fan_out_... commands, they all work with the keys of " +
+                                    "the scale")
+        if settings.length_in_seconds < 0:
+            raise GenerationStopped("-length_seconds can not be below 0")
+    elif settings.length_in_seconds != 0:
+        raise GenerationStopped("-length_seconds can only be used with -pitches")
+
+    if settings.step_budget < 1 or settings.time_budget < 0:
+        raise GenerationStopped("-step_budget must be at least 1 and -time_budget can not be below 0")
+
+
+def parse_melody_run_commands(segments):
+    global scales
+    print("RUNNING  ARGUMENTS FOR generate_melody_run_commands ")
+
+    # defaults are set inside MelodyRunSettings
+    settings = MelodyRunSettings()
+
+    # region Reading command arguments and setting variables
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-generate melody':
+            i += 1
+        elif segment.startswith('-scale'):
+            settings.scale = segments[i][len('-scale'):].strip()
+            if settings.scale not in get_scale_registry():
+                raise GenerationStopped("Invalid key value for -scale command: " + str(settings.scale) +
+                                        ", must use: \n" + get_all_scale_values_print())
+                pass
+            i += 1
+        elif segment.startswith('-key'):
+            key_str = segments[i][len('-key'):].strip()
+            try:
+                settings.key = Key[key_str]
+            except KeyError:
+                raise GenerationStopped(f"Invalid key value for -key command: {key_str}, must use: \n" +
+                                        get_all_key_values_print())
+            i += 1
+        elif segment.startswith('-octave'):
+            settings.octave = int(segments[i][len('-octave'):].strip())
+            i += 1
+        elif segment.startswith('-directions'):
+            parts = segments[i].split()
+            settings.direction_patterns_file = parts[1]
+            settings.min_direction_patterns = int(parts[2])
+            settings.max_direction_patterns = int(parts[3])
+            i += 1
+        elif segment.startswith('-direction_probabilities'):
+            parts = segments[i].split()
+            settings.direction_probabilities_file = parts[1]
+            settings.direction_pattern_size = int(parts[2])
+            settings.direction_pattern_count = int(parts[3])
+            i += 1
+        elif segment.startswith('-times'):
+            parts = segments[i].split()
+            settings.time_patterns_file = parts[1]
+            settings.min_time_patterns = int(parts[2])
+            settings.max_time_patterns = int(parts[3])
+            i += 1
+        elif segment.startswith('-time_probabilities'):
+            parts = segments[i].split()
+            settings.time_probabilities_file = parts[1]
+            settings.time_pattern_size = int(parts[2])
+            settings.time_pattern_count = int(parts[3])
+            i += 1
+        elif segment.startswith('-pitches'):
+            parts = segments[i].split()
+            settings.pitch_patterns_file = parts[1]
+            settings.min_pitch_patterns = int(parts[2])
+            settings.max_pitch_patterns = int(parts[3])
+            i += 1
+        elif segment.startswith('-length_seconds'):
+            settings.length_in_seconds = float(segments[i][len('-length_seconds'):].strip())
+            i += 1
+        elif segment.startswith('-direction_query'):
+            parts = segments[i][len('-direction_query'):].strip().split(None, 1)
+            settings.direction_query = PatternQuery(parts[0], "direction_patterns", parts[1] if len(parts) > 1 else "")
+            i += 1
+        elif segment.startswith('-time_query'):
+            parts = segments[i][len('-time_query'):].strip().split(None, 1)
+            settings.time_query = PatternQuery(parts[0], "time_patterns", parts[1] if len(parts) > 1 else "")
+            i += 1
+        elif segment.startswith('-fan_out_keys'):
+            for key_str in segments[i][len('-fan_out_keys'):].split():
+                if key_str == "all":
+                    settings.fan_out_keys = list(Key)
+                    break
+                try:
+                    settings.fan_out_keys.append(Key[key_str])
+                except KeyError:
+                    raise GenerationStopped(f"Invalid key value for -fan_out_keys command: {key_str}, must use " +
+                                            "'all' or: \n" + get_all_key_values_print())
+            i += 1
+        elif segment.startswith('-fan_out_scales'):
+            for scale_str in segments[i][len('-fan_out_scales'):].split():
+                if scale_str == "all":
+                    settings.fan_out_scales = get_scale_registry().names()
+                    break
+                if scale_str not in get_scale_registry():
+                    raise GenerationStopped("Invalid value for -fan_out_scales command: " + scale_str +
+                                            ", must use 'all' or: \n" + get_all_scale_values_print())
+                settings.fan_out_scales.append(scale_str)
+            i += 1
+        elif segment.startswith('-fan_out_octaves'):
+            settings.fan_out_octaves = [int(octave) for octave in segments[i][len('-fan_out_octaves'):].split()]
+            i += 1
+        elif segment.startswith('-fan_out_output'):
+            settings.fan_out_output = segments[i][len('-fan_out_output'):].strip()
+            if settings.fan_out_output not in ["files", "multitrack"]:
+                raise GenerationStopped("Invalid value for -fan_out_output command: " + settings.fan_out_output +
+                                        ", must use 'files' or 'multitrack'")
+            i += 1
+        elif segment.startswith('-min_note'):
+            lowest_note = int(segments[i][len('-min_note'):].strip())
+            settings.note_range = (lowest_note, settings.note_range[1] if settings.note_range else 127)
+            i += 1
+        elif segment.startswith('-max_note'):
+            highest_note = int(segments[i][len('-max_note'):].strip())
+            settings.note_range = (settings.note_range[0] if settings.note_range else 0, highest_note)
+            i += 1
+        elif segment.startswith('-candidates'):
+            settings.candidates = int(segments[i][len('-candidates'):].strip())
+            i += 1
+        elif segment.startswith('-step_budget'):
+            settings.step_budget = int(segments[i][len('-step_budget'):].strip())
+            i += 1
+        elif segment.startswith('-time_budget'):
+            settings.time_budget = float(segments[i][len('-time_budget'):].strip())
+            i += 1
+        elif segment.startswith('-keep'):
+            settings.keep = int(segments[i][len('-keep'):].strip())
+            i += 1
+        elif segment.startswith('-metric'):
+            parts = segments[i][len('-metric'):].split()
+            if len(parts) == 0 or parts[0] not in MELODY_METRICS:
+                raise GenerationStopped("Invalid value for -metric command: " + segments[i][len('-metric'):].strip() +
+                                        ", must use one of: " + ", ".join(MELODY_METRICS))
+            settings.metric_weights[parts[0]] = float(parts[1]) if len(parts) > 1 else 1.0
+            i += 1
+        elif segment.startswith('-recipe_store'):
+            settings.recipe_store = segments[i][len('-recipe_store'):].strip()
+            i += 1
+        elif segment.startswith('-variation_file'):
+            settings.variation_file = segments[i][len('-variation_file'):].strip()
+            i += 1
+        elif segment.startswith('-output_file'):
+            settings.output_filename = segments[i][len('-output_file'):].strip()
+            i += 1
+        elif segment.startswith('-percentage_of_scale'):
+            settings.scale_percentage = float(segments[i][len('-percentage_of_scale'):].strip())
+            i += 1
+        elif segment.startswith('-seed'):
+            settings.seed = int(segments[i][len('-seed'):].strip())
+            i += 1
+        elif segment.startswith('-add_random_keys'):
+            settings.add_random_keys = int(segments[i][len('-add_random_keys'):].strip())
+            i += 1
+        elif segment.startswith('-add_extra_key'):
+            key_str = segments[i][len('-add_extra_key'):].strip()
+            try:
+                settings.add_extra_keys.append(Key[key_str])
+            except KeyError:
+                raise GenerationStopped(f"Invalid key value for -add_keys command: {key_str}, must use: \n" +
+                                        get_all_key_values_print())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+    print("scale=" + str(settings.scale))
+    print("key=" + str(settings.key))
+    print("octave=" + str(settings.octave))
+    print("direction_patterns_file=" + str(settings.direction_patterns_file))
+    print("min_direction_patterns=" + str(settings.min_direction_patterns))
+    print("max_direction_patterns=" + str(settings.max_direction_patterns))
+    print("direction_probabilities_file=" + str(settings.direction_probabilities_file))
+    print("direction_pattern_size=" + str(settings.direction_pattern_size))
+    print("direction_pattern_count=" + str(settings.direction_pattern_count))
+    print("time_patterns_file=" + str(settings.time_patterns_file))
+    print("min_time_patterns=" + str(settings.min_time_patterns))
+    print("max_time_patterns=" + str(settings.max_time_patterns))
+    print("time_probabilities_file=" + str(settings.time_probabilities_file))
+    print("time_pattern_size=" + str(settings.time_pattern_size))
+    print("time_pattern_count=" + str(settings.time_pattern_count))
+    print("pitch_patterns_file=" + str(settings.pitch_patterns_file))
+    print("min_pitch_patterns=" + str(settings.min_pitch_patterns))
+    print("max_pitch_patterns=" + str(settings.max_pitch_patterns))
+    print("length_in_seconds=" + str(settings.length_in_seconds))
+    print("direction_query=" + str(settings.direction_query))
+    print("time_query=" + str(settings.time_query))
+    print("fan_out_keys=" + str(settings.fan_out_keys))
+    print("fan_out_scales=" + str(settings.fan_out_scales))
+    print("fan_out_octaves=" + str(settings.fan_out_octaves))
+    print("fan_out_output=" + str(settings.fan_out_output))
+    print("note_range=" + str(settings.note_range))
+    print("candidates=" + str(settings.candidates))
+    print("keep=" + str(settings.keep))
+    print("metric_weights=" + str(settings.metric_weights))
+    print("variation_file=" + str(settings.variation_file))
+    print("recipe_store=" + str(settings.recipe_store))
+    print("step_budget=" + str(settings.step_budget))
+    print("time_budget=" + str(settings.time_budget))
+    print("output_filename=" + str(settings.output_filename))
+    print("scale_percentage=" + str(settings.scale_percentage))
+    print("seed=" + str(settings.seed))
+    print("add_random_keys=" + str(settings.add_random_keys))
+    print("add_extra_keys=" + str(settings.add_extra_keys))
+
+    # endregion
+
+    return settings
+
+
+def uses_generated_pattern_files(settings):
+    """ True when the run commands will write and read the shared 'autogenerated' pattern files """
+    direction_file = settings.direction_probabilities_file.strip()
+    time_file = settings.time_probabilities_file.strip()
+    return len(direction_file) > 0 or len(time_file) > 0
+
+
+def get_generation_budget(settings):
+    return GenerationBudget(settings.step_budget, settings.time_budget)
+
+
+def prepare_generated_pattern_files(settings, generated_name="autogenerated"):
+    """
+    Generates the pattern files of the probability files settings uses, as generated_name inside the
+    direction_patterns and time_patterns folders, and points settings at them.
+    """
+    budget = get_generation_budget(settings)
+
+    # region Generating direction patterns if needed
+    direction_probabilities_file = settings.direction_probabilities_file.strip()
+    if not direction_probabilities_file.endswith(".directionprobabilities"):
+        direction_probabilities_file += ".directionprobabilities"
+
+    # if an existing path was
+    print("Checking " + "direction_probabilities/" + direction_probabilities_file)
+    if len(direction_probabilities_file) > 1 and os.path.exists(
+            "direction_probabilities/" + direction_probabilities_file):
+        print("Generating direction patterns")
+        settings.direction_patterns_file = generated_name
+        # so now just create a file with the direction patterns and change direction_patterns_file
+        # NOTE, an array is inserted so it wont use any run commands this way
+        generate_direction_pattern_command([], direction_probabilities_file,
+                                           settings.direction_pattern_size, settings.direction_pattern_count,
+                                           settings.direction_patterns_file, settings.seed, budget)
+        pass
+
+    # endregion
+
+    # region Generating time patterns if needed
+    time_probabilities_file = settings.time_probabilities_file.strip()
+    if not time_probabilities_file.endswith(".timeprobabilities"):
+        time_probabilities_file += ".timeprobabilities"
+
+    # if an existing path was
+    print("Checking " + "time_probabilities/" + time_probabilities_file)
+    if len(time_probabilities_file) > 1 and os.path.exists(
+            "time_probabilities/" + time_probabilities_file):
+        print("Generating time patterns")
+        settings.time_patterns_file = generated_name
+        # so now just create a file with the direction patterns and change direction_patterns_file
+        # NOTE, an array is inserted so it wont use any run commands this way
+        generate_time_pattern_command([], time_probabilities_file,
+                                      settings.time_pattern_size, settings.time_pattern_count,
+                                      settings.time_patterns_file, settings.seed, budget)
+
+        pass
+
+    # endregion
+
+    return settings
+
+
+def run_job_melody_settings(settings):
+    """
+    Generates the melody of one of many jobs that may run at the same time. Patterns generated from
+    probability files go into files only this call uses and removes again, so other threads, processes or
+    work queue workers never read them half written.
+    """
+    if not uses_generated_pattern_files(settings):
+        return run_melody_settings(settings, write_output=False)
+    import uuid
+    generated_name = "autogenerated_" + uuid.uuid4().hex
+    try:
+        # the pattern generators draw from the shared random module, so jobs of one process take turns
+        with generated_pattern_files_lock:
+            prepare_generated_pattern_files(settings, generated_name)
+            return run_melody_settings(settings, write_output=False)
+    finally:
+        for file_path in ["direction_patterns/" + generated_name + ".directionpatterns",
+                          "time_patterns/" + generated_name + ".timepatterns"]:
+            for path in [file_path, file_path + ".index"]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def run_melody_settings(settings, write_output=True):
+    if len(settings.pitch_patterns_file) > 0:
+        return generate_from_time_and_pitch_patterns(settings.output_filename,
+                                                     settings.key,
+                                                     settings.octave,
+                                                     settings.length_in_seconds,
+                                                     settings.seed,
+                                                     settings.time_query or settings.time_patterns_file,
+                                                     [settings.min_time_patterns, settings.max_time_patterns],
+                                                     settings.pitch_patterns_file,
+                                                     [settings.min_pitch_patterns, settings.max_pitch_patterns],
+                                                     write_output=write_output,
+                                                     budget=get_generation_budget(settings)
+                                                     )
+    if settings.candidates > 1:
+        # only the best candidate is returned, every kept candidate is written
+        return generate_best_candidates(settings, write_output)[0].melody
+    return generate_from_scale_direction_and_time(settings.output_filename,
+                                                  # in the key of
+                                                  settings.key,
+                                                  # using the scale
+                                                  settings.scale,
+                                                  # percentage of scale to use (0.0 - 1.0)
+                                                  settings.scale_percentage,
+                                                  # adding random keys to the scale if needed
+                                                  settings.add_random_keys,
+                                                  # adding extra specific keys to the scale if needed
+                                                  settings.add_extra_keys,
+                                                  # starting octave
+                                                  settings.octave,
+                                                  # seed
+                                                  settings.seed,
+                                                  # time patterns file ---------------------
+                                                  settings.time_query or settings.time_patterns_file,
+                                                  [settings.min_time_patterns, settings.max_time_patterns],
+                                                  # ^^ min to max possible to use
+                                                  # direction patterns file ---------------------
+                                                  settings.direction_query or settings.direction_patterns_file,
+                                                  [settings.min_direction_patterns, settings.max_direction_patterns],
+                                                  # ^^ min to max possible to use
+                                                  write_output=write_output,
+                                                  note_range=settings.note_range,
+                                                  budget=get_generation_budget(settings)
+                                                  )
+
+
+# region Generating direction patterns
+
+def generate_direction_pattern_command(segments, direction_probabilities_file, pattern_size, pattern_count,
+                                       output_file, seed=None, budget=None):
+    print("RUNNING  ARGUMENTS FOR generate_direction_pattern_command ")
+
+    # with a seed the same patterns are generated every time, which melodies generated from them rely on
+    rng = random if seed is None else random.Random(lehmer_seed_combine(seed, SEED_MOD_GENERATE_DIRECTION_PATTERN_COMMAND))
+
+    # region reading command arguments
+
+    if len(segments) > 1:
+        i = 0
+        while i < len(segments):
+            segment = segments[i].strip()
+
+            if segment == '-generate direction pattern':
+                i += 1
+            elif segment.startswith('-probabilities'):
+                direction_probabilities_file = segments[i].split()[1].strip()
+                i += 1
+            elif segment.startswith('-size'):
+                if i + 1 < len(segments):
+                    pattern_size = int(segments[i].split()[1].strip())
+                    i += 1
+                else:
+                    print("Error: Missing value for -size command.")
+                    sys.exit(1)
+            elif segment.startswith('-patterns'):
+                try:
+                    pattern_count = int(segments[i].split()[1].strip())
+                    i += 1
+                except IndexError:
+                    print("Error: Missing value for -patterns command.")
+                    sys.exit(1)
+                except ValueError:
+                    print(f"Error: Invalid value for -patterns command: {segments[i].split()[1].strip()}")
+                    sys.exit(1)
+            else:
+                print(f"Warning: Unrecognized command: {segment}")
+                i += 1
+
+        print("direction_probabilities_file=" + str(direction_probabilities_file))
+        print("pattern_count=" + str(pattern_count))
+        print("pattern_size=" + str(pattern_size))
+
+    # endregion
+
+    # region Main
+
+    # getting probabilities of each step's outcome
+    probabilities = get_direction_probabilities(direction_probabilities_file)
+    check_direction_probabilities(probabilities, direction_probabilities_file)
+    weights = []
+    total_weight = 0
+
+    output_text = ""
+
+    for x in probabilities:
+        total_weight += x[1]
+        weights.append(total_weight)
+
+    for i in range(pattern_count):
+        pattern = [0]
+        j = 0
+        while j < pattern_size:
+            if budget is not None:
+                budget.step("generating direction patterns")
+            reset = False
+            rand_number = rng.uniform(0.0, total_weight)
+            last_move = 0
+            # checking which value to use next
+            for w in range(len(weights)):
+                if rand_number < weights[w]:
+                    value = probabilities[w][0]
+
+                    # region Wildcards
+
+                    # repeat last move wildcard, which moves in the same direction again
+                    if value == 9999:
+                        # in this case the wildcard will not be viable, try another roll
+                        if i == 0:
+                            reset = True
+                            break
+                        else:
+                            # repeat the last move
+                            pattern.append(pattern[len(pattern) - 1])
+                            # print("WILDCARD 0 WAS USED")
+
+                    # endregion
+
+                    # standard, just add the value found
+                    else:
+                        pattern.append(probabilities[w][0])
+
+                    break
+
+            # if resetting, continue and try again
+            if reset:
+                continue
+
+            j += 1
+
+        output_text += "pattern=Pattern " + str(i) + "\n"
+        output_text += ' '.join(map(str, pattern)) + "\n"
+    # endregion
+
+    if len(output_file) > 3:
+        print("Writing to output file " + output_file)
+        output_file = output_file.strip()
+        if not output_file.endswith(".directionpatterns"):
+            output_file += ".directionpatterns"
+        full_path = "direction_patterns/" + output_file
+        path = Path(full_path)
+        # Ensure the folder exists, create it if necessary
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(output_text)
+    else:
+        print(output_text)
+
+
+# endregion
+
+# region Generating time patterns
+
+def generate_time_pattern_command(segments, time_probabilities_file, pattern_size, pattern_count, output_file, seed,
+                                  budget=None):
+    print("Generating time pattern into file: " + output_file)
+    # print("RUNNING  ARGUMENTS FOR generate_time_pattern_command, SEED=" + str(seed))
+    sub_seed = lehmer_seed_combine(seed, SEED_MOD_GENERATE_TIME_PATTERN_COMMAND)
+    seed_modifier = 32
+
+    # region reading command arguments
+
+    if len(segments) > 1:
+        i = 0
+        while i < len(segments):
+            segment = segments[i].strip()
+
+            if segment == '-generate time pattern':
+                i += 1
+            elif segment.startswith('-probabilities'):
+                time_probabilities_file = segments[i].split()[1].strip()
+                i += 1
+            elif segment.startswith('-size'):
+                if i + 1 < len(segments):
+                    pattern_size = int(segments[i].split()[1].strip())
+                    i += 1
+                else:
+                    print("Error: Missing value for -size command.")
+                    sys.exit(1)
+            elif segment.startswith('-patterns'):
+                try:
+                    pattern_count = int(segments[i].split()[1].strip())
+                    i += 1
+                except IndexError:
+                    print("Error: Missing value for -patterns command.")
+                    sys.exit(1)
+                except ValueError:
+                    print(f"Error: Invalid value for -patterns command: {segments[i].split()[1].strip()}")
+                    sys.exit(1)
+            else:
+                print(f"Warning: Unrecognized command: {segment}")
+                i += 1
+
+        print("time_probabilities_file=" + str(time_probabilities_file))
+        print("pattern_count=" + str(pattern_count))
+        print("pattern_size=" + str(pattern_size))
+
+    # endregion
+
+    # region Main
+
+    # getting probabilities of each step's outcome
+    beat_probabilities, rest_probabilities = get_time_probabilities(time_probabilities_file)
+    check_time_probabilities(beat_probabilities, rest_probabilities, time_probabilities_file)
+
+    # print("Beat chances: " + str(beat_probabilities))
+    # print("Rest chances: " + str(rest_probabilities))
+
+    # probabilities = get_time_probabilities(time_probabilities_file)
+    beat_weights = []
+    rest_weights = []
+    total_beats_weight = 0
+    total_rests_weight = 0
+
+    output_text = ""
+
+    for x in beat_probabilities:
+        total_beats_weight += x[1]
+        beat_weights.append(total_beats_weight)
+
+    for x in rest_probabilities:
+        total_rests_weight += x[1]
+        rest_weights.append(total_rests_weight)
+
+    # print("beat_weights: " + str(beat_weights))
+    # print("total_beats_weight: " + str(total_beats_weight))
+    # print("rest_weights: " + str(rest_weights))
+    # print("total_rests_weight: " + str(total_rests_weight))
+    # print("Getting beat pattern with count: " + str(pattern_count) + " and size " + str(pattern_size))
+
+    output_text = "# SEED=" + str(seed) + ", FILE=time_probabilities/" + str(time_probabilities_file) + "\n"
+
+    for i in range(pattern_count):
+        beats = []
+        rests = []
+        output_text += "pattern=Pattern " + str(i) + "\n"
+        output_text += "time_signature=FourFour\n"
+
+        next_beat_value = 0
+        next_rest_value = 0
+
+        j = 0
+        while j < pattern_size:
+            if budget is not None:
+                budget.step("generating time patterns")
+            reset = False
+            # region checking which beat value to add next
+            random.seed(lehmer_seed_combine(sub_seed, seed_modifier))
+            seed_modifier += 32
+            rand_number = random.uniform(0.0, total_beats_weight)
+            for w in range(len(beat_weights)):
+                if rand_number < beat_weights[w]:
+                    value = beat_probabilities[w][0]
+
+                    # region Wildcards
+
+                    # repeat last move wildcard, which moves in the same time again
+                    if value == 9999:
+                        # in this case the wildcard will not be viable, try another roll
+                        if j == 0:
+                            reset = True
+                            break
+                        else:
+                            # repeat the last move
+                            next_beat_value = beats[len(beats) - 1]
+                            # print("WILDCARD 0 WAS USED")
+
+                    # endregion
+
+                    # standard, just add the value found
+                    else:
+                        next_beat_value = beat_probabilities[w][0]
+
+                    break
+
+            # endregion
+
+            # region checking which rest value to add next
+            random.seed(lehmer_seed_combine(sub_seed, seed_modifier))
+            seed_modifier += 32
+            rand_number = random.uniform(0.0, total_beats_weight)
+            for w in range(len(rest_weights)):
+                if rand_number < rest_weights[w]:
+                    value = rest_probabilities[w][0]
+
+                    # region Wildcards
+
+                    # repeat last move wildcard, which moves in the same time again
+                    if value == 9999:
+                        # in this case the wildcard will not be viable, try another roll
+                        if j == 0:
+                            reset = True
+                            break
+                        else:
+                            # repeat the last move
+                            next_rest_value = rests[len(rests) - 1]
+                            # print("WILDCARD 0 WAS USED")
+
+                    # endregion
+
+                    # standard, just add the value found
+                    else:
+                        next_rest_value = rest_probabilities[w][0]
+
+                    break
+
+            # endregion
+
+            #  reset if there is an error, like the repeat-last wildcard being used for a first value
+            if reset:
+                continue
+
+            j += 1
+            # append the values found this iteration
+            beats.append(next_beat_value)
+            rests.append(next_rest_value)
+            output_text += str(next_beat_value) + " " + str(next_rest_value) + "\n"
+
+        # print("Beat pattern: " + str(beats))
+        # print("Rest pattern: " + str(rests))
+
+    # endregion
+
+    if len(output_file) > 3:
+        print("Writing to output file " + output_file)
+        output_file = output_file.strip()
+        if not output_file.endswith(".timepatterns"):
+            output_file += ".timepatterns"
+        full_path = "time_patterns/" + output_file
+        path = Path(full_path)
+        # Ensure the folder exists, create it if necessary
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(output_text)
+    else:
+        print(output_text)
+
+
+# endregion
+
+
+def split_run_commands(command):
+    segments = command.split('-')
+    segments = [segment.strip() for segment in segments if segment.strip()]
+    for i in range(len(segments)):
+        segments[i] = "-" + segments[i]
+    return segments
+
+
+def main_function(arguments):
+    print("process_command_line ---------------------------------------")
+    segments = split_run_commands(' '.join(arguments[1:]))
+
+    for i in range(len(segments)):
+        if segments[i].startswith("-generate melody"):
+            generate_melody_run_commands(segments)
+            pass
+        elif segments[i].startswith("-generate direction pattern"):
+            # defaults are set here for this way
+            generate_direction_pattern_command(segments, "example", 8, 60, "example")
+            pass
+        elif segments[i].startswith("-import patterns"):
+            import_patterns_command(segments)
+            pass
+        elif segments[i].startswith("-learn probabilities"):
+            learn_probabilities_command(segments)
+            pass
+        elif segments[i].startswith("-extract patterns"):
+            extract_patterns_command(segments)
+            pass
+        elif segments[i].startswith("-generate ensemble"):
+            generate_ensemble_command(segments)
+            pass
+        elif segments[i].startswith("-stream melody"):
+            stream_melody_command(segments)
+            pass
+        elif segments[i].startswith("-receive midi"):
+            receive_midi_command(segments)
+            pass
+        elif segments[i].startswith("-generate batch"):
+            generate_batch_command(segments)
+            pass
+        elif segments[i].startswith("-render recipes"):
+            render_recipes_command(segments)
+            pass
+        elif segments[i].startswith("-tune probabilities"):
+            tune_probabilities_command(segments)
+            pass
+        elif segments[i].startswith("-work queue"):
+            work_queue_command(segments)
+            pass
+        elif segments[i].startswith("-benchmark startup"):
+            benchmark_startup_command(segments)
+            pass
+        # print(f"Segment: {segments[i]}")
+
+
+# endregion
+
+# region Scale to midi example
+
+
+def scale_to_midi_example(filename, scale_name, root_key, starting_octave):
+    scale_keys = generate_scale_keys(scale_name, root_key, starting_octave)
+    melody = Melody(tempo=90)
+    beat_size = 0.25
+    # Setting up the melody
+    melody.notes = []
+    melody_start_index = -1
+    for i in range(len(scale_keys)):
+        if scale_keys[i].value == root_key.value:
+            melody_start_index = i
+
+    if melody_start_index == -1:
+        print("ERROR, scale_keys do not contain root_key")
+        exit(1)
+
+    last_key_value = scale_keys[melody_start_index].value
+    for i in range(len(scale_keys)):
+        next_key = scale_keys[i]
+        # if it overflows past GSharp and goes to A
+        if next_key.value < last_key_value:
+            starting_octave += 1
+        # wait time here is half of beat time
+        melody.notes.append(Note(starting_octave, next_key, beat_size, beat_size / 2))
+        last_key_value = next_key.value
+
+    # Print the melody notes
+    print("NOTES:")
+    for note in melody.notes:
+        print(str(note.key) + ", Oct: " + str(note.octave))
+
+    melody.key_signature = root_key
+    melody.time_signature = (4, 4)
+
+    write_to_midi(filename + '.mid', melody, 8)
+
+
+# endregion
+
+# region generate_from_scale_direction_and_time
+
+def insert_key_into_scale(list, key):
+    for i in range(len(list)):
+        if i == 0:
+            # if its less that the first value
+            if key.value < list[i].value:
+                list.insert(0, key)
+                break
+            # if its between the first and second in the list
+            if list[i].value < key.value < list[i + 1].value:
+                list.insert(1, key)
+                break
+        # got to end without finding what its in between, just put on end
+        elif i == len(list) - 1:
+            if key.value > list[i].value:
+                list.append(key)
+                break
+        # checking values that aren't the first or last
+        else:
+            if list[i - 1].value < key.value < list[i].value:
+                list.insert(i, key)
+                break
+    return list
+
+
+def build_generation_scale_keys(root_key, scale_name, scale_use_percentage, add_random_keys_to_scale, add_extra_keys,
+                                starting_octave, seed, rng):
+    """
+    Returns the scale keys a melody is generated with, and the seed_modifier to keep generating with.
+    """
+    scale_keys = generate_scale_keys(scale_name, root_key, starting_octave)
+    seed_modifier = 32
+
+    # region Removing values from scale if needed, to simplify the pieces being made
+
+    if scale_use_percentage < 1:
+        remove_values_count = int(math.floor(len(scale_keys) * scale_use_percentage))
+        for i in range(remove_values_count):
+            rng.seed(lehmer_seed_combine(seed, seed_modifier))
+            seed_modifier += 32
+            # removed anything
+            scale_keys.pop(rng.randint(0, len(scale_keys) - 2))
+
+    # endregion
+
+    # region add_extra_keys
+
+    for key in add_extra_keys:
+        if key not in scale_keys:
+            scale_keys = insert_key_into_scale(scale_keys, key)
+
+    # endregion
+
+    # region Adding random keys to scale if needed
+
+    if add_random_keys_to_scale > 0:
+        possible_keys_to_add = [key for key in list(Key) if key not in scale_keys]
+        for i in range(add_random_keys_to_scale):
+            if len(possible_keys_to_add) > 0:
+                rng.seed(lehmer_seed_combine(seed, SEED_MOD_ADD_RANDOM_KEYS))
+                next_key_index = rng.randint(0, len(possible_keys_to_add) - 1)
+                scale_keys = insert_key_into_scale(scale_keys, possible_keys_to_add[next_key_index])
+                # scale_keys.append(possible_keys_to_add[next_key_index])
+                del possible_keys_to_add[next_key_index]
+            else:
+                break
+
+    # endregion
+
+    return scale_keys, seed_modifier
+
+
+def get_pattern_source_name(source):
+    """ The file name of a pattern source given by name or already opened, for error messages """
+    return source if isinstance(source, str) else getattr(source, "file_path", "the chosen patterns")
+
+
+def choose_generation_patterns(direction_patterns_file, min_to_max_direction_pattern_count,
+                               time_patterns_file, min_to_max_time_pattern_count, seed, seed_modifier, rng):
+    """
+    Returns the direction patterns and time patterns a melody is generated with, and the seed_modifier to
+    keep generating with. Either file can be an already opened pattern source instead (a PatternQuery, an
+    IndexedPatternFile or a SharedPatternSource), anything with len() and load(indexes).
+    """
+
+    # region Indexing the direction and time pattern files
+
+    # only the offset of each pattern is loaded here, the chosen patterns are parsed further down
+    if not isinstance(direction_patterns_file, str):
+        all_direction_patterns = direction_patterns_file
+    else:
+        all_direction_patterns = open_pattern_file("direction_patterns/", direction_patterns_file,
+                                                   parse_direction_pattern_block)
+    if all_direction_patterns is None or len(all_direction_patterns) == 0:
+        raise GenerationStopped("cannot find " + get_pattern_source_name(direction_patterns_file) +
+                                " in the direction_patterns folder or no patterns match.")
+
+    if not isinstance(time_patterns_file, str):
+        all_time_patterns = time_patterns_file
+    else:
+        all_time_patterns = open_pattern_file("time_patterns/", time_patterns_file, parse_time_pattern_block)
+    if all_time_patterns is None or len(all_time_patterns) == 0:
+        raise GenerationStopped("cannot find " + get_pattern_source_name(time_patterns_file) +
+                                " in the time_patterns folder or no patterns match.")
+
+    # endregion
+
+    # region Choosing which direction patterns will be available for this output
+
+    # getting direction patterns
+    use_direction_indexes = generate_random_indexes(all_direction_patterns, lehmer_seed_combine(seed, seed_modifier),
+                                                    min_to_max_direction_pattern_count, rng)
+    seed_modifier += 32
+    # print("Direction indexes: " + str(use_direction_indexes))
+    direction_patterns = all_direction_patterns.load(use_direction_indexes)
+    for i, direction_pattern in zip(use_direction_indexes, direction_patterns):
+        print(direction_pattern)
+        if i > 0 and direction_pattern.direction_changes[0] == 0:
+            # deleting the first zero since it indicates playing the first note in the data
+            del direction_pattern.direction_changes[0]
+
+    # getting time_patterns
+    use_time_indexes = generate_random_indexes(all_time_patterns, lehmer_seed_combine(seed, seed_modifier),
+                                               min_to_max_time_pattern_count, rng)
+    seed_modifier += 32
+    # print("Time indexes: " + str(use_time_indexes))
+    time_patterns = all_time_patterns.load(use_time_indexes)
+
+    # endregion
+
+    check_generation_patterns(direction_patterns, time_patterns)
+    return direction_patterns, time_patterns, seed_modifier
+
+
+def sample_melody_plan(direction_patterns, time_patterns, scale_size, seed, seed_modifier, rng, beat_count,
+                       budget=None):
+    """
+    Walks the direction and time patterns into a MelodyPlan. Nothing here depends on the key, only on the
+    number of keys in the scale, so one plan can be rendered into any key and scale afterwards.\n
+    budget: GenerationBudget - counts every planned note, or None for no limit
+    """
+    plan = MelodyPlan()
+
+    # id rather start at a random position within the key
+    # sounds bad having it always start with the same note
+    plan.start_index = rng.randint(0, scale_size - 1)
+    plan.scale_size = scale_size
+
+    time_pattern_i = 0
+    current_time_pattern_index = 0
+    time_passed = 0
+
+    # deciding on next direction_patter
+    rng.seed(lehmer_seed_combine(seed, seed_modifier))
+    seed_modifier *= 32
+    next_direction_pattern_index = rng.randint(0, len(direction_patterns) - 1)
+    direction_change_index = 0
+
+    while time_passed < beat_count:
+        if budget is not None:
+            budget.step("planning the melody")
+        direction_change = direction_patterns[next_direction_pattern_index].direction_changes[direction_change_index]
+
+        rng.seed(lehmer_seed_combine(seed, seed_modifier))
+        seed_modifier += 32
+
+        play_time = time_patterns[time_pattern_i].beat_times[current_time_pattern_index].play_time
+        rest_time = time_patterns[time_pattern_i].beat_times[current_time_pattern_index].rest_time
+        time_passed = time_passed + play_time + rest_time
+        plan.direction_changes.append(direction_change)
+        plan.play_times.append(play_time)
+        plan.rest_times.append(rest_time)
+
+        current_time_pattern_index += 1
+        if current_time_pattern_index == len(time_patterns[time_pattern_i].beat_times):
+            current_time_pattern_index = 0
+
+        direction_change_index += 1
+        if direction_change_index == len(direction_patterns[next_direction_pattern_index].direction_changes):
+            # set next random pattern
+            rng.seed(lehmer_seed_combine(seed, seed_modifier))
+            seed_modifier *= 32
+            next_direction_pattern_index = rng.randint(0, len(direction_patterns) - 1)
+            direction_change_index = 0
+
+    return plan
+
+
+def get_midi_pitch(key, octave):
+    # in case the pitch is off in the output and needs to be shifted, the same as build_melody_track
+    library_alignment_value = -4
+    return key.value + (octave + 1) * 12 + library_alignment_value
+
+
+def get_scale_positions(plan, scale_keys, starting_octave=0, note_range=None):
+    """
+    Returns the keys to walk around (the scale without its repeated last key) and the position inside
+    them of every note of the plan, positions past the end of the keys are in the next octaves up.\n
+    note_range: (int, int) - lowest and highest MIDI pitch allowed, or None for no limit
+    """
+    keys = list(scale_keys)
+    # if the scale contains a final key which is the same as the first key, just remove it
+    if len(keys) > 1 and keys[len(keys) - 1] == keys[0]:
+        del keys[len(keys) - 1]
+    key_count = len(keys)
+
+    # the last position of each key, which is where a jump starts from
+    last_positions = {}
+    for i in range(len(keys)):
+        last_positions[keys[i].value] = i
+
+    start_key = scale_keys[plan.start_index % len(scale_keys)]
+    start_position = last_positions.get(start_key.value, 0)
+
+    if len(last_positions) == len(keys):
+        def jump(position, direction_change):
+            return position + direction_change
+    else:
+        # a key is in the scale twice, so every jump starts again from the last copy of the current key
+        def jump(position, direction_change):
+            octave_step, key_index = divmod(position, key_count)
+            return octave_step * key_count + last_positions[keys[key_index].value] + direction_change
+
+    if note_range is not None:
+        positions = get_range_limited_positions(plan, keys, starting_octave, start_position, jump, note_range)
+    elif len(last_positions) == len(keys):
+        positions = list(itertools.accumulate(plan.direction_changes, initial=start_position))
+    else:
+        positions = [start_position]
+        for direction_change in plan.direction_changes:
+            positions.append(jump(positions[len(positions) - 1], direction_change))
+    return keys, start_key, positions
+
+
+def get_range_limited_positions(plan, keys, starting_octave, start_position, jump, note_range):
+    """
+    Walks the plan without leaving note_range. Every position inside the range gets the jumps of the plan
+    that stay inside it worked out up front, so a jump that would leave the range is swapped for one that
+    doesn't in a single lookup: the same jump in the other direction if it fits, otherwise the closest that fits.
+    """
+    key_count = len(keys)
+    lowest_note, highest_note = note_range
+
+    def pitch_of(position):
+        octave_step, key_index = divmod(position, key_count)
+        return get_midi_pitch(keys[key_index], starting_octave + octave_step)
+
+    # region Precomputing the allowed jumps from every position inside the range
+
+    # one octave of room either side, since the library's octaves don't start on the same key as the scale
+    lowest_octave_step = (lowest_note + 4) // 12 - 1 - starting_octave - 1
+    highest_octave_step = (highest_note + 4) // 12 - 1 - starting_octave + 1
+    in_range = [position for position in range(lowest_octave_step * key_count, (highest_octave_step + 1) * key_count)
+                if lowest_note <= pitch_of(position) <= highest_note]
+    in_range_set = set(in_range)
+    jump_sizes = sorted(set(plan.direction_changes) | {0})
+    allowed_jumps = {}
+    for position in in_range:
+        allowed_jumps[position] = frozenset(direction_change for direction_change in jump_sizes
+                                            if jump(position, direction_change) in in_range_set)
+
+    # endregion
+
+    position = start_position
+    if position not in in_range_set:
+        start_pitch = pitch_of(position)
+        position = min(in_range, key=lambda option: (abs(pitch_of(option) - start_pitch), option))
+
+    positions = [position]
+    for direction_change in plan.direction_changes:
+        allowed = allowed_jumps[position]
+        if direction_change not in allowed:
+            if -direction_change in allowed:
+                direction_change = -direction_change
+            else:
+                direction_change = min(allowed, key=lambda option: (abs(option - direction_change), option))
+        position = jump(position, direction_change)
+        positions.append(position)
+    return positions
+
+
+def check_note_range(scale_keys, starting_octave, note_range):
+    """ True if at least one key of the scale can be played inside note_range """
+    lowest_note, highest_note = note_range
+    for key in scale_keys:
+        for octave in range(-2, 12):
+            if lowest_note <= get_midi_pitch(key, octave) <= highest_note:
+                return True
+    return False
+
+
+def render_melody_plan(plan, scale_keys, starting_octave, tempo=90, note_range=None):
+    """
+    Turns a MelodyPlan into the notes of a Melody using scale_keys, one table lookup per note.\n
+    note_range: (int, int) - lowest and highest MIDI pitch allowed, or None for no limit
+    """
+    keys, start_key, positions = get_scale_positions(plan, scale_keys, starting_octave, note_range)
+    key_count = len(keys)
+
+    melody = Melody(tempo=tempo)
+    # getting up the first position before the pitch changes happen, it always lasts half a beat
+    play_times = [0.5] + list(plan.play_times)
+    rest_times = [0.5] + list(plan.rest_times)
+    octave_steps, key_indexes = zip(*(divmod(position, key_count) for position in positions))
+    melody.notes = [Note(starting_octave + octave_step, keys[key_index], play_time, rest_time)
+                    for octave_step, key_index, play_time, rest_time
+                    in zip(octave_steps, key_indexes, play_times, rest_times)]
+    return melody
+
+
+def generate_from_scale_direction_and_time(filename, root_key, scale_name, scale_use_percentage, add_random_keys_to_scale, add_extra_keys,
+                                           starting_octave, seed,
+                                           time_patterns_file, min_to_max_time_pattern_count,
+                                           direction_patterns_file, min_to_max_direction_pattern_count,
+                                           write_output=True, note_range=None, budget=None):
+    # region Initial setup
+
+    generate_start = time.perf_counter()
+    beat_count = MELODY_BEAT_COUNT # add changing this later
+
+    # a local generator keeps the output tied to the seed, even when several melodies are generated at once
+    rng = random.Random()
+
+    # either file can be a PatternQuery instead, to pick from a pattern database
+    if isinstance(direction_patterns_file, str) and not direction_patterns_file.endswith(".directionpatterns"):
+        direction_patterns_file += ".directionpatterns"
+
+    if isinstance(time_patterns_file, str) and not time_patterns_file.endswith(".timepatterns"):
+        time_patterns_file += ".timepatterns"
+
+    # endregion
+
+    # region Error checking
+
+    if len(min_to_max_time_pattern_count) != 2:
+        raise GenerationStopped("min_to_max_time_pattern_count must be a list with two integers")
+
+    if len(min_to_max_direction_pattern_count) != 2:
+        raise GenerationStopped("min_to_max_direction_pattern_count must be a list with two integers")
+
+    # endregion
+
+    # region Heading text
+
+    print("\n")
+    print("Generating Melody: filename=" + str(filename) + ".mid" +
+          ", root_key=" + str(root_key) +
+          ", scale_name=" + str(scale_name) +
+          ", starting_octave=" + str(starting_octave) +
+          ", seed=" + str(seed) +
+          ", time_patterns_file=" + str(time_patterns_file) +
+          ", min_to_max_time_pattern_count=" + str(min_to_max_time_pattern_count),
+          ", direction_patterns_file=" + str(direction_patterns_file) +
+          ", min_to_max_direction_pattern_count=" + str(min_to_max_direction_pattern_count)
+          )
+
+    # endregion
+
+    scale_keys, seed_modifier = build_generation_scale_keys(root_key, scale_name, scale_use_percentage,
+                                                            add_random_keys_to_scale, add_extra_keys,
+                                                            starting_octave, seed, rng)
+
+    # scale_keys contains the scale. time_patterns contains the beat timing. direction_patterns contains the jumps
+    # to make around the scale
+    direction_patterns, time_patterns, seed_modifier = choose_generation_patterns(
+        direction_patterns_file, min_to_max_direction_pattern_count,
+        time_patterns_file, min_to_max_time_pattern_count, seed, seed_modifier, rng)
+
+    print("SCALE KEYS: " + str(scale_keys))
+
+    if note_range is not None and not check_note_range(scale_keys, starting_octave, note_range):
+        raise GenerationStopped("no key of the scale " + str(scale_keys) + " is between notes " + str(note_range[0]) +
+                                " and " + str(note_range[1]))
+
+    plan = sample_melody_plan(direction_patterns, time_patterns, len(scale_keys), seed, seed_modifier, rng, beat_count,
+                              budget)
+    melody = render_melody_plan(plan, scale_keys, starting_octave, note_range=note_range)
+    metric_generate_seconds.observe(time.perf_counter() - generate_start)
+    metric_melodies_generated.inc()
+    metric_notes_generated.inc(len(melody.notes))
+
+    print("MELODY FOUND")
+    for x in melody.notes:
+        print("     " + str(x))
+    if write_output:
+        write_to_midi(filename + '.mid', melody, beat_count)
+    return melody
+
+
+# endregion
+
+# region Generating with pitch and time patterns
+
+
+def get_pattern_note_count(beat_times, beat_count):
+    """
+    How many notes cycling through beat_times takes to fill beat_count beats, the same count as adding
+    one note at a time until the melody lasts at least beat_count beats.
+    """
+    note_ends = list(itertools.accumulate(pnt.play_time + pnt.rest_time for pnt in beat_times))
+    full_cycles, remaining_beats = divmod(beat_count, note_ends[len(note_ends) - 1])
+    note_count = int(full_cycles) * len(beat_times)
+    if remaining_beats > 0:
+        note_count += bisect.bisect_left(note_ends, remaining_beats) + 1
+    return max(note_count, 1)
+
+
+def generate_from_time_and_pitch_patterns(filename, root_key, starting_octave, length_in_seconds, seed,
+                                          time_patterns_file, min_to_max_time_pattern_count,
+                                          pitch_patterns_file, min_to_max_pitch_pattern_count,
+                                          write_output=True, budget=None, tempo=90):
+    """
+    Plays the chosen pitch patterns (semitone changes) one after another from the root key, on the beat times
+    of the chosen time patterns, cycling through both until length_in_seconds is filled. The key and scale
+    positions are never walked note by note, every pitch comes out of one running sum over the pitch changes.\n
+    length_in_seconds: float - 0 for the usual MELODY_BEAT_COUNT beats\n
+    budget: GenerationBudget - counts every note, or None for no limit
+    """
+    # region Initial setup
+
+    generate_start = time.perf_counter()
+    seed_modifier = 64
+    rng = random.Random()
+    beat_count = length_in_seconds * tempo / 60 if length_in_seconds > 0 else MELODY_BEAT_COUNT
+
+    # either file can be an already opened pattern source instead, the time patterns file a PatternQuery as well
+    if isinstance(time_patterns_file, str) and not time_patterns_file.endswith(".timepatterns"):
+        time_patterns_file += ".timepatterns"
+    if isinstance(pitch_patterns_file, str) and not pitch_patterns_file.endswith(".pitchpatterns"):
+        pitch_patterns_file += ".pitchpatterns"
+
+    # endregion
+
+    # region Error checking
+
+    if len(min_to_max_time_pattern_count) != 2:
+        raise GenerationStopped("min_to_max_time_pattern_count must be a list with two integers")
+
+    if len(min_to_max_pitch_pattern_count) != 2:
+        raise GenerationStopped("min_to_max_pitch_pattern_count must be a list with two integers")
+
+    # endregion
+
+    # region Heading text
+
+    print("\n")
+    print("Generating Melody: filename=" + str(filename) + ".mid" +
+          ", root_key=" + str(root_key) +
+          ", starting_octave=" + str(starting_octave) +
+          ", length_in_seconds=" + str(length_in_seconds) +
+          ", seed=" + str(seed) +
+          ", time_patterns_file=" + str(time_patterns_file) +
+          ", min_to_max_time_pattern_count=" + str(min_to_max_time_pattern_count) +
+          ", pitch_patterns_file=" + str(pitch_patterns_file) +
+          ", min_to_max_pitch_pattern_count=" + str(min_to_max_pitch_pattern_count)
+          )
+
+    # endregion
+
+    # region Choosing the time patterns and pitch patterns
+
+    if not isinstance(time_patterns_file, str):
+        all_time_patterns = time_patterns_file
+    else:
+        all_time_patterns = open_pattern_file("time_patterns/", time_patterns_file, parse_time_pattern_block)
+    if all_time_patterns is None or len(all_time_patterns) == 0:
+        raise GenerationStopped("cannot find " + get_pattern_source_name(time_patterns_file) +
+                                " in the time_patterns folder or no patterns match.")
+
+    if not isinstance(pitch_patterns_file, str):
+        all_pitch_patterns = pitch_patterns_file
+    else:
+        all_pitch_patterns = open_pattern_file("pitch_patterns/", pitch_patterns_file, parse_pitch_pattern_block)
+    if all_pitch_patterns is None or len(all_pitch_patterns) == 0:
+        raise GenerationStopped("cannot find " + get_pattern_source_name(pitch_patterns_file) +
+                                " in the pitch_patterns folder or nothing is inside the file.")
+
+    use_time_indexes = generate_random_indexes(all_time_patterns, lehmer_seed_combine(seed, seed_modifier),
+                                               min_to_max_time_pattern_count, rng)
+    seed_modifier += 32
+    time_patterns = all_time_patterns.load(use_time_indexes)
+
+    use_pitch_indexes = generate_random_indexes(all_pitch_patterns, lehmer_seed_combine(seed, seed_modifier),
+                                                min_to_max_pitch_pattern_count, rng)
+    seed_modifier += 32
+    pitch_patterns = all_pitch_patterns.load(use_pitch_indexes)
+
+    check_generation_patterns([], time_patterns)
+    for pattern in pitch_patterns:
+        print(pattern)
+        if len(pattern.pitch_changes) == 0:
+            raise GenerationStopped("pitch pattern " + str(pattern.name) + " has no pitch changes")
+
+    # endregion
+
+    # region Working out every pitch at once
+
+    beat_times = [pnt for pattern in time_patterns for pnt in pattern.beat_times]
+    # a leading zero only marks the first note of a pattern, which is the last note of the one before it
+    pitch_changes = [change for pattern in pitch_patterns
+                     for change in pattern.pitch_changes[1 if pattern.pitch_changes[0] == 0 else 0:]] or [0]
+
+    note_count = get_pattern_note_count(beat_times, beat_count)
+    if budget is not None:
+        budget.step("planning the melody", note_count)
+
+    # semitones counted from C of octave 0, the same as transpose_note
+    start_semitone = starting_octave * 12 + root_key.value - 1
+    semitones = list(itertools.accumulate(itertools.islice(itertools.cycle(pitch_changes), note_count - 1),
+                                          initial=start_semitone))
+    lowest_octave, lowest_key_index = divmod(min(semitones), 12)
+    highest_octave, highest_key_index = divmod(max(semitones), 12)
+    lowest_pitch = get_midi_pitch(Key(lowest_key_index + 1), lowest_octave)
+    highest_pitch = get_midi_pitch(Key(highest_key_index + 1), highest_octave)
+    if lowest_pitch < 0 or highest_pitch > 127:
+        raise GenerationStopped("the pitch patterns walk the melody outside of MIDI notes 0 to 127 from octave " +
+                                str(starting_octave) + ", use another -octave or other pitch patterns")
+
+    # endregion
+
+    melody = Melody(tempo=tempo)
+    melody.beat_count = beat_count
+    melody.notes = [Note(octave, Key(key_index + 1), pnt.play_time, pnt.rest_time)
+                    for (octave, key_index), pnt in zip(map(divmod, semitones, itertools.repeat(12)),
+                                                        itertools.cycle(beat_times))]
+    metric_generate_seconds.observe(time.perf_counter() - generate_start)
+    metric_melodies_generated.inc()
+    metric_notes_generated.inc(len(melody.notes))
+
+    print("MELODY FOUND: " + str(len(melody.notes)) + " notes over " + str(beat_count) + " beats")
+    if write_output:
+        write_to_midi(filename + '.mid', melody, beat_count)
+    return melody
+
+
+# endregion
+
+# region Key and scale fan out
+
+def uses_fan_out(settings):
+    return len(settings.fan_out_keys) > 0 or len(settings.fan_out_scales) > 0 or len(settings.fan_out_octaves) > 0
+
+
+def get_fan_out_targets(settings):
+    """ Every (scale, key, octave) the melody is rendered into, missing lists use the normal run command """
+    return list(itertools.product(settings.fan_out_scales or [settings.scale],
+                                  settings.fan_out_keys or [settings.key],
+                                  settings.fan_out_octaves or [settings.octave]))
+
+
+def generate_fan_out(settings, write_output=True):
+    """
+    Samples the direction and time patterns once for the seed, then renders that same melody into every
+    fan out target. Returns a list of (scale, key, octave, melody).
+    """
+    beat_count = MELODY_BEAT_COUNT
+    rng = random.Random()
+    seed = settings.seed
+
+    direction_patterns_file = settings.direction_query or settings.direction_patterns_file
+    time_patterns_file = settings.time_query or settings.time_patterns_file
+    if isinstance(direction_patterns_file, str) and not direction_patterns_file.endswith(".directionpatterns"):
+        direction_patterns_file += ".directionpatterns"
+    if isinstance(time_patterns_file, str) and not time_patterns_file.endswith(".timepatterns"):
+        time_patterns_file += ".timepatterns"
+
+    # region Sampling the melody once, the same way the normal run command would
+
+    scale_keys, seed_modifier = build_generation_scale_keys(settings.key, settings.scale, settings.scale_percentage,
+                                                            settings.add_random_keys, settings.add_extra_keys,
+                                                            settings.octave, seed, rng)
+    direction_patterns, time_patterns, seed_modifier = choose_generation_patterns(
+        direction_patterns_file, [settings.min_direction_patterns, settings.max_direction_patterns],
+        time_patterns_file, [settings.min_time_patterns, settings.max_time_patterns], seed, seed_modifier, rng)
+    plan = sample_melody_plan(direction_patterns, time_patterns, len(scale_keys), seed, seed_modifier, rng, beat_count,
+                              get_generation_budget(settings))
+
+    # endregion
+
+    # region Rendering every target
+
+    # the scale changes below are seeded, so each target gets the same changes the normal run command would make
+    changes_scale = settings.scale_percentage < 1 or settings.add_random_keys > 0 or len(settings.add_extra_keys) > 0
+    results = []
+    for scale_name, key, octave in get_fan_out_targets(settings):
+        if changes_scale:
+            target_scale_keys, _ = build_generation_scale_keys(key, scale_name, settings.scale_percentage,
+                                                               settings.add_random_keys, settings.add_extra_keys,
+                                                               octave, seed, random.Random())
+        else:
+            target_scale_keys = get_scale_registry().get_table(scale_name, key).keys
+        if settings.note_range is not None and not check_note_range(target_scale_keys, octave, settings.note_range):
+            raise GenerationStopped("no key of the scale " + scale_name + " in " + key.name + " is inside the " +
+                                    "note range " + str(settings.note_range))
+        results.append((scale_name, key, octave, render_melody_plan(plan, target_scale_keys, octave,
+                                                                    note_range=settings.note_range)))
+
+    # endregion
+
+    print("FAN OUT RENDERED " + str(len(results)) + " MELODIES")
+
+    # region Writing every target in one pass
+
+    if write_output:
+        if settings.fan_out_output == "multitrack":
+            midi = build_multitrack_midi_file([result[3] for result in results], beat_count,
+                                              [get_fan_out_name(result) for result in results])
+            write_output_bytes(settings.output_filename + "_fan_out.mid", midi_to_bytes(midi))
+        else:
+            for result in results:
+                midi = build_midi_file(result[3], beat_count)
+                write_output_bytes(settings.output_filename + "_" + get_fan_out_name(result) + ".mid",
+                                   midi_to_bytes(midi))
+
+    # endregion
+
+    return results
+
+
+def get_fan_out_name(result):
+    scale_name, key, octave, _ = result
+    return scale_name + "_" + key.name + "_octave" + str(octave)
+
+
+# endregion
+
+# region Best of many candidates
+
+def get_melody_range_score(pitches, intervals, root_pitch_class):
+    """ 1 while the melody fits inside an octave, falling off the further it spreads past one """
+    span = max(pitches) - min(pitches)
+    return 1.0 if span <= 12 else 12 / span
+
+
+def get_melody_leap_score(pitches, intervals, root_pitch_class):
+    """ Share of the note changes that are steps (2 semitones or less) instead of leaps """
+    if len(intervals) == 0:
+        return 1.0
+    return sum(1 for interval in intervals if abs(interval) <= 2) / len(intervals)
+
+
+def get_melody_entropy_score(pitches, intervals, root_pitch_class):
+    """ Shannon entropy of the intervals used, from 0 (always the same interval) to 1 (never the same twice) """
+    if len(intervals) < 2:
+        return 0.0
+    total = len(intervals)
+    entropy = -sum(count / total * math.log2(count / total) for count in collections.Counter(intervals).values())
+    return entropy / math.log2(total)
+
+
+def get_melody_tonic_ending_score(pitches, intervals, root_pitch_class):
+    """ 1 when the last note is the root key of the melody, in any octave """
+    return 1.0 if pitches[len(pitches) - 1] % 12 == root_pitch_class else 0.0
+
+
+# every metric gets (pitches, intervals, root_pitch_class) and returns a score where higher is better,
+# more metrics can be added here and picked with '-metric name weight'
+MELODY_METRICS = {
+    "range": get_melody_range_score,
+    "steps": get_melody_leap_score,
+    "interval_entropy": get_melody_entropy_score,
+    "tonic_ending": get_melody_tonic_ending_score,
+}
+
+
+class SharedPatternSource:
+    def __init__(self, source):
+        """
+        Wraps an opened pattern source so every pattern is only read and parsed once, however many
+        candidates pick it. load() hands out copies since the patterns are changed after loading.\n
+        source: IndexedPatternFile or PatternQuery
+        """
+        self.source = source
+        self.patterns = {}
+        # the voices of an ensemble load from the same source at once
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.source)
+
+    def load(self, indexes):
+        with self.lock:
+            missing = [i for i in dict.fromkeys(indexes) if i not in self.patterns]
+            metric_pattern_cache_hits.inc(len(indexes) - len(missing))
+            metric_pattern_cache_misses.inc(len(missing))
+            for i, pattern in zip(missing, self.source.load(missing)):
+                self.patterns[i] = pattern
+        return [copy.deepcopy(self.patterns[i]) for i in indexes]
+
+
+class MelodyCandidate:
+    def __init__(self, seed, melody):
+        """
+        seed: int - the seed the candidate was generated with, running with it gives the same melody\n
+        melody: Melody\n
+        metric_scores: dict - metric name -> score\n
+        score: float - the weighted sum of the metric scores
+        """
+        self.seed = seed
+        self.melody = melody
+        self.metric_scores = {}
+        self.score = 0.0
+
+
+def open_shared_pattern_source(patterns_file, folder, extension, parse_block):
+    if not isinstance(patterns_file, str):
+        return SharedPatternSource(patterns_file)
+    if not patterns_file.endswith(extension):
+        patterns_file += extension
+    source = open_pattern_file(folder, patterns_file, parse_block)
+    if source is None:
+        raise GenerationStopped("cannot find file " + patterns_file + " in the " + folder + " folder.")
+    return SharedPatternSource(source)
+
+
+def score_melody_candidate(candidate, metric_weights, root_pitch_class):
+    pitches = [get_midi_pitch(note.key, note.octave) for note in candidate.melody.notes]
+    intervals = [after - before for before, after in itertools.pairwise(pitches)]
+    for name, weight in metric_weights.items():
+        candidate.metric_scores[name] = MELODY_METRICS[name](pitches, intervals, root_pitch_class)
+        candidate.score += weight * candidate.metric_scores[name]
+    return candidate
+
+
+def generate_best_candidates(settings, write_output=True):
+    """
+    Generates settings.candidates melodies in memory, each with its own seed (the first one being the
+    run's own seed), scores them and writes only the settings.keep best. Returns the kept MelodyCandidates,
+    best first.
+    """
+    beat_count = MELODY_BEAT_COUNT
+    metric_weights = settings.metric_weights or {name: 1.0 for name in MELODY_METRICS}
+    root_pitch_class = get_midi_pitch(settings.key, 0) % 12
+
+    # region Opening the patterns once for every candidate
+
+    direction_patterns = open_shared_pattern_source(settings.direction_query or settings.direction_patterns_file,
+                                                    "direction_patterns/", ".directionpatterns",
+                                                    parse_direction_pattern_block)
+    time_patterns = open_shared_pattern_source(settings.time_query or settings.time_patterns_file,
+                                               "time_patterns/", ".timepatterns", parse_time_pattern_block)
+
+    # endregion
+
+    # region Generating and scoring the candidates
+
+    seed_rng = random.Random(settings.seed)
+    seeds = [settings.seed] + [seed_rng.randint(100000000, 999999999) for _ in range(settings.candidates - 1)]
+    # one budget for every candidate, they are all part of the same job
+    budget = get_generation_budget(settings)
+    candidates = []
+    for seed in seeds:
+        rng = random.Random()
+        scale_keys, seed_modifier = build_generation_scale_keys(settings.key, settings.scale,
+                                                                settings.scale_percentage, settings.add_random_keys,
+                                                                settings.add_extra_keys, settings.octave, seed, rng)
+        if settings.note_range is not None and not check_note_range(scale_keys, settings.octave, settings.note_range):
+            raise GenerationStopped("no key of the scale " + str(scale_keys) + " is inside the note range " +
+                                    str(settings.note_range))
+        chosen_direction_patterns, chosen_time_patterns, seed_modifier = choose_generation_patterns(
+            direction_patterns, [settings.min_direction_patterns, settings.max_direction_patterns],
+            time_patterns, [settings.min_time_patterns, settings.max_time_patterns], seed, seed_modifier, rng)
+        plan = sample_melody_plan(chosen_direction_patterns, chosen_time_patterns, len(scale_keys), seed,
+                                  seed_modifier, rng, beat_count, budget)
+        melody = render_melody_plan(plan, scale_keys, settings.octave, note_range=settings.note_range)
+        candidates.append(score_melody_candidate(MelodyCandidate(seed, melody), metric_weights, root_pitch_class))
+
+    # endregion
+
+    # the earlier candidate wins a tie, so the run's own seed is kept when nothing scores better
+    kept = sorted(candidates, key=lambda candidate: -candidate.score)[:settings.keep]
+
+    print("KEPT " + str(len(kept)) + " OF " + str(len(candidates)) + " CANDIDATES")
+    for rank, candidate in enumerate(kept, start=1):
+        print("     " + str(rank) + ". seed " + str(candidate.seed) + ", score " + str(round(candidate.score, 4)) +
+              ", " + str({name: round(score, 4) for name, score in candidate.metric_scores.items()}))
+
+    # region Writing the kept candidates
+
+    if write_output:
+        for rank, candidate in enumerate(kept, start=1):
+            write_output_bytes(settings.output_filename + "_best" + str(rank) + ".mid",
+                               midi_to_bytes(build_midi_file(candidate.melody, beat_count)))
+        scores = {"candidates": len(candidates), "metric_weights": metric_weights,
+                  "kept": [{"rank": rank, "seed": candidate.seed, "score": candidate.score,
+                            "metric_scores": candidate.metric_scores}
+                           for rank, candidate in enumerate(kept, start=1)]}
+        write_output_bytes(settings.output_filename + ".scores.json", json.dumps(scores, indent=2).encode("utf-8"))
+
+    # endregion
+
+    return kept
+
+
+# endregion
+
+# region Ensembles
+
+class EnsembleVoice:
+    def __init__(self, name, segments):
+        """
+        name: string - the track name of the voice\n
+        segments: string[] - the '-generate melody' run commands of the voice\n
+        settings: MelodyRunSettings\n
+        melody: Melody - None until the voice is generated\n
+        error: string - None unless generating the voice failed
+        """
+        self.name = name
+        self.segments = segments
+        self.settings = None
+        self.melody = None
+        self.error = None
+
+
+def share_voice_patterns(voices):
+    """
+    Points every voice reading the same pattern file or query at one SharedPatternSource, so each pattern is
+    only parsed once for the whole ensemble. Voices generating their patterns from probabilities get new
+    patterns for their own seed, so they are left as they are.
+    """
+    sources = {}
+
+    def get_source(patterns_file, folder, extension, parse_block):
+        name = folder + str(patterns_file)
+        if name not in sources:
+            sources[name] = open_shared_pattern_source(patterns_file, folder, extension, parse_block)
+        return sources[name]
+
+    for voice in voices:
+        settings = voice.settings
+        if uses_generated_pattern_files(settings):
+            continue
+        if len(settings.pitch_patterns_file) > 0:
+            settings.pitch_patterns_file = get_source(settings.pitch_patterns_file, "pitch_patterns/",
+                                                      ".pitchpatterns", parse_pitch_pattern_block)
+        else:
+            settings.direction_patterns_file = get_source(
+                settings.direction_query or settings.direction_patterns_file, "direction_patterns/",
+                ".directionpatterns", parse_direction_pattern_block)
+            settings.direction_query = None
+        settings.time_patterns_file = get_source(settings.time_query or settings.time_patterns_file, "time_patterns/",
+                                                 ".timepatterns", parse_time_pattern_block)
+        settings.time_query = None
+    return sources
+
+
+def generate_ensemble(voices, workers):
+    """ Generates the melody of every voice, workers voices at a time, sharing their pattern files """
+    share_voice_patterns(voices)
+    pending_voices = queue.Queue()
+    for voice in voices:
+        pending_voices.put(voice)
+
+    def voice_worker():
+        while True:
+            try:
+                voice = pending_voices.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                voice.melody = run_job_melody_settings(voice.settings)
+            except (Exception, SystemExit) as e:
+                # exit() is used for bad input inside generation
+                voice.error = str(e) if not isinstance(e, SystemExit) else "stopped with exit code " + str(e.code)
+
+    threads = [threading.Thread(target=voice_worker) for _ in range(min(workers, len(voices)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return voices
+
+
+def generate_ensemble_command(segments):
+    print("RUNNING  ARGUMENTS FOR generate_ensemble_command ")
+
+    # region Setting defaults
+
+    output_filename = "ensemble_generated"
+    seed = random.randint(100000000, 999999999)
+    workers = 4
+    # run commands given before the first '-voice' are used by every voice
+    shared_segments = []
+    voices = []
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-generate ensemble':
+            i += 1
+        elif segment.startswith('-voice'):
+            name = segments[i][len('-voice'):].strip() or "voice" + str(len(voices))
+            voices.append(EnsembleVoice(name, []))
+            i += 1
+        elif len(voices) > 0:
+            voices[len(voices) - 1].segments.append(segment)
+            i += 1
+        elif segment.startswith('-output_file'):
+            output_filename = segments[i][len('-output_file'):].strip()
+            i += 1
+        elif segment.startswith('-seed'):
+            seed = int(segments[i][len('-seed'):].strip())
+            i += 1
+        elif segment.startswith('-workers'):
+            workers = int(segments[i][len('-workers'):].strip())
+            i += 1
+        else:
+            shared_segments.append(segment)
+            i += 1
+
+    print("output_filename=" + str(output_filename))
+    print("seed=" + str(seed))
+    print("workers=" + str(workers))
+    print("shared_segments=" + str(shared_segments))
+    print("voices=" + str([voice.name for voice in voices]))
+
+    # endregion
+
+    # region Error checking
+
+    if len(voices) == 0:
+        print("ERROR: an ensemble needs at least one '-voice name' command")
+        sys.exit(1)
+
+    if len(voices) > len(MELODY_CHANNELS):
+        print("ERROR: an ensemble can have at most " + str(len(MELODY_CHANNELS)) + " voices, one for each MIDI " +
+              "channel except the drum channel")
+        sys.exit(1)
+
+    if workers < 1:
+        print("ERROR: -workers must be at least 1")
+        sys.exit(1)
+
+    # every voice gets a seed drawn from the ensemble's seed, unless it sets its own '-seed'
+    seed_rng = random.Random(seed)
+    for voice in voices:
+        voice.settings = parse_melody_run_commands(["-generate melody"] + shared_segments +
+                                                   ["-seed " + str(seed_rng.randint(100000000, 999999999))] +
+                                                   voice.segments)
+        check_melody_settings(voice.settings)
+        if uses_fan_out(voice.settings) or len(voice.settings.variation_file) > 0 or \
+                len(voice.settings.recipe_store) > 0:
+            print("ERROR: voice " + voice.name + " can not use -variation_file, -recipe_store or the " +
+                  "-fan_out_... commands")
+            sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    generate_ensemble(voices, workers)
+    failed_voices = [voice for voice in voices if voice.error is not None]
+    for voice in failed_voices:
+        print("ERROR: voice " + voice.name + " failed: " + voice.error)
+    if len(failed_voices) > 0:
+        sys.exit(1)
+
+    melodies = [voice.melody for voice in voices]
+    midi = build_multitrack_midi_file(melodies, max(melody.beat_count for melody in melodies),
+                                      [voice.name for voice in voices], tempo_track=True)
+    write_output_bytes(output_filename + ".mid", midi_to_bytes(midi))
+    print("WROTE " + str(len(voices)) + " VOICES TO output/" + output_filename + ".mid")
+    for voice in voices:
+        print("     " + voice.name + ": seed " + str(voice.settings.seed) + ", " + str(len(voice.melody.notes)) +
+              " notes")
+
+    # endregion
+
+
+# endregion
+
+# region Streaming MIDI
+
+MIDI_NOTE_ON = 0x90
+MIDI_NOTE_OFF = 0x80
+MIDI_CONTROL_CHANGE = 0xB0
+MIDI_ALL_NOTES_OFF = 123
+
+
+def get_melody_events(melody, start_seconds, channel=0):
+    """
+    Returns the (seconds, raw MIDI bytes) of every note on and note off of melody, in order, starting at
+    start_seconds and timed by the melody's tempo. Notes past melody.beat_count are left out, the same as
+    build_melody_track.
+    """
+    seconds_per_beat = 60 / melody.tempo
+    events = []
+    beat = 0.0
+    for note in melody.notes:
+        if beat + note.beats > melody.beat_count:
+            break
+        pitch = get_midi_pitch(note.key, note.octave)
+        events.append((start_seconds + beat * seconds_per_beat, bytes((MIDI_NOTE_ON | channel, pitch, 64))))
+        beat += note.beats
+        events.append((start_seconds + beat * seconds_per_beat, bytes((MIDI_NOTE_OFF | channel, pitch, 64))))
+        beat += note.after_wait_beats
+    return events
+
+
+def parse_stream_target(target):
+    """ Splits 'stdout', 'stdin', 'unix:path' or 'tcp:[host:]port' into (kind, address) """
+    kind, _, address = target.partition(":")
+    if kind in ["stdout", "stdin"] and len(address) == 0:
+        return kind, None
+    if kind == "unix" and len(address) > 0:
+        return kind, address
+    if kind == "tcp" and len(address) > 0:
+        host, _, port = address.rpartition(":")
+        if port.isdigit():
+            return kind, (host or "127.0.0.1", int(port))
+    return None, None
+
+
+def open_stream_output(kind, address, timeout):
+    """ Returns a function sending raw bytes to the target, and a function closing it """
+    import socket
+    if kind == "stdout":
+        # sys.stdout itself is pointed at stderr while streaming, so the text printed never mixes in
+        file_descriptor = sys.__stdout__.fileno()
+
+        def send(data):
+            while len(data) > 0:
+                data = data[os.write(file_descriptor, data):]
+        return send, lambda: None
+
+    if kind == "unix":
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # every event is a few bytes that have to leave right away
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    connection.settimeout(timeout)
+    connection.connect(address)
+    connection.settimeout(None)
+    return connection.sendall, connection.close
+
+
+def sleep_until(deadline, spin_seconds):
+    """ Sleeps until spin_seconds before deadline, then busy waits the rest, since sleep() can wake up late """
+    remaining = deadline - time.perf_counter() - spin_seconds
+    if remaining > 0:
+        time.sleep(remaining)
+    while time.perf_counter() < deadline:
+        pass
+
+
+def get_timing_summary(values):
+    """ Count, mean, median, 99th percentile and max of values in seconds, as milliseconds """
+    if len(values) == 0:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {"count": len(ordered),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4),
+            "p50_ms": round(ordered[(len(ordered) - 1) // 2] * 1000, 4),
+            "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 4),
+            "max_ms": round(ordered[len(ordered) - 1] * 1000, 4)}
+
+
+def stream_melodies(settings_list, send, buffer_size, spin_seconds):
+    """
+    Generates the melodies one after another on a thread, queuing their events up to buffer_size ahead of
+    playback, while this thread sends each event at its time on the perf_counter clock (a monotonic clock).
+    Events due at the same time are sent together. Returns the (scheduled, sent) seconds of every event,
+    counted from the start of playback.\n
+    settings_list: iterable of MelodyRunSettings - can be endless, streaming then runs until Ctrl+C
+    """
+    events = queue.Queue(maxsize=buffer_size)
+    failure = []
+
+    def melody_feeder():
+        start_seconds = 0.0
+        try:
+            for settings in settings_list:
+                melody = run_job_melody_settings(settings)
+                for event in get_melody_events(melody, start_seconds):
+                    events.put(event)
+                start_seconds += melody.beat_count * 60 / melody.tempo
+        except (Exception, SystemExit) as e:
+            failure.append(str(e) if not isinstance(e, SystemExit) else "stopped with exit code " + str(e.code))
+        events.put(None)
+
+    threading.Thread(target=melody_feeder, daemon=True).start()
+    timings = []
+    event = events.get()
+    start = time.perf_counter()
+    try:
+        while event is not None:
+            scheduled, data = event
+            event = events.get()
+            while event is not None and event[0] == scheduled:
+                data += event[1]
+                event = events.get()
+            sleep_until(start + scheduled, spin_seconds)
+            send(data)
+            sent = time.perf_counter() - start
+            timings.extend([(scheduled, sent)] * (len(data) // 3))
+    except KeyboardInterrupt:
+        print("STOPPED, SENDING ALL NOTES OFF")
+        send(bytes((MIDI_CONTROL_CHANGE, MIDI_ALL_NOTES_OFF, 0)))
+    if len(failure) > 0:
+        print("ERROR: generating a streamed melody failed: " + failure[0])
+    return timings
+
+
+def stream_melody_command(segments):
+    print("RUNNING  ARGUMENTS FOR stream_melody_command ")
+
+    # region Setting defaults
+
+    target = "stdout"
+    count = 1
+    seed = random.randint(100000000, 999999999)
+    buffer_size = 512
+    spin_milliseconds = 1.0
+    connect_timeout = 10.0
+    report_name = ""
+    # every other command is a '-generate melody' run command of the streamed melodies
+    melody_segments = []
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-stream melody':
+            i += 1
+        elif segment.startswith('-to'):
+            target = segments[i][len('-to'):].strip()
+            i += 1
+        elif segment.startswith('-count'):
+            count = int(segments[i][len('-count'):].strip())
+            i += 1
+        elif segment.startswith('-seed'):
+            seed = int(segments[i][len('-seed'):].strip())
+            i += 1
+        elif segment.startswith('-buffer'):
+            buffer_size = int(segments[i][len('-buffer'):].strip())
+            i += 1
+        elif segment.startswith('-spin'):
+            spin_milliseconds = float(segments[i][len('-spin'):].strip())
+            i += 1
+        elif segment.startswith('-connect_timeout'):
+            connect_timeout = float(segments[i][len('-connect_timeout'):].strip())
+            i += 1
+        elif segment.startswith('-report'):
+            report_name = segments[i][len('-report'):].strip()
+            i += 1
+        else:
+            melody_segments.append(segment)
+            i += 1
+
+    kind, address = parse_stream_target(target)
+    if kind == "stdout":
+        # from here on stdout only carries MIDI bytes
+        sys.stdout.flush()
+        sys.stdout = sys.stderr
+
+    print("target=" + str(target))
+    print("count=" + str(count))
+    print("seed=" + str(seed))
+    print("buffer_size=" + str(buffer_size))
+    print("spin_milliseconds=" + str(spin_milliseconds))
+    print("connect_timeout=" + str(connect_timeout))
+    print("report_name=" + str(report_name))
+    print("melody_segments=" + str(melody_segments))
+
+    # endregion
+
+    # region Error checking
+
+    if kind is None or kind == "stdin":
+        print("ERROR: Invalid value for -to command: " + target + ", must use 'stdout', 'unix:path' or " +
+              "'tcp:[host:]port'")
+        sys.exit(1)
+
+    if count < 0 or buffer_size < 1 or spin_milliseconds < 0:
+        print("ERROR: -count can not be below 0 (0 streams until stopped), -buffer must be at least 1 and " +
+              "-spin can not be below 0")
+        sys.exit(1)
+
+    first_settings = parse_melody_run_commands(["-generate melody"] + melody_segments + ["-seed " + str(seed)])
+    check_melody_settings(first_settings)
+    if uses_fan_out(first_settings) or len(first_settings.variation_file) > 0 or \
+            len(first_settings.recipe_store) > 0:
+        print("ERROR: a streamed melody can not use -variation_file, -recipe_store or the -fan_out_... commands")
+        sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    def get_settings_list():
+        # the first melody uses the seed itself, the rest use seeds drawn from it
+        seed_rng = random.Random(seed)
+        streamed = 0
+        while count == 0 or streamed < count:
+            if streamed == 0:
+                settings = first_settings
+            else:
+                settings = parse_melody_run_commands(["-generate melody"] + melody_segments +
+                                                     ["-seed " + str(seed_rng.randint(100000000, 999999999))])
+            yield settings
+            streamed += 1
+
+    try:
+        send, close = open_stream_output(kind, address, connect_timeout)
+    except OSError as e:
+        print("ERROR: cannot connect to " + target + ": " + str(e))
+        sys.exit(1)
+    try:
+        timings = stream_melodies(get_settings_list(), send, buffer_size, spin_milliseconds / 1000)
+        jitter = get_timing_summary([sent - scheduled for scheduled, sent in timings])
+        print("STREAMED " + str(len(timings)) + " EVENTS TO " + target + ", JITTER " + str(jitter))
+        # written before the stream is closed, so a receiver reading it once the stream ends always finds it
+        if len(report_name) > 0:
+            report = {"target": target, "jitter": jitter,
+                      "events": [{"scheduled": round(scheduled, 6), "sent": round(sent, 6)}
+                                 for scheduled, sent in timings]}
+            write_output_bytes(report_name + ".stream.json", json.dumps(report, indent=2).encode("utf-8"))
+    except OSError as e:
+        print("ERROR: streaming to " + target + " stopped: " + str(e))
+        sys.exit(1)
+    finally:
+        close()
+
+    # endregion
+
+
+def receive_midi_command(segments):
+    import socket
+    print("RUNNING  ARGUMENTS FOR receive_midi_command ")
+
+    # region Setting defaults
+
+    source = "tcp:5555"
+    report_name = "received"
+    expect_name = ""
+    accept_timeout = 30.0
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-receive midi':
+            i += 1
+        elif segment.startswith('-from'):
+            source = segments[i][len('-from'):].strip()
+            i += 1
+        elif segment.startswith('-report'):
+            report_name = segments[i][len('-report'):].strip()
+            i += 1
+        elif segment.startswith('-expect'):
+            expect_name = segments[i][len('-expect'):].strip()
+            i += 1
+        elif segment.startswith('-accept_timeout'):
+            accept_timeout = float(segments[i][len('-accept_timeout'):].strip())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    print("source=" + str(source))
+    print("report_name=" + str(report_name))
+    print("expect_name=" + str(expect_name))
+    print("accept_timeout=" + str(accept_timeout))
+
+    # endregion
+
+    # region Error checking
+
+    kind, address = parse_stream_target(source)
+    if kind is None or kind == "stdout":
+        print("ERROR: Invalid value for -from command: " + source + ", must use 'stdin', 'unix:path' or " +
+              "'tcp:[host:]port'")
+        sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    if kind == "stdin":
+        file_descriptor = sys.stdin.buffer.fileno()
+
+        def receive():
+            return os.read(file_descriptor, 4096)
+        close = lambda: None
+    else:
+        listener = socket.socket(socket.AF_UNIX if kind == "unix" else socket.AF_INET, socket.SOCK_STREAM)
+        if kind == "unix" and os.path.exists(address):
+            os.remove(address)
+        listener.bind(address)
+        listener.listen(1)
+        listener.settimeout(accept_timeout)
+        print("WAITING FOR A STREAM ON " + source)
+        try:
+            connection = listener.accept()[0]
+        except socket.timeout:
+            print("ERROR: nothing connected to " + source + " within " + str(accept_timeout) + " seconds")
+            sys.exit(1)
+        finally:
+            listener.close()
+            if kind == "unix":
+                os.remove(address)
+        receive = functools.partial(connection.recv, 4096)
+        close = connection.close
+
+    # every complete three byte message is timestamped when its last byte arrives, anything that is not a
+    # MIDI message (like text printed before a piped stream began) is skipped up to the next status byte
+    arrivals = []
+    message = bytearray()
+    first_arrival = None
+    try:
+        while True:
+            data = receive()
+            arrival = time.perf_counter()
+            if len(data) == 0:
+                break
+            for byte in data:
+                if byte >= 0x80:
+                    message = bytearray((byte,))
+                elif len(message) > 0:
+                    message.append(byte)
+                if len(message) == 3:
+                    if first_arrival is None:
+                        first_arrival = arrival
+                    arrivals.append((arrival - first_arrival, bytes(message).hex()))
+                    message = bytearray()
+    finally:
+        close()
+
+    report = {"source": source, "events": [{"arrived": round(arrived, 6), "message": message_hex}
+                                           for arrived, message_hex in arrivals]}
+    print("RECEIVED " + str(len(arrivals)) + " EVENTS FROM " + source)
+    if len(expect_name) > 0:
+        # the streamer writes its report before the stream ends, so it is read only now
+        try:
+            with open("output/" + expect_name + ".stream.json", 'r') as file:
+                expected = [event["scheduled"] for event in json.load(file)["events"]]
+        except (OSError, ValueError, KeyError) as e:
+            print("ERROR: cannot read the stream report output/" + expect_name + ".stream.json: " + str(e))
+            sys.exit(1)
+        if len(expected) != len(arrivals):
+            print("WARNING: expected " + str(len(expected)) + " events but received " + str(len(arrivals)) +
+                  ", only the first ones are compared")
+        # both are counted from the first event, so only how far the later ones drift from it shows
+        report["jitter"] = get_timing_summary([abs(arrived - (scheduled - expected[0]))
+                                               for (arrived, _), scheduled in zip(arrivals, expected)])
+        print("ARRIVAL JITTER AGAINST " + expect_name + ": " + str(report["jitter"]))
+    write_output_bytes(report_name + ".received.json", json.dumps(report, indent=2).encode("utf-8"))
+
+    # endregion
+
+
+# endregion
+
+# region Melody variations
+
+MIDI_TICKS_PER_BEAT = 480
+
+
+class VariationDefinition:
+    def __init__(self, name):
+        """
+        name: string - added to the output file name of the variation\n
+        edits: (string, int[], float[])[] - each edit's name, note span and values, made in order
+        """
+        self.name = name
+        self.edits = []
+
+
+class VariantNotes:
+    def __init__(self, base_notes):
+        """
+        The notes of a variation, sharing every note with the base melody until it is changed. The base
+        notes are never modified, a changed note is stored on its own instead.\n
+        base_notes: Note[]
+        """
+        self.base_notes = base_notes
+        self.changed_notes = {}
+
+    def __len__(self):
+        return len(self.base_notes)
+
+    def __getitem__(self, i):
+        return self.changed_notes.get(i, self.base_notes[i])
+
+    def __setitem__(self, i, note):
+        self.changed_notes[i] = note
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.base_notes)))
+
+
+def get_variation_definitions(variation_file):
+    """ Reads the variations of a file inside the variations folder, None if the file does not exist """
+    if not variation_file.endswith(".variations"):
+        variation_file += ".variations"
+    file_path = "variations/" + variation_file
+    if not Path(file_path).exists():
+        print(f"Error: File '{file_path}' not found.")
+        return None
+
+    edit_spans = {"rhythm": 2, "invert": 2, "retrograde": 2, "transpose": 2, "ending": 0}
+    definitions = []
+    for offset, line in iterate_file_lines(file_path):
+        if line.startswith(b"variation="):
+            definitions.append(VariationDefinition(line[len(b"variation="):].strip().decode("utf-8",
+                                                                                             errors="replace")))
+            continue
+        if len(definitions) == 0:
+            report_data_error(file_path, offset, "an edit before the first 'variation=' line")
+        parts = line.split()
+        edit = parts[0].decode("utf-8", errors="replace")
+        if edit not in edit_spans:
+            report_data_error(file_path, offset, "expected one of " + ", ".join(edit_spans) + ", found '" + edit + "'")
+        span_size = edit_spans[edit]
+        if len(parts) < 1 + span_size:
+            report_data_error(file_path, offset + len(line), edit + " needs a first and last note")
+        try:
+            span = [int(part) for part in parts[1:1 + span_size]]
+            values = [float(part) for part in parts[1 + span_size:]]
+        except (ValueError, OverflowError):
+            find_bad_data_token(line, offset, file_path, 'q', 1, 1 + span_size)
+            find_bad_data_token(line, offset, file_path, 'd', 1 + span_size)
+            raise
+        if edit == "rhythm" and (len(values) == 0 or len(values) % 2 != 0):
+            report_data_error(file_path, offset + len(line), "rhythm needs play and rest times in pairs, found " +
+                              str(len(values)) + " times")
+        if edit in ("transpose", "ending") and len(values) != 1:
+            report_data_error(file_path, offset + len(line), edit + " needs exactly one value, found " +
+                              str(len(values)))
+        definitions[len(definitions) - 1].edits.append((edit, span, values))
+    return definitions
+
+
+def encode_variable_length(value):
+    data = [value & 0x7F]
+    value >>= 7
+    while value > 0:
+        data.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(data))
+
+
+@functools.lru_cache(maxsize=4096)
+def encode_note_chunk(pitch, play_ticks, rest_ticks, channel):
+    """
+    The MIDI track bytes build_melody_track writes for one note, as (played part, rest part). The note_on
+    and note_off status bytes always alternate, so a chunk never relies on running status from the one
+    before it and chunks can be joined in any order.
+    """
+    note_on = 0x90 | channel
+    note_off = 0x80 | channel
+    played = bytes([0, note_on, pitch, 64]) + encode_variable_length(play_ticks) + bytes([note_off, pitch, 64])
+    rest = encode_variable_length(rest_ticks) + bytes([note_on, 0, 0, 0, note_off, 0, 0])
+    return played, rest
+
+
+def get_note_chunk(note, channel=0):
+    """ (played bytes, rest bytes, play ticks, rest ticks) of a note, the same note is only encoded once """
+    play_ticks = int(note.beats * MIDI_TICKS_PER_BEAT)
+    rest_ticks = int(note.after_wait_beats * MIDI_TICKS_PER_BEAT)
+    played, rest = encode_note_chunk(get_midi_pitch(note.key, note.octave), play_ticks, rest_ticks, channel)
+    return played, rest, play_ticks, rest_ticks
+
+
+def join_note_chunks(chunks, beat_count, tempo, channel=0):
+    """
+    Builds the same MIDI file bytes as midi_to_bytes(build_midi_file(...)) from already encoded note chunks,
+    cutting the melody off at beat_count and filling what is left with blank space in the same way.
+    """
+    max_tick = beat_count * MIDI_TICKS_PER_BEAT
+    ticks_added = 0
+    tempo_microseconds_per_beat = int(60000000 / tempo)
+    events = [b"\x00\xff\x51\x03" + tempo_microseconds_per_beat.to_bytes(3, "big")]
+    for played, rest, play_ticks, rest_ticks in chunks:
+        if ticks_added + play_ticks > max_tick:
+            break
+        ticks_added += play_ticks
+        events.append(played)
+        if ticks_added + rest_ticks > max_tick:
+            break
+        ticks_added += rest_ticks
+        events.append(rest)
+
+    if ticks_added < max_tick:
+        unfilled_space = max_tick - ticks_added
+        events.append(encode_variable_length(unfilled_space) + bytes([0x90 | channel, 0, 0, 0, 0x80 | channel, 0, 0]))
+
+    events.append(b"\x00\xff\x2f\x00")
+    track = b"".join(events)
+    return (b"MThd" + struct.pack(">LHHH", 6, 1, 1, MIDI_TICKS_PER_BEAT) +
+            b"MTrk" + struct.pack(">L", len(track)) + track)
+
+
+def get_note_span(span, note_count):
+    """ The note indexes of an edit's (first, last) span, negative values count back from the end """
+    first, last = [i + note_count if i < 0 else i for i in span]
+    return range(max(first, 0), min(last, note_count - 1) + 1)
+
+
+def apply_variation_edit(notes, edit, keys, starting_octave):
+    """
+    Makes one edit to the VariantNotes, only replacing the notes inside the edit's span. Pitches are moved
+    around keys, the scale of the melody, where position = octaves above starting_octave * len(keys) + key index.
+    """
+    name, span, values = edit
+    key_count = len(keys)
+    key_indexes = {key.value: i for i, key in enumerate(keys)}
+
+    def position_of(note):
+        return (note.octave - starting_octave) * key_count + key_indexes[note.key.value]
+
+    def with_position(note, position):
+        octave_step, key_index = divmod(position, key_count)
+        return Note(starting_octave + octave_step, keys[key_index], note.beats, note.after_wait_beats)
+
+    if name == "ending":
+        count = min(int(values[0]), len(notes) - 1)
+        span = [len(notes) - count, len(notes) - 1]
+    note_span = get_note_span(span, len(notes))
+    if len(note_span) == 0:
+        return
+
+    if name == "rhythm":
+        for j, i in enumerate(note_span):
+            play_time, rest_time = values[(j * 2) % len(values)], values[(j * 2 + 1) % len(values)]
+            notes[i] = Note(notes[i].octave, notes[i].key, play_time, rest_time)
+    elif name == "invert":
+        pivot = position_of(notes[note_span[0]])
+        for i in note_span:
+            notes[i] = with_position(notes[i], 2 * pivot - position_of(notes[i]))
+    elif name == "retrograde":
+        reversed_keys = [(notes[i].octave, notes[i].key) for i in reversed(note_span)]
+        for i, (octave, key) in zip(note_span, reversed_keys):
+            notes[i] = Note(octave, key, notes[i].beats, notes[i].after_wait_beats)
+    elif name == "transpose":
+        for i in note_span:
+            notes[i] = with_position(notes[i], position_of(notes[i]) + int(values[0]))
+    elif name == "ending":
+        # walking from the note before the ending to the closest root key, arriving on the last note
+        start = position_of(notes[note_span[0] - 1])
+        below = start - start % key_count
+        target = below if start - below <= below + key_count - start else below + key_count
+        for j, i in enumerate(note_span, start=1):
+            notes[i] = with_position(notes[i], start + round((target - start) * j / len(note_span)))
+
+
+def generate_variations(melody, scale_keys, starting_octave, definitions, beat_count=MELODY_BEAT_COUNT):
+    """
+    Derives every variation in definitions from the melody. The melody's notes are encoded into MIDI once,
+    each variation only re-encodes the notes its edits changed. Returns a list of (name, variant melody,
+    MIDI file bytes).
+    """
+    keys = list(scale_keys)
+    if len(keys) > 1 and keys[len(keys) - 1] == keys[0]:
+        del keys[len(keys) - 1]
+    # keys the melody plays from outside of the scale still need a position, at the end of the scale
+    for note in melody.notes:
+        if note.key not in keys:
+            keys.append(note.key)
+
+    base_chunks = [get_note_chunk(note) for note in melody.notes]
+    results = []
+    for definition in definitions:
+        notes = VariantNotes(melody.notes)
+        for edit in definition.edits:
+            apply_variation_edit(notes, edit, keys, starting_octave)
+
+        chunks = list(base_chunks)
+        for i, note in notes.changed_notes.items():
+            chunks[i] = get_note_chunk(note)
+
+        variant = Melody(tempo=melody.tempo)
+        variant.notes = list(notes)
+        results.append((definition.name, variant, join_note_chunks(chunks, beat_count, melody.tempo)))
+        print("VARIATION " + definition.name + ": " + str(len(notes.changed_notes)) + " of " +
+              str(len(notes)) + " notes changed")
+    return results
+
+
+def write_melody_variations(settings, melody, definitions):
+    """ Writes every variation of the melody as output/<output_file>_<variation name>.mid """
+    scale_keys, _ = build_generation_scale_keys(settings.key, settings.scale, settings.scale_percentage,
+                                                settings.add_random_keys, settings.add_extra_keys,
+                                                settings.octave, settings.seed, random.Random())
+    for name, _, midi_bytes in generate_variations(melody, scale_keys, settings.octave, definitions):
+        write_output_bytes(settings.output_filename + "_" + name + ".mid", midi_bytes)
+
+
+# endregion
+
+# region Learning from MIDI files
+
+LEARNED_BEAT_VALUES = [4, 3, 2, 1, 0.5, 0.25, 0.125]
+LEARNED_REST_VALUES = [4, 3, 2, 1, 0.5, 0.25, 0.125, 0]
+def iterate_midi_files(folder):
+    """ Yields the path of every .mid/.midi file below folder, without listing the whole folder up front """
+    stack = [folder]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith((".mid", ".midi")):
+                    yield entry.path
+
+
+def read_midi_melody_tracks(file_path):
+    """
+    Returns (ticks_per_beat, time_signature, tracks) for a MIDI file, where each track is a melody line of
+    (pitch, start_tick, end_tick). When notes overlap only the highest one is kept.
+    """
+    from mido import MidiFile
+    midi = MidiFile(file_path)
+    time_signature = None
+    tracks = []
+    for track in midi.tracks:
+        notes = []
+        started = {}
+        tick = 0
+        for message in track:
+            tick += message.time
+            if message.type == 'time_signature' and time_signature is None:
+                time_signature = (message.numerator, message.denominator)
+            elif message.type in ('note_on', 'note_off') and message.channel != MIDI_DRUM_CHANNEL:
+                if message.type == 'note_on' and message.velocity > 0:
+                    started[message.note] = tick
+                elif message.note in started:
+                    notes.append((message.note, started.pop(message.note), tick))
+        if len(notes) == 0:
+            continue
+
+        # highest note wins when several start together, a later note cuts the one before it short
+        notes.sort(key=lambda note: (note[1], -note[0]))
+        melody = []
+        for pitch, start, end in notes:
+            if len(melody) > 0:
+                last_pitch, last_start, last_end = melody[len(melody) - 1]
+                if start == last_start:
+                    continue
+                if start < last_end:
+                    melody[len(melody) - 1] = (last_pitch, last_start, start)
+            melody.append((pitch, start, end))
+        tracks.append(melody)
+    return midi.ticks_per_beat, time_signature, tracks
+
+
+def map_midi_corpus(corpus_folder, worker_function, worker_arguments, workers, chunk_size):
+    """
+    Runs worker_function((path,) + worker_arguments) for every MIDI file of the corpus across worker
+    processes and yields the results as they finish. Paths are handed out a block at a time, so neither
+    the paths nor the results of the whole corpus are ever held at once.
+    """
+    import multiprocessing
+    paths = iterate_midi_files(corpus_folder)
+    block_size = workers * chunk_size * 4
+    with multiprocessing.Pool(workers) as pool:
+        while True:
+            block = [(path,) + worker_arguments for path in itertools.islice(paths, block_size)]
+            if len(block) == 0:
+                break
+            for result in pool.imap_unordered(worker_function, block, chunksize=chunk_size):
+                yield result
+
+
+def get_scale_position_of_pitch(pitch, scale_table):
+    """
+    The position of a MIDI pitch around the scale, counted the same way melodies walk the scale, keys
+    outside the scale are moved to the nearest key inside it
+    """
+    key_value = (pitch + 3) % len(Key) + 1
+    degree = scale_table.nearest_degree_by_key_value[key_value]
+    root_offset = (pitch - (scale_table.root_key.value - 4)) % 12
+    octave_step = (pitch - (scale_table.root_key.value - 4)) // 12
+    degree_offset = (scale_table.key_values[degree] - scale_table.root_key.value) % 12
+    # the nearest key can be across the root, in the octave above or below
+    if degree_offset - root_offset > 6:
+        octave_step -= 1
+    elif root_offset - degree_offset > 6:
+        octave_step += 1
+    return octave_step * len(scale_table.walk_keys) + degree
+
+
+def quantize_beats(beats, values):
+    return min(values, key=lambda value: abs(value - beats))
+
+
+class CorpusHistograms:
+    def __init__(self):
+        """
+        Counts that can be added together, so each worker process counts its own files.\n
+        direction_changes: Counter - jumps around the scale\n
+        beats: Counter - note lengths in beats\n
+        rests: Counter - rest lengths in beats
+        """
+        self.direction_changes = collections.Counter()
+        self.beats = collections.Counter()
+        self.rests = collections.Counter()
+        self.files = 0
+        self.notes = 0
+        self.failed_files = 0
+
+    def merge(self, other):
+        self.direction_changes.update(other.direction_changes)
+        self.beats.update(other.beats)
+        self.rests.update(other.rests)
+        self.files += other.files
+        self.notes += other.notes
+        self.failed_files += other.failed_files
+        return self
+
+
+def count_midi_file_histograms(arguments):
+    """ Worker process function, returns the CorpusHistograms of one MIDI file """
+    file_path, scale_name, key_name, max_jump = arguments
+    histograms = CorpusHistograms()
+    try:
+        ticks_per_beat, _, tracks = read_midi_melody_tracks(file_path)
+    except Exception as e:
+        print("SKIPPING MIDI FILE " + str(file_path) + ": " + str(e))
+        histograms.failed_files = 1
+        return histograms
+    scale_table = get_scale_registry().get_table(scale_name, Key[key_name])
+
+    histograms.files = 1
+    for melody in tracks:
+        last_position = None
+        for i in range(len(melody)):
+            pitch, start, end = melody[i]
+            position = get_scale_position_of_pitch(pitch, scale_table)
+            if last_position is not None:
+                histograms.direction_changes[max(-max_jump, min(max_jump, position - last_position))] += 1
+            last_position = position
+            histograms.beats[quantize_beats((end - start) / ticks_per_beat, LEARNED_BEAT_VALUES)] += 1
+            # the last note has nothing after it to measure a rest against
+            if i + 1 < len(melody):
+                rest = max(0, melody[i + 1][1] - end) / ticks_per_beat
+                histograms.rests[quantize_beats(rest, LEARNED_REST_VALUES)] += 1
+            histograms.notes += 1
+    return histograms
+
+
+def learn_corpus_histograms(corpus_folder, scale_name, key, max_jump, workers, chunk_size):
+    """
+    Counts every MIDI file of the corpus across worker processes. Paths are handed out a block at a time
+    and counts are merged as they arrive, so memory use doesn't grow with the corpus.
+    """
+    totals = CorpusHistograms()
+    for histograms in map_midi_corpus(corpus_folder, count_midi_file_histograms, (scale_name, key.name, max_jump),
+                                      workers, chunk_size):
+        totals.merge(histograms)
+        if totals.files % 1000 == 0:
+            print("Counted " + str(totals.files) + " MIDI files, " + str(totals.notes) + " notes")
+    return totals
+
+
+def format_probability(count, total):
+    return format(count / total, ".4f").rstrip("0").rstrip(".")
+
+
+def write_learned_probabilities(histograms, output_name, corpus_folder, scale_name, key):
+    source_text = "# learned from " + str(histograms.files) + " MIDI files (" + str(histograms.notes) + \
+                  " notes) in '" + corpus_folder + "' using the " + scale_name + " scale in " + key.name + "\n"
+
+    # region Direction probabilities
+    output_text = "# These are for generating the note direction data that decides\n" \
+                  "# to go up/down the scale or stay in the same spot for each note\n" \
+                  "#\n" \
+                  "# FORMAT\n" \
+                  "# int int\n" \
+                  "# for the value, and the chance of that value\n" \
+                  "#\n" + source_text + "\n"
+    total = sum(histograms.direction_changes.values())
+    for value in sorted(histograms.direction_changes):
+        output_text += "# " + str(histograms.direction_changes[value]) + " jumps of " + str(value) + "\n"
+        output_text += str(value) + " " + format_probability(histograms.direction_changes[value], total) + "\n\n"
+    path = Path("direction_probabilities/" + output_name + ".directionprobabilities")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(output_text)
+    print("Wrote " + str(path))
+    # endregion
+
+    # region Time probabilities
+    output_text = "# These are for generating how long each note and the rest after it lasts\n" \
+                  "#\n" \
+                  "# FORMAT\n" \
+                  "# string int float\n" \
+                  "# Type Value Chance\n" \
+                  "# for beats use type 'Beat', for rests use type 'Rest'\n" \
+                  "#\n" + source_text + "\n" \
+                  "# BEATS --------------------------------------------------\n\n"
+    total = sum(histograms.beats.values())
+    for value in LEARNED_BEAT_VALUES:
+        if histograms.beats[value] > 0:
+            output_text += "Beat " + str(value) + " " + format_probability(histograms.beats[value], total) + "\n"
+    output_text += "\n# WAITS --------------------------------------------------\n\n"
+    total = sum(histograms.rests.values())
+    for value in LEARNED_REST_VALUES:
+        if histograms.rests[value] > 0:
+            output_text += "Rest " + str(value) + " " + format_probability(histograms.rests[value], total) + "\n"
+    path = Path("time_probabilities/" + output_name + ".timeprobabilities")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(output_text)
+    print("Wrote " + str(path))
+    # endregion
+
+
+def learn_probabilities_command(segments):
+    print("RUNNING  ARGUMENTS FOR learn_probabilities_command ")
+
+    # region Setting defaults
+
+    corpus_folder = "corpus"
+    scale = "major"
+    key = Key.C
+    output_name = "learned"
+    max_jump = 7
+    workers = os.cpu_count() or 1
+    chunk_size = 16
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-learn probabilities':
+            i += 1
+        elif segment.startswith('-corpus'):
+            corpus_folder = segments[i][len('-corpus'):].strip()
+            i += 1
+        elif segment.startswith('-scale'):
+            scale = segments[i][len('-scale'):].strip()
+            if scale not in get_scale_registry():
+                print("ERROR: Invalid key value for -scale command: " + str(scale) + ", must use: \n" +
+                      get_all_scale_values_print())
+                sys.exit(1)
+            i += 1
+        elif segment.startswith('-key'):
+            key_str = segments[i][len('-key'):].strip()
+            try:
+                key = Key[key_str]
+            except KeyError:
+                print(f"ERROR: Invalid key value for -key command: {key_str}, must use: \n" +
+                      get_all_key_values_print())
+                sys.exit(1)
+            i += 1
+        elif segment.startswith('-output'):
+            output_name = segments[i][len('-output'):].strip()
+            i += 1
+        elif segment.startswith('-max_jump'):
+            max_jump = int(segments[i][len('-max_jump'):].strip())
+            i += 1
+        elif segment.startswith('-workers'):
+            workers = int(segments[i][len('-workers'):].strip())
+            i += 1
+        elif segment.startswith('-chunk_size'):
+            chunk_size = int(segments[i][len('-chunk_size'):].strip())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    print("corpus=" + str(corpus_folder))
+    print("scale=" + str(scale))
+    print("key=" + str(key))
+    print("output=" + str(output_name))
+    print("max_jump=" + str(max_jump))
+    print("workers=" + str(workers))
+    print("chunk_size=" + str(chunk_size))
+
+    # endregion
+
+    # region Error checking
+
+    if not Path(corpus_folder).is_dir():
+        print("ERROR: corpus folder not found: " + corpus_folder)
+        sys.exit(1)
+    if workers < 1 or chunk_size < 1:
+        print("ERROR: -workers and -chunk_size must be at least 1")
+        sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    start = time.perf_counter()
+    histograms = learn_corpus_histograms(corpus_folder, scale, key, max_jump, workers, chunk_size)
+    if histograms.notes == 0:
+        print("ERROR: no notes were found in the MIDI files of " + corpus_folder)
+        sys.exit(1)
+    write_learned_probabilities(histograms, output_name, corpus_folder, scale, key)
+    print("Learned from " + str(histograms.files) + " MIDI files (" + str(histograms.failed_files) +
+          " skipped) in " + str(round(time.perf_counter() - start, 3)) + " seconds")
+
+    # endregion
+
+
+# endregion
+
+# region Extracting patterns from MIDI files
+
+TIME_SIGNATURE_NAMES = {time_signature.value: time_signature.name for time_signature in TimeSignature}
+EXTRACTED_BEAT_STEP = 0.125
+
+
+def quantize_to_step(beats, step):
+    return round(beats / step) * step
+
+
+def extract_midi_file_phrases(arguments):
+    """
+    Worker process function, splits every melody line of one MIDI file into phrases of phrase_notes notes.
+    Returns (phrases, failed) where each phrase is (name, time_signature, beat_times, direction_changes).
+    """
+    file_path, scale_name, key_name, phrase_notes = arguments
+    try:
+        ticks_per_beat, time_signature, tracks = read_midi_melody_tracks(file_path)
+    except Exception as e:
+        print("SKIPPING MIDI FILE " + str(file_path) + ": " + str(e))
+        return [], True
+    scale_table = get_scale_registry().get_table(scale_name, Key[key_name])
+    time_signature_name = TIME_SIGNATURE_NAMES.get(time_signature, TimeSignature.FourFour.name)
+    file_name = Path(file_path).stem
+
+    phrases = []
+    for track_index, melody in enumerate(tracks):
+        for phrase_index in range(len(melody) // phrase_notes):
+            start = phrase_index * phrase_notes
+            beat_times = []
+            direction_changes = [0]
+            last_position = None
+            for i in range(start, start + phrase_notes):
+                pitch, note_start, note_end = melody[i]
+                play_time = max(EXTRACTED_BEAT_STEP,
+                                quantize_to_step((note_end - note_start) / ticks_per_beat, EXTRACTED_BEAT_STEP))
+                rest_time = 0
+                if i + 1 < len(melody):
+                    rest_time = quantize_to_step(max(0, melody[i + 1][1] - note_end) / ticks_per_beat,
+                                                 EXTRACTED_BEAT_STEP)
+                beat_times.append((play_time, rest_time))
+                position = get_scale_position_of_pitch(pitch, scale_table)
+                if last_position is not None:
+                    direction_changes.append(position - last_position)
+                last_position = position
+            phrases.append((file_name + " track " + str(track_index) + " phrase " + str(phrase_index),
+                            time_signature_name, beat_times, direction_changes))
+    return phrases, False
+
+
+def format_beats(beats):
+    return format(beats, "g")
+
+
+def extract_patterns_command(segments):
+    print("RUNNING  ARGUMENTS FOR extract_patterns_command ")
+
+    # region Setting defaults
+
+    corpus_folder = "corpus"
+    scale = "major"
+    key = Key.C
+    output_name = "extracted"
+    phrase_notes = 8
+    workers = os.cpu_count() or 1
+    chunk_size = 16
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-extract patterns':
+            i += 1
+        elif segment.startswith('-corpus'):
+            corpus_folder = segments[i][len('-corpus'):].strip()
+            i += 1
+        elif segment.startswith('-scale'):
+            scale = segments[i][len('-scale'):].strip()
+            if scale not in get_scale_registry():
+                print("ERROR: Invalid key value for -scale command: " + str(scale) + ", must use: \n" +
+                      get_all_scale_values_print())
+                sys.exit(1)
+            i += 1
+        elif segment.startswith('-key'):
+            key_str = segments[i][len('-key'):].strip()
+            try:
+                key = Key[key_str]
+            except KeyError:
+                print(f"ERROR: Invalid key value for -key command: {key_str}, must use: \n" +
+                      get_all_key_values_print())
+                sys.exit(1)
+            i += 1
+        elif segment.startswith('-output'):
+            output_name = segments[i][len('-output'):].strip()
+            i += 1
+        elif segment.startswith('-phrase_notes'):
+            phrase_notes = int(segments[i][len('-phrase_notes'):].strip())
+            i += 1
+        elif segment.startswith('-workers'):
+            workers = int(segments[i][len('-workers'):].strip())
+            i += 1
+        elif segment.startswith('-chunk_size'):
+            chunk_size = int(segments[i][len('-chunk_size'):].strip())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    print("corpus=" + str(corpus_folder))
+    print("scale=" + str(scale))
+    print("key=" + str(key))
+    print("output=" + str(output_name))
+    print("phrase_notes=" + str(phrase_notes))
+    print("workers=" + str(workers))
+    print("chunk_size=" + str(chunk_size))
+
+    # endregion
+
+    # region Error checking
+
+    if not Path(corpus_folder).is_dir():
+        print("ERROR: corpus folder not found: " + corpus_folder)
+        sys.exit(1)
+    if workers < 1 or chunk_size < 1 or phrase_notes < 2:
+        print("ERROR: -workers and -chunk_size must be at least 1, -phrase_notes at least 2")
+        sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    start = time.perf_counter()
+    time_path = Path("time_patterns/" + output_name + ".timepatterns")
+    direction_path = Path("direction_patterns/" + output_name + ".directionpatterns")
+    time_path.parent.mkdir(parents=True, exist_ok=True)
+    direction_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # only a digest of each pattern is kept to find repeats, the patterns themselves go straight to the files
+    seen_time_patterns = set()
+    seen_direction_patterns = set()
+    files = 0
+    failed_files = 0
+    phrases = 0
+    with open(time_path, 'w') as time_file, open(direction_path, 'w') as direction_file:
+        time_file.write("# time patterns extracted from the MIDI files in '" + corpus_folder + "'\n\n")
+        direction_file.write("# direction patterns extracted from the MIDI files in '" + corpus_folder +
+                             "' using the " + scale + " scale in " + key.name + "\n\n")
+        for file_phrases, failed in map_midi_corpus(corpus_folder, extract_midi_file_phrases,
+                                                    (scale, key.name, phrase_notes), workers, chunk_size):
+            files += 1
+            failed_files += 1 if failed else 0
+            for name, time_signature, beat_times, direction_changes in file_phrases:
+                phrases += 1
+                time_text = "time_signature=" + time_signature + "\n" + \
+                            "".join(format_beats(play) + " " + format_beats(rest) + "\n" for play, rest in beat_times)
+                digest = hashlib.blake2b(time_text.encode(), digest_size=16).digest()
+                if digest not in seen_time_patterns:
+                    seen_time_patterns.add(digest)
+                    time_file.write("pattern=" + name + "\n" + time_text + "\n")
+
+                direction_text = ' '.join(map(str, direction_changes)) + "\n"
+                digest = hashlib.blake2b(direction_text.encode(), digest_size=16).digest()
+                if digest not in seen_direction_patterns:
+                    seen_direction_patterns.add(digest)
+                    direction_file.write("pattern=" + name + "\n" + direction_text + "\n")
+            if files % 1000 == 0:
+                print("Read " + str(files) + " MIDI files, " + str(phrases) + " phrases")
+
+    print("Wrote " + str(len(seen_time_patterns)) + " time patterns to " + str(time_path))
+    print("Wrote " + str(len(seen_direction_patterns)) + " direction patterns to " + str(direction_path))
+    print("Extracted " + str(phrases) + " phrases from " + str(files) + " MIDI files (" + str(failed_files) +
+          " skipped) in " + str(round(time.perf_counter() - start, 3)) + " seconds")
+
+    # endregion
+
+
+# endregion
+
+# region Tuning probability files
+
+# the repeat last move wildcard of the probability files
+PROBABILITY_WILDCARD = 9999
+
+# statistic name -> (what part of the patterns it is measured on, the value of each note that is averaged)
+PROBABILITY_TUNING_STATISTICS = {
+    "average_leap": ("directions", lambda value: abs(value)),
+    "stay_ratio": ("directions", lambda value: 1.0 if value == 0 else 0.0),
+    "up_ratio": ("directions", lambda value: 1.0 if value > 0 else 0.0),
+    "average_beats": ("beats", lambda value: value),
+    "rest_density": ("rests", lambda value: 1.0 if value > 0 else 0.0),
+    "average_rest": ("rests", lambda value: value),
+}
+
+
+def carry_last_value(previous, value):
+    return previous if value == PROBABILITY_WILDCARD else value
+
+
+def draw_carried_patterns(first_values, population, cum_weights, pattern_size, pattern_count, rng):
+    """
+    Draws pattern_count patterns of pattern_size values, the first value of every pattern is given by
+    first_values and the rest are drawn from population, where the wildcard repeats the value before it.
+    Returns every value with the wildcards replaced.
+    """
+    draws = rng.choices(population, cum_weights=cum_weights, k=(pattern_size - 1) * pattern_count)
+    sequence = []
+    for i in range(pattern_count):
+        sequence.append(first_values[i])
+        sequence.extend(draws[i * (pattern_size - 1):(i + 1) * (pattern_size - 1)])
+    return list(itertools.accumulate(sequence, carry_last_value))
+
+
+def simulate_direction_probabilities(probabilities, pattern_size, pattern_count, note_count, rng):
+    """
+    Counts the direction changes generate_direction_pattern_command would make from probabilities over
+    about note_count notes. The first pattern of a file rolls again on the wildcard, the others repeat the
+    last move, which is the 0 every pattern starts with for a wildcard on the first step.
+    """
+    values = [value for value, _ in probabilities]
+    cum_weights = list(itertools.accumulate(weight for _, weight in probabilities))
+    plain = [(value, weight) for value, weight in probabilities if value != PROBABILITY_WILDCARD]
+    files = max(1, note_count // (pattern_size * pattern_count))
+
+    counts = collections.Counter()
+    counts.update(rng.choices([value for value, _ in plain],
+                              cum_weights=list(itertools.accumulate(weight for _, weight in plain)),
+                              k=pattern_size * files))
+    if pattern_count > 1:
+        # every pattern gets its starting 0 in front, which is not counted
+        carried = draw_carried_patterns([0] * ((pattern_count - 1) * files), values, cum_weights, pattern_size + 1,
+                                        (pattern_count - 1) * files, rng)
+        counts.update(itertools.compress(carried, itertools.cycle([False] + [True] * pattern_size)))
+    return {"directions": counts}
+
+
+def simulate_time_probabilities(beat_probabilities, rest_probabilities, pattern_size, pattern_count, note_count,
+                                rng):
+    """
+    Counts the beats and rests generate_time_pattern_command would make from the probabilities over about
+    note_count notes. Like the generator, the rest roll only goes up to the total beat weight, and a roll past
+    every rest keeps the last rest (0 on the first note). The first note rolls again on any wildcard.
+    """
+    total_beats_weight = sum(weight for _, weight in beat_probabilities)
+    beat_values = [value for value, _ in beat_probabilities]
+    beat_cum_weights = list(itertools.accumulate(weight for _, weight in beat_probabilities))
+    plain_beats = [(value, weight) for value, weight in beat_probabilities if value != PROBABILITY_WILDCARD]
+
+    # the rests as the generator can actually roll them, then the part of the roll no rest reaches
+    rest_cum_weights = [min(weight, total_beats_weight)
+                        for weight in itertools.accumulate(weight for _, weight in rest_probabilities)]
+    rest_values = [value for value, _ in rest_probabilities] + [PROBABILITY_WILDCARD]
+    rest_cum_weights.append(total_beats_weight)
+    first_rests = []
+    previous_weight = 0
+    for value, weight in zip(rest_values, rest_cum_weights[:-1]):
+        if value != PROBABILITY_WILDCARD:
+            first_rests.append((value, weight - previous_weight))
+        previous_weight = weight
+    first_rests.append((0.0, total_beats_weight - previous_weight))
+
+    patterns = max(1, note_count // pattern_size)
+    first_beats = rng.choices([value for value, _ in plain_beats],
+                              cum_weights=list(itertools.accumulate(weight for _, weight in plain_beats)), k=patterns)
+    first_rest_values = rng.choices([value for value, _ in first_rests],
+                                    cum_weights=list(itertools.accumulate(weight for _, weight in first_rests)),
+                                    k=patterns)
+    return {"beats": collections.Counter(draw_carried_patterns(first_beats, beat_values, beat_cum_weights,
+                                                               pattern_size, patterns, rng)),
+            "rests": collections.Counter(draw_carried_patterns(first_rest_values, rest_values, rest_cum_weights,
+                                                               pattern_size, patterns, rng))}
+
+
+def get_simulated_statistics(counts, targets):
+    statistics = {}
+    for name in targets:
+        part, note_value = PROBABILITY_TUNING_STATISTICS[name]
+        total = sum(counts[part].values())
+        statistics[name] = sum(count * note_value(value) for value, count in counts[part].items()) / total
+    return statistics
+
+
+def get_generated_pattern_counts(probabilities_type, probabilities_file, pattern_size, pattern_count, files, seed):
+    """
+    Counts the values of files pattern files the real pattern generators make from the probabilities, the
+    same counts the simulation makes, so the simulated statistics can be checked against them.
+    """
+    counts = {"directions": collections.Counter(), "beats": collections.Counter(), "rests": collections.Counter()}
+    output_file = "verify_" + probabilities_file
+    for i in range(files):
+        if probabilities_type == "direction":
+            generate_direction_pattern_command([], probabilities_file, pattern_size, pattern_count, output_file,
+                                               seed + i)
+            path = "direction_patterns/" + output_file + ".directionpatterns"
+            for pattern in iterate_pattern_file(path, "direction"):
+                # the 0 every pattern starts with is not counted
+                counts["directions"].update(pattern.direction_changes[1:])
+        else:
+            generate_time_pattern_command([], probabilities_file, pattern_size, pattern_count, output_file, seed + i)
+            path = "time_patterns/" + output_file + ".timepatterns"
+            for pattern in iterate_pattern_file(path, "time"):
+                counts["beats"].update(pnt.play_time for pnt in pattern.beat_times)
+                counts["rests"].update(pnt.rest_time for pnt in pattern.beat_times)
+        os.remove(path)
+    return counts
+
+
+def solve_linear_system(matrix, vector):
+    """ Gaussian elimination with partial pivoting, for the few targets of a tuning step """
+    size = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(size)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(column + 1, size):
+            factor = rows[row][column] / rows[column][column]
+            for k in range(column, size + 1):
+                rows[row][k] -= factor * rows[column][k]
+    solution = [0.0] * size
+    for row in range(size - 1, -1, -1):
+        solution[row] = (rows[row][size] - sum(rows[row][k] * solution[k] for k in range(row + 1, size))) / \
+                        rows[row][row]
+    return solution
+
+
+def tilt_probabilities(probabilities, names, targets, statistics, max_step=2.0):
+    """
+    One Newton step towards the targets: every weight except the wildcard's is multiplied by
+    exp(sum of step * note value) for the statistics in names. For such a change the statistics move by
+    the covariance of the note values times the step, so the step solves covariance * step = target - statistic.
+    The total of the changed weights stays the same, so the wildcard keeps its chance.
+    """
+    plain = [(value, weight) for value, weight in probabilities if value != PROBABILITY_WILDCARD and weight > 0]
+    total = sum(weight for _, weight in plain)
+    features = [[PROBABILITY_TUNING_STATISTICS[name][1](value) for name in names] for value, _ in plain]
+    means = [sum(weight * feature[k] for (_, weight), feature in zip(plain, features)) / total
+             for k in range(len(names))]
+    covariance = [[sum(weight * (feature[k] - means[k]) * (feature[l] - means[l])
+                       for (_, weight), feature in zip(plain, features)) / total + (1e-9 if k == l else 0)
+                   for l in range(len(names))] for k in range(len(names))]
+    step = solve_linear_system(covariance, [targets[name] - statistics[name] for name in names])
+    step = [max(-max_step, min(max_step, value)) for value in step]
+
+    tilted = {value: weight * math.exp(sum(s * f for s, f in zip(step, feature)))
+              for (value, weight), feature in zip(plain, features)}
+    tilted_total = sum(tilted.values())
+    return [[value, tilted[value] * total / tilted_total if value in tilted else weight]
+            for value, weight in probabilities]
+
+
+def format_weight(weight):
+    return format(weight, ".6f").rstrip("0").rstrip(".")
+
+
+def tune_probabilities_command(segments):
+    print("RUNNING  ARGUMENTS FOR tune_probabilities_command ")
+
+    # region Setting defaults
+
+    probabilities_type = "direction"
+    probabilities_file = "example"
+    output_name = "tuned"
+    targets = {}
+    note_count = 1000000
+    pattern_size = 8
+    pattern_count = 60
+    rounds = 20
+    tolerance = 0.01
+    verify_files = 0
+    seed = random.randint(100000000, 999999999)
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-tune probabilities':
+            i += 1
+        elif segment.startswith('-type'):
+            probabilities_type = segments[i][len('-type'):].strip()
+            i += 1
+        elif segment.startswith('-probabilities'):
+            probabilities_file = segments[i][len('-probabilities'):].strip()
+            i += 1
+        elif segment.startswith('-output'):
+            output_name = segments[i][len('-output'):].strip()
+            i += 1
+        elif segment.startswith('-target'):
+            parts = segments[i][len('-target'):].split()
+            if len(parts) != 2 or parts[0] not in PROBABILITY_TUNING_STATISTICS:
+                print("ERROR: Invalid value for -target command: " + segments[i][len('-target'):].strip() +
+                      ", must use a value and one of: " + ", ".join(PROBABILITY_TUNING_STATISTICS))
+                sys.exit(1)
+            targets[parts[0]] = float(parts[1])
+            i += 1
+        elif segment.startswith('-notes'):
+            note_count = int(segments[i][len('-notes'):].strip())
+            i += 1
+        elif segment.startswith('-size'):
+            pattern_size = int(segments[i][len('-size'):].strip())
+            i += 1
+        elif segment.startswith('-patterns'):
+            pattern_count = int(segments[i][len('-patterns'):].strip())
+            i += 1
+        elif segment.startswith('-rounds'):
+            rounds = int(segments[i][len('-rounds'):].strip())
+            i += 1
+        elif segment.startswith('-tolerance'):
+            tolerance = float(segments[i][len('-tolerance'):].strip())
+            i += 1
+        elif segment.startswith('-verify'):
+            verify_files = int(segments[i][len('-verify'):].strip())
+            i += 1
+        elif segment.startswith('-seed'):
+            seed = int(segments[i][len('-seed'):].strip())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    print("type=" + str(probabilities_type))
+    print("probabilities=" + str(probabilities_file))
+    print("output=" + str(output_name))
+    print("targets=" + str(targets))
+    print("notes=" + str(note_count))
+    print("size=" + str(pattern_size))
+    print("patterns=" + str(pattern_count))
+    print("rounds=" + str(rounds))
+    print("tolerance=" + str(tolerance))
+    print("verify=" + str(verify_files))
+    print("seed=" + str(seed))
+
+    # endregion
+
+    # region Error checking
+
+    if probabilities_type not in ["direction", "time"]:
+        print("ERROR: Invalid value for -type command: " + probabilities_type + ", must use 'direction' or 'time'")
+        sys.exit(1)
+
+    parts = ["directions"] if probabilities_type == "direction" else ["beats", "rests"]
+    if len(targets) == 0 or any(PROBABILITY_TUNING_STATISTICS[name][0] not in parts for name in targets):
+        print("ERROR: at least one -target is needed, and only these can be used for " + probabilities_type +
+              " probabilities: " + ", ".join(name for name, (part, _) in PROBABILITY_TUNING_STATISTICS.items()
+                                             if part in parts))
+        sys.exit(1)
+
+    if note_count < 1 or pattern_size < 2 or pattern_count < 1 or rounds < 1 or verify_files < 0:
+        print("ERROR: -notes, -patterns and -rounds must be at least 1, -size at least 2 and -verify at least 0")
+        sys.exit(1)
+
+    if probabilities_type == "direction":
+        direction_probabilities = get_direction_probabilities(probabilities_file)
+        loaded = direction_probabilities is not None and len(direction_probabilities) > 0
+    else:
+        time_probabilities = get_time_probabilities(probabilities_file)
+        if time_probabilities is not None:
+            time_probabilities = list(time_probabilities)
+        loaded = time_probabilities is not None and len(time_probabilities[0]) > 0 and len(time_probabilities[1]) > 0
+    if not loaded:
+        print("ERROR, cannot find file in the " + probabilities_type + "_probabilities folder or it has no values.")
+        sys.exit(1)
+    if probabilities_type == "direction":
+        check_direction_probabilities(direction_probabilities, probabilities_file)
+    else:
+        check_time_probabilities(time_probabilities[0], time_probabilities[1], probabilities_file)
+
+    # endregion
+
+    # region Running command
+
+    start = time.perf_counter()
+    simulated_notes = 0
+    for tuning_round in range(rounds + 1):
+        # the same random numbers every round, so the changes in the statistics come from the weights
+        rng = random.Random(seed)
+        if probabilities_type == "direction":
+            counts = simulate_direction_probabilities(direction_probabilities, pattern_size, pattern_count,
+                                                      note_count, rng)
+        else:
+            counts = simulate_time_probabilities(time_probabilities[0], time_probabilities[1], pattern_size,
+                                                 pattern_count, note_count, rng)
+        simulated_notes += sum(counts[parts[0]].values())
+        statistics = get_simulated_statistics(counts, targets)
+        print("ROUND " + str(tuning_round) + ": " + str({name: round(value, 4) for name, value in statistics.items()}))
+
+        if all(abs(statistics[name] - targets[name]) <= tolerance * max(abs(targets[name]), 1e-9) for name in targets):
+            break
+        if tuning_round == rounds:
+            print("WARNING: the targets were not reached within " + str(rounds) + " rounds, writing the closest found")
+            break
+
+        if probabilities_type == "direction":
+            direction_probabilities = tilt_probabilities(direction_probabilities, list(targets), targets, statistics)
+        else:
+            for j, part in enumerate(parts):
+                names = [name for name in targets if PROBABILITY_TUNING_STATISTICS[name][0] == part]
+                if len(names) > 0:
+                    time_probabilities[j] = tilt_probabilities(time_probabilities[j], names, targets, statistics)
+
+    source_text = "# tuned from '" + probabilities_file + "' towards " + \
+                  ", ".join(name + "=" + str(value) for name, value in targets.items()) + "\n" \
+                  "# simulated " + ", ".join(name + "=" + str(round(value, 4)) for name, value in statistics.items()) + \
+                  " over " + str(note_count) + " notes, size " + str(pattern_size) + ", " + str(pattern_count) + \
+                  " patterns, seed " + str(seed) + "\n"
+    if probabilities_type == "direction":
+        output_text = "# These are for generating the note direction data that decides\n" \
+                      "# to go up/down the scale or stay in the same spot for each note\n" \
+                      "#\n" \
+                      "# FORMAT\n" \
+                      "# int int\n" \
+                      "# for the value, and the chance of that value\n" \
+                      "#\n" \
+                      "# WILDCARDS\n" \
+                      "# 9999=continue with the same direction of movement as last time\n" \
+                      "#\n" + source_text + "\n"
+        for value, weight in direction_probabilities:
+            output_text += str(value) + " " + format_weight(weight) + "\n"
+        path = Path("direction_probabilities/" + output_name + ".directionprobabilities")
+    else:
+        output_text = "# These are for generating how long each note and the rest after it lasts\n" \
+                      "#\n" \
+                      "# FORMAT\n" \
+                      "# string int float\n" \
+                      "# Type Value Chance\n" \
+                      "# for beats use type 'Beat', for rests use type 'Rest'\n" \
+                      "#\n" \
+                      "# WILDCARDS\n" \
+                      "# 9999=repeat the value of the note before\n" \
+                      "#\n" + source_text + "\n" \
+                      "# BEATS --------------------------------------------------\n\n"
+        for value, weight in time_probabilities[0]:
+            output_text += "Beat " + str(value) + " " + format_weight(weight) + "\n"
+        output_text += "\n# WAITS --------------------------------------------------\n\n"
+        for value, weight in time_probabilities[1]:
+            output_text += "Rest " + str(value) + " " + format_weight(weight) + "\n"
+        path = Path("time_probabilities/" + output_name + ".timeprobabilities")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(output_text)
+
+    print("TUNING FINISHED: simulated " + str(simulated_notes) + " notes in " +
+          str(round(time.perf_counter() - start, 3)) + " seconds")
+    print("Wrote " + str(path))
+
+    if verify_files > 0:
+        generated = get_simulated_statistics(get_generated_pattern_counts(probabilities_type, output_name, pattern_size,
+                                                                          pattern_count, verify_files, seed), targets)
+        print("VERIFY: the pattern generator made " + str({name: round(value, 4) for name, value in generated.items()}) +
+              " from " + str(verify_files) + " files, simulated " +
+              str({name: round(value, 4) for name, value in statistics.items()}))
+        if any(abs(generated[name] - statistics[name]) > tolerance * max(abs(statistics[name]), 1e-9)
+               for name in targets):
+            print("WARNING: the generated patterns are not within the tolerance of the simulated statistics, " +
+                  "more -verify files lower the chance of this coming from too few notes")
+
+    # endregion
+
+
+# endregion
+
+# region Near duplicate melodies
+
+# a Mersenne prime, the MinHash functions are (a * x + b) % MINHASH_PRIME
+MINHASH_PRIME = (1 << 61) - 1
+
+
+def get_melody_shingles(melody, shingle_size=3):
+    """
+    The set of hashed runs of shingle_size notes in the melody, where each note is its interval from the
+    note before and its play and rest time. Intervals instead of pitches, so the same melody in another
+    key or octave gives the same shingles.
+    """
+    pitches = [get_midi_pitch(note.key, note.octave) for note in melody.notes]
+    tokens = [(after - before, note.beats, note.after_wait_beats)
+              for before, after, note in zip(pitches, pitches[1:], melody.notes[1:])]
+    if len(tokens) <= shingle_size:
+        return {hash(tuple(tokens)) & MINHASH_PRIME}
+    # ints, floats and tuples of them hash the same in every process, unlike strings
+    return {hash(tuple(tokens[i:i + shingle_size])) & MINHASH_PRIME for i in range(len(tokens) - shingle_size + 1)}
+
+
+# the buckets of each band of a new MelodyDeduplicator, doubled whenever more than half are used
+DEDUP_START_CAPACITY = 1024
+
+
+class MelodyDeduplicator:
+    def __init__(self, threshold=0.8, hash_count=32, seed=1):
+        """
+        Finds near duplicate melodies one at a time as they are generated, without comparing every pair.
+        Each melody gets a MinHash signature, and the signature is split into bands that are looked up in
+        hash tables (locality sensitive hashing), so only melodies sharing a whole band are compared.\n
+        threshold: float - estimated Jaccard similarity of the shingles from which a melody is a duplicate\n
+        hash_count: int - length of the MinHash signatures
+        """
+        self.threshold = threshold
+        self.hash_count = hash_count
+        rng = random.Random(seed)
+        self.hash_functions = [(rng.randrange(1, MINHASH_PRIME), rng.randrange(MINHASH_PRIME))
+                               for _ in range(hash_count)]
+
+        # melodies with a similarity of about band_count ** -(1 / rows) share a band half the time, so this
+        # picks the fewest bands (the fewest lookups and false matches) where that is still below the threshold
+        self.band_count = hash_count
+        for band_count in range(1, hash_count + 1):
+            if hash_count % band_count == 0 and band_count ** (-band_count / hash_count) <= threshold:
+                self.band_count = band_count
+                break
+        self.rows = hash_count // self.band_count
+
+        self.lock = threading.Lock()
+        # every kept melody lives in flat typed arrays, so tens of millions of them stay a few hundred bytes
+        # each: its key (an int), then its signature, keeping the low 32 bits of each MinHash, which is plenty
+        # to tell different values apart
+        self.kept_keys = array('q')
+        self.kept_signatures = array('I')
+        # a chained hash table per band: bucket_heads[band][bucket] is the last kept position whose band fell
+        # into the bucket, and chain_next[position * band_count + band] the kept position before it there
+        self.capacity = DEDUP_START_CAPACITY
+        self.bucket_heads = [array('i', [-1]) * self.capacity for _ in range(self.band_count)]
+        self.chain_next = array('i')
+
+    def get_signature(self, melody):
+        shingles = get_melody_shingles(melody)
+        return [min((a * shingle + b) % MINHASH_PRIME for shingle in shingles) & 0xFFFFFFFF
+                for a, b in self.hash_functions]
+
+    def get_band_hashes(self, signature):
+        return [hash(tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.band_count)]
+
+    def grow(self):
+        """ Doubles the buckets of every band and chains the kept melodies into them again """
+        self.capacity *= 2
+        self.bucket_heads = [array('i', [-1]) * self.capacity for _ in range(self.band_count)]
+        self.chain_next = array('i', [-1]) * len(self.chain_next)
+        for position in range(len(self.kept_keys)):
+            start = position * self.hash_count
+            self.add_to_buckets(position, self.get_band_hashes(self.kept_signatures[start:start + self.hash_count]))
+
+    def add_to_buckets(self, position, band_hashes):
+        for band, band_hash in enumerate(band_hashes):
+            bucket = band_hash % self.capacity
+            self.chain_next[position * self.band_count + band] = self.bucket_heads[band][bucket]
+            self.bucket_heads[band][bucket] = position
+
+    def add(self, key, melody):
+        """
+        Returns (key of the kept melody this one duplicates, estimated similarity), or (None, None) if the
+        melody is new, in which case it is kept and later melodies are compared against it.
+        """
+        signature = self.get_signature(melody)
+        band_hashes = self.get_band_hashes(signature)
+        with self.lock:
+            checked = set()
+            for band, band_hash in enumerate(band_hashes):
+                band_values = array('I', signature[band * self.rows:(band + 1) * self.rows])
+                position = self.bucket_heads[band][band_hash % self.capacity]
+                while position >= 0:
+                    start = position * self.hash_count
+                    band_start = start + band * self.rows
+                    # different bands can share a bucket, so only a kept melody with the very same band is a candidate
+                    if position not in checked and \
+                            self.kept_signatures[band_start:band_start + self.rows] == band_values:
+                        checked.add(position)
+                        kept_signature = self.kept_signatures[start:start + self.hash_count]
+                        similarity = sum(1 for a, b in zip(signature, kept_signature) if a == b) / self.hash_count
+                        if similarity >= self.threshold:
+                            return self.kept_keys[position], similarity
+                    position = self.chain_next[position * self.band_count + band]
+
+            position = len(self.kept_keys)
+            self.kept_keys.append(key)
+            self.kept_signatures.extend(signature)
+            self.chain_next.extend(array('i', [-1]) * self.band_count)
+            if len(self.kept_keys) > self.capacity // 2:
+                self.grow()
+            else:
+                self.add_to_buckets(position, band_hashes)
+        return None, None
+
+
+# endregion
+
+# region Recipe store
+
+# run commands that are not part of what a recipe generates
+RECIPE_IGNORED_COMMANDS = ['-generate melody', '-seed', '-output_file', '-recipe_store']
+
+
+def get_recipe_store_path(store_name):
+    if not store_name.endswith(".db"):
+        store_name += ".db"
+    return "recipe_stores/" + store_name
+
+
+def open_recipe_store(store_name):
+    import sqlite3
+    path = Path(get_recipe_store_path(store_name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(str(path))
+    # the run commands are shared by every recipe using them, so a recipe itself is only a few numbers
+    connection.execute("CREATE TABLE IF NOT EXISTS command_sets ("
+                       "id INTEGER PRIMARY KEY, commands TEXT, pattern_hashes TEXT, UNIQUE (commands, pattern_hashes))")
+    connection.execute("CREATE TABLE IF NOT EXISTS recipes ("
+                       "id INTEGER PRIMARY KEY, command_set_id INTEGER, seed INTEGER, output_file TEXT)")
+    connection.commit()
+    return connection
+
+
+# (path, size, mtime) -> content hash, so a file is only read again once it changes
+file_content_hashes = {}
+
+
+def get_file_content_hash(file_path):
+    stat = os.stat(file_path)
+    cache_key = (file_path, stat.st_size, stat.st_mtime_ns)
+    if cache_key not in file_content_hashes:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        file_content_hashes[cache_key] = digest.hexdigest()
+    return file_content_hashes[cache_key]
+
+
+def get_pattern_table_hash(database_name, table):
+    """ Hash of every pattern inside a pattern database table, the query cache is left out on purpose """
+    import sqlite3
+    columns = "id, name, direction_changes" if table == "direction_patterns" else "id, name, time_signature, beat_times"
+    digest = hashlib.blake2b(digest_size=16)
+    with closing(sqlite3.connect(get_pattern_database_path(database_name))) as connection:
+        for row in connection.execute(f"SELECT {columns} FROM {table} ORDER BY id"):
+            digest.update(repr(row).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_melody_sources(settings):
+    """
+    Everything the melody of settings is generated from, as (pattern query or None, file path). A pattern
+    query is read from its pattern database file.
+    """
+    sources = []
+    for query, probabilities_folder, probabilities_file, patterns_folder, patterns_file, extension in [
+            (settings.direction_query, "direction_probabilities/", settings.direction_probabilities_file,
+             "direction_patterns/", settings.direction_patterns_file, "direction"),
+            (settings.time_query, "time_probabilities/", settings.time_probabilities_file,
+             "time_patterns/", settings.time_patterns_file, "time")]:
+        probabilities_file = probabilities_file.strip()
+        if not probabilities_file.endswith("." + extension + "probabilities"):
+            probabilities_file += "." + extension + "probabilities"
+        if not patterns_file.endswith("." + extension + "patterns"):
+            patterns_file += "." + extension + "patterns"
+        if query is not None:
+            sources.append((query, get_pattern_database_path(query.database_name)))
+        elif len(probabilities_file) > 1 and os.path.exists(probabilities_folder + probabilities_file):
+            # the patterns are generated from the probabilities with the seed
+            sources.append((None, probabilities_folder + probabilities_file))
+        elif os.path.exists(patterns_folder + patterns_file):
+            sources.append((None, patterns_folder + patterns_file))
+    if len(settings.pitch_patterns_file) > 0:
+        pitch_patterns_file = settings.pitch_patterns_file
+        if not pitch_patterns_file.endswith(".pitchpatterns"):
+            pitch_patterns_file += ".pitchpatterns"
+        if os.path.exists("pitch_patterns/" + pitch_patterns_file):
+            sources.append((None, "pitch_patterns/" + pitch_patterns_file))
+    # a .scales file can add a scale or replace a built in one, and a later file replaces an earlier one, so
+    # every .scales file counts as soon as any of them defines a scale of the melody
+    scale_names = set([settings.scale] + settings.fan_out_scales)
+    scale_files = sorted(str(file_path) for file_path in Path("scales/").glob("*.scales"))
+    if any(not scale_names.isdisjoint(get_scale_file_names(file_path)) for file_path in scale_files):
+        sources += [(None, file_path) for file_path in scale_files]
+    return sources
+
+
+def get_scale_file_names(file_path):
+    """ The names of the scales a .scales file defines """
+    return {line[len(b"scale="):].strip().lower().decode("utf-8", errors="replace")
+            for _, line in iterate_file_lines(file_path) if line.startswith(b"scale=")}
+
+
+def get_recipe_pattern_hashes(settings):
+    """
+    The content hash of every file the melody of settings is generated from, by name. A recipe only gives
+    the same melody again while these stay the same.
+    """
+    hashes = {}
+    for query, file_path in get_melody_sources(settings):
+        if query is not None:
+            hashes[str(query)] = get_pattern_table_hash(query.database_name, query.table)
+        else:
+            hashes[file_path] = get_file_content_hash(file_path)
+    return hashes
+
+
+def get_recipe_commands(segments):
+    """ The run commands of a melody without its seed and output file, the same way every time """
+    return ' '.join(segment.strip() for segment in segments
+                    if segment.startswith('-') and not any(segment.strip().startswith(ignored)
+                                                           for ignored in RECIPE_IGNORED_COMMANDS))
+
+
+def add_recipes(connection, runs):
+    """
+    Stores a recipe for every (settings, segments) in runs, without generating anything. Returns the
+    ids of the new recipes.
+    """
+    command_set_ids = {}
+    recipe_ids = []
+    for settings, segments in runs:
+        commands = get_recipe_commands(segments)
+        pattern_hashes = json.dumps(get_recipe_pattern_hashes(settings), sort_keys=True)
+        if (commands, pattern_hashes) not in command_set_ids:
+            connection.execute("INSERT OR IGNORE INTO command_sets (commands, pattern_hashes) VALUES (?, ?)",
+                               (commands, pattern_hashes))
+            command_set_ids[(commands, pattern_hashes)] = connection.execute(
+                "SELECT id FROM command_sets WHERE commands = ? AND pattern_hashes = ?",
+                (commands, pattern_hashes)).fetchone()[0]
+        cursor = connection.execute("INSERT INTO recipes (command_set_id, seed, output_file) VALUES (?, ?, ?)",
+                                    (command_set_ids[(commands, pattern_hashes)], settings.seed,
+                                     settings.output_filename))
+        recipe_ids.append(cursor.lastrowid)
+    connection.commit()
+    return recipe_ids
+
+
+class RecipeRenderer:
+    def __init__(self, store_name, cache_size=128):
+        """
+        Generates the MIDI bytes of stored recipes on request, keeping the cache_size most recently
+        rendered ones in memory.\n
+        store_name: string - the file inside the recipe_stores folder
+        """
+        self.store_name = store_name
+        self.cache_size = cache_size
+        self.rendered = collections.OrderedDict()
+        self.checked_command_sets = set()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, recipe_id):
+        """ Returns (output file name, MIDI bytes) of a recipe """
+        import sqlite3
+        if recipe_id in self.rendered:
+            self.rendered.move_to_end(recipe_id)
+            self.hits += 1
+            metric_recipe_cache_hits.inc()
+            return self.rendered[recipe_id]
+        self.misses += 1
+        metric_recipe_cache_misses.inc()
+
+        with closing(sqlite3.connect(get_recipe_store_path(self.store_name))) as connection:
+            row = connection.execute("SELECT recipes.command_set_id, recipes.seed, recipes.output_file, "
+                                     "command_sets.commands, command_sets.pattern_hashes FROM recipes "
+                                     "JOIN command_sets ON command_sets.id = recipes.command_set_id "
+                                     "WHERE recipes.id = ?", (recipe_id,)).fetchone()
+        if row is None:
+            raise GenerationStopped("there is no recipe " + str(recipe_id) + " in " +
+                                    get_recipe_store_path(self.store_name))
+        command_set_id, seed, output_file, commands, pattern_hashes = row
+
+        segments = split_run_commands(commands) + ["-seed " + str(seed), "-output_file " + output_file]
+        settings = parse_melody_run_commands(segments)
+        if command_set_id not in self.checked_command_sets:
+            if get_recipe_pattern_hashes(settings) != json.loads(pattern_hashes):
+                raise GenerationStopped("the pattern files of recipe " + str(recipe_id) + " changed since it was " +
+                                        "stored, it would not give the same melody. Stored: " + pattern_hashes)
+            self.checked_command_sets.add(command_set_id)
+
+        melody = run_job_melody_settings(settings)
+        result = (output_file + ".mid", midi_to_bytes(build_midi_file(melody, melody.beat_count)))
+
+        self.rendered[recipe_id] = result
+        if len(self.rendered) > self.cache_size:
+            self.rendered.popitem(last=False)
+        return result
+
+
+def render_recipes_command(segments):
+    import sqlite3
+    print("RUNNING  ARGUMENTS FOR render_recipes_command ")
+
+    # region Setting defaults
+
+    store_name = "example"
+    recipe_ids = []
+    cache_size = 128
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-render recipes':
+            i += 1
+        elif segment.startswith('-store'):
+            store_name = segments[i][len('-store'):].strip()
+            i += 1
+        elif segment.startswith('-ids'):
+            for id_str in segments[i][len('-ids'):].split():
+                if id_str == "all":
+                    recipe_ids = "all"
+                    break
+                recipe_ids.append(int(id_str))
+            i += 1
+        elif segment.startswith('-cache_size'):
+            cache_size = int(segments[i][len('-cache_size'):].strip())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    print("store_name=" + str(store_name))
+    print("recipe_ids=" + str(recipe_ids))
+    print("cache_size=" + str(cache_size))
+
+    # endregion
+
+    # region Error checking
+
+    if not Path(get_recipe_store_path(store_name)).exists():
+        print("ERROR, cannot find " + get_recipe_store_path(store_name))
+        sys.exit(1)
+
+    if cache_size < 1:
+        print("ERROR: -cache_size must be at least 1")
+        sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    if recipe_ids == "all":
+        with closing(sqlite3.connect(get_recipe_store_path(store_name))) as connection:
+            recipe_ids = [row[0] for row in connection.execute("SELECT id FROM recipes ORDER BY id")]
+
+    renderer = RecipeRenderer(store_name, cache_size)
+    for recipe_id in recipe_ids:
+        output_file, midi_bytes = renderer.render(recipe_id)
+        write_output_bytes(output_file, midi_bytes)
+
+    print("RENDERED " + str(len(recipe_ids)) + " RECIPES, " + str(renderer.hits) + " FROM THE CACHE")
+
+    # endregion
+
+
+# endregion
+
+# region Metrics registry
+
+# seconds, from quick cache hits to slow batch jobs
+METRIC_SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricCounter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, value=1):
+        with self.lock:
+            self.value += value
+
+    def to_prometheus_text(self):
+        return ("# HELP " + self.name + " " + self.help_text + "\n# TYPE " + self.name + " counter\n" +
+                self.name + " " + format_metric_value(self.value) + "\n")
+
+
+class MetricGauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def to_prometheus_text(self):
+        return ("# HELP " + self.name + " " + self.help_text + "\n# TYPE " + self.name + " gauge\n" +
+                self.name + " " + format_metric_value(self.value) + "\n")
+
+
+class MetricHistogram:
+    def __init__(self, name, help_text, buckets=METRIC_SECONDS_BUCKETS):
+        """
+        Counts observed values into fixed buckets, so observing is a single bisect and quantiles are
+        estimated from the buckets the same way Prometheus does.\n
+        buckets: float[] - the upper bounds of the buckets, ascending, +Inf is added after them
+        """
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """ The estimated value below which q of the observed values are, None before anything was observed """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i in range(len(self.counts)):
+            if seen + self.counts[i] >= rank and self.counts[i] > 0:
+                if i == len(self.buckets):
+                    return self.buckets[len(self.buckets) - 1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / self.counts[i]
+            seen += self.counts[i]
+        return self.buckets[len(self.buckets) - 1]
+
+    def to_prometheus_text(self):
+        lines = ["# HELP " + self.name + " " + self.help_text, "# TYPE " + self.name + " histogram"]
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+            count = self.count
+        cumulative = 0
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            lines.append(self.name + '_bucket{le="' + str(bound) + '"} ' + str(cumulative))
+        lines.append(self.name + "_sum " + format_metric_value(total))
+        lines.append(self.name + "_count " + str(count))
+        return "\n".join(lines) + "\n"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """ Every metric of the process by name, in the order they were made """
+        self.metrics = {}
+        self.started = time.time()
+
+    def counter(self, name, help_text):
+        return self.metrics.setdefault(name, MetricCounter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self.metrics.setdefault(name, MetricGauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=METRIC_SECONDS_BUCKETS):
+        return self.metrics.setdefault(name, MetricHistogram(name, help_text, buckets))
+
+    def to_prometheus_text(self):
+        return "".join(metric.to_prometheus_text() for metric in self.metrics.values())
+
+
+def format_metric_value(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+metrics_registry = MetricsRegistry()
+metric_melodies_generated = metrics_registry.counter("mmg_melodies_generated_total", "Melodies generated.")
+metric_notes_generated = metrics_registry.counter("mmg_notes_generated_total", "Notes of the generated melodies.")
+metric_generate_seconds = metrics_registry.histogram("mmg_generate_seconds",
+                                                     "Time to generate one melody, from its patterns to its notes.")
+metric_patterns_parsed = metrics_registry.counter("mmg_patterns_parsed_total", "Patterns parsed from pattern files.")
+metric_parse_seconds = metrics_registry.histogram("mmg_parse_seconds",
+                                                  "Time to parse the patterns picked from a pattern file.")
+metric_pattern_cache_hits = metrics_registry.counter("mmg_pattern_cache_hits_total",
+                                                     "Patterns handed out without parsing them again.")
+metric_pattern_cache_misses = metrics_registry.counter("mmg_pattern_cache_misses_total",
+                                                       "Patterns that were parsed for the pattern cache.")
+metric_recipe_cache_hits = metrics_registry.counter("mmg_recipe_cache_hits_total",
+                                                    "Recipes rendered from the renderer's cache.")
+metric_recipe_cache_misses = metrics_registry.counter("mmg_recipe_cache_misses_total",
+                                                      "Recipes that had to be generated.")
+metric_write_seconds = metrics_registry.histogram("mmg_write_seconds", "Time to write one MIDI file.")
+metric_bytes_written = metrics_registry.counter("mmg_bytes_written_total", "Bytes of MIDI files written.")
+metric_job_seconds = metrics_registry.histogram("mmg_job_seconds",
+                                                "Time to generate and write one batch or work queue job.")
+metric_jobs_failed = metrics_registry.counter("mmg_jobs_failed_total", "Batch and work queue jobs that failed.")
+metric_queue_depth = metrics_registry.gauge("mmg_queue_depth",
+                                            "Generated MIDI files waiting to be written, or pending work queue jobs.")
+
+
+def write_metrics_textfile(file_path):
+    """ Writes every metric for the Prometheus node exporter textfile collector, replacing the file at once """
+    path = Path(file_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = str(path) + "." + str(os.getpid()) + ".tmp"
+    with open(temp_path, 'w') as file:
+        file.write(metrics_registry.to_prometheus_text())
+    os.replace(temp_path, str(path))
+
+
+class MetricsExporter:
+    def __init__(self, metrics_file, metrics_address, interval):
+        """
+        Exports the metrics registry while a command runs, by rewriting a Prometheus textfile every interval
+        seconds and by serving /metrics over HTTP.\n
+        metrics_file: string - the textfile path, or "" to not write one\n
+        metrics_address: string - "port" or "host:port" to serve on, or "" to not serve
+        """
+        self.metrics_file = metrics_file
+        self.metrics_address = metrics_address
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.server = None
+        self.threads = []
+
+    def start(self):
+        if len(self.metrics_address) > 0:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = metrics_registry.to_prometheus_text().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *arguments):
+                    pass
+
+            host, _, port = self.metrics_address.rpartition(":")
+            self.server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), MetricsHandler)
+            self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+            print("SERVING METRICS ON http://" + (host or "127.0.0.1") + ":" + str(self.server.server_port) +
+                  "/metrics")
+        if len(self.metrics_file) > 0:
+            self.threads.append(threading.Thread(target=self.write_every_interval, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def write_every_interval(self):
+        while not self.stopped.wait(self.interval):
+            write_metrics_textfile(self.metrics_file)
+
+    def stop(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        if len(self.metrics_file) > 0:
+            write_metrics_textfile(self.metrics_file)
+
+
+def print_throughput(wall_seconds):
+    """ Prints the rates and latencies of the metrics registry, over wall_seconds of running """
+    lookups = metric_pattern_cache_hits.value + metric_pattern_cache_misses.value
+    rates = {
+        "melodies_per_second": metric_melodies_generated.value / max(wall_seconds, 1e-9),
+        "notes_per_second": metric_notes_generated.value / max(wall_seconds, 1e-9),
+        "job_seconds_p50": metric_job_seconds.quantile(0.5),
+        "job_seconds_p99": metric_job_seconds.quantile(0.99),
+        "pattern_cache_hit_ratio": metric_pattern_cache_hits.value / lookups if lookups > 0 else None,
+    }
+    print("THROUGHPUT")
+    for name, value in rates.items():
+        print("     " + name + "=" + (format(value, ".6g") if value is not None else "None"))
+
+
+# endregion
+
+# region Memory reports
+
+class MemoryProfiler:
+    def __init__(self, snapshot_count=3, top_line_count=10):
+        """
+        Measures the memory each stage of a batch job uses with tracemalloc and the process RSS.\n
+        snapshot_count: int - the first runs of each stage that are also broken down by source line, since
+        comparing snapshots is slow\n
+        top_line_count: int - the source lines kept for each stage, the ones that allocated the most
+        """
+        import tracemalloc
+        self.snapshot_count = snapshot_count
+        self.top_line_count = top_line_count
+        # stage name -> totals over every run of the stage
+        self.stages = {}
+        # stage name -> "file:line" -> [bytes, allocations] still allocated when the stage finished
+        self.stage_lines = {}
+        self.filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                        tracemalloc.Filter(False, "<unknown>")]
+
+    def start(self):
+        import tracemalloc
+        tracemalloc.start()
+
+    def stop(self):
+        import tracemalloc
+        tracemalloc.stop()
+
+    def measure(self, stage_name, job_stages, function, *arguments):
+        """
+        Runs function(*arguments) as a stage and returns what it returns, adding the memory it used to the
+        stage totals and to job_stages (a job's stage name -> numbers).
+        """
+        import tracemalloc
+        stage = self.stages.setdefault(stage_name, {"runs": 0, "peak_bytes_max": 0, "peak_bytes_total": 0,
+                                                    "retained_bytes_total": 0, "rss_bytes_max": 0})
+        snapshot = None
+        if stage["runs"] < self.snapshot_count:
+            snapshot = tracemalloc.take_snapshot().filter_traces(self.filters)
+        current_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        result = function(*arguments)
+
+        current_after, peak = tracemalloc.get_traced_memory()
+        rss_bytes = get_rss_bytes()
+        peak_bytes = peak - current_before
+        retained_bytes = current_after - current_before
+        stage["runs"] += 1
+        stage["peak_bytes_max"] = max(stage["peak_bytes_max"], peak_bytes)
+        stage["peak_bytes_total"] += peak_bytes
+        stage["retained_bytes_total"] += retained_bytes
+        stage["rss_bytes_max"] = max(stage["rss_bytes_max"], rss_bytes or 0)
+        job_stages[stage_name] = {"peak_bytes": peak_bytes, "retained_bytes": retained_bytes, "rss_bytes": rss_bytes}
+
+        if snapshot is not None:
+            lines = self.stage_lines.setdefault(stage_name, {})
+            after = tracemalloc.take_snapshot().filter_traces(self.filters)
+            for difference in after.compare_to(snapshot, 'lineno'):
+                if difference.size_diff <= 0:
+                    continue
+                frame = difference.traceback[0]
+                totals = lines.setdefault(frame.filename + ":" + str(frame.lineno), [0, 0])
+                totals[0] += difference.size_diff
+                totals[1] += difference.count_diff
+        return result
+
+    def to_dict(self):
+        stages = {}
+        for stage_name, stage in self.stages.items():
+            top_lines = sorted(self.stage_lines.get(stage_name, {}).items(), key=lambda line: -line[1][0])
+            stages[stage_name] = {
+                "runs": stage["runs"],
+                "peak_bytes_max": stage["peak_bytes_max"],
+                "peak_bytes_average": round(stage["peak_bytes_total"] / max(stage["runs"], 1)),
+                "retained_bytes_total": stage["retained_bytes_total"],
+                "rss_bytes_max": stage["rss_bytes_max"],
+                "top_lines": [{"line": line, "bytes": totals[0], "allocations": totals[1]}
+                              for line, totals in top_lines[:self.top_line_count]],
+            }
+        return {"peak_rss_bytes": get_peak_rss_bytes(), "stages": stages}
+
+
+def get_rss_bytes():
+    """ The memory the process uses right now, or None where that can not be read """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return get_peak_rss_bytes()
+
+
+def get_peak_rss_bytes():
+    """ The most memory the process has used so far, or None where that can not be read """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# endregion
+
+# region Columnar note export
+
+NOTE_EXPORT_FORMATS = ["csv", "npy", "npz", "arrow"]
+# column name, array typecode (or None for text), Arrow type name
+NOTE_EXPORT_COLUMNS = [("job_id", 'q', "int64"), ("seed", 'q', "int64"), ("note_index", 'i', "int32"),
+                       ("pitch", 'h', "int16"), ("duration_ticks", 'i', "int32"), ("rest_ticks", 'i', "int32"),
+                       ("scale", None, "string"), ("key", None, "string")]
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+# the header is rewritten with the final row count once a column is done, so it gets a fixed size
+NPY_HEADER_SIZE = 128
+
+
+def get_melody_note_rows(melody):
+    """
+    The (MIDI pitch, duration ticks, rest ticks) of every note, cut at the melody's length the same way
+    build_melody_track cuts the MIDI file, so the rows hold exactly the notes the file would.
+    """
+    max_tick = melody.beat_count * MIDI_TICKS_PER_BEAT
+    ticks_added = 0
+    rows = []
+    for note in melody.notes:
+        duration_ticks = int(note.beats * MIDI_TICKS_PER_BEAT)
+        if ticks_added + duration_ticks > max_tick:
+            break
+        ticks_added += duration_ticks
+        rest_ticks = int(note.after_wait_beats * MIDI_TICKS_PER_BEAT)
+        if ticks_added + rest_ticks > max_tick:
+            # the rest of the file is filled with silence instead
+            rows.append((get_midi_pitch(note.key, note.octave), duration_ticks, int(max_tick - ticks_added)))
+            break
+        ticks_added += rest_ticks
+        rows.append((get_midi_pitch(note.key, note.octave), duration_ticks, rest_ticks))
+    return rows
+
+
+def get_npy_header(descr, row_count):
+    header = "{'descr': '" + descr + "', 'fortran_order': False, 'shape': (" + str(row_count) + ",), }"
+    return NPY_MAGIC + struct.pack("<H", NPY_HEADER_SIZE - 10) + \
+        header.ljust(NPY_HEADER_SIZE - 11).encode("latin1") + b"\n"
+
+
+class NoteColumnWriter:
+    def __init__(self, output_name, export_format, chunk_rows):
+        """
+        Collects the notes of generated melodies into columns and writes them chunk_rows rows at a time, so
+        the notes can be analysed without decoding any MIDI. Melodies can be added from several threads.\n
+        output_name: string - everything is written to the output folder under this name\n
+        export_format: string - one of NOTE_EXPORT_FORMATS
+        """
+        self.output_name = output_name
+        self.export_format = export_format
+        self.chunk_rows = chunk_rows
+        self.lock = threading.Lock()
+        self.columns = self.new_columns()
+        self.row_count = 0
+        self.chunk_count = 0
+        self.files = {}
+        self.arrow_writer = None
+        # text columns are fixed width in .npy files, wide enough for every scale and key name
+        self.text_width = max(len(name) for name in get_scale_registry().names() + [key.name for key in Key])
+        byte_order = "<" if sys.byteorder == "little" else ">"
+        self.descrs = {name: byte_order + "i" + str(array(typecode).itemsize) if typecode is not None
+                       else "<U" + str(self.text_width) for name, typecode, _ in NOTE_EXPORT_COLUMNS}
+
+        Path("output/").mkdir(parents=True, exist_ok=True)
+        if export_format in ["npy", "npz"]:
+            Path(self.get_npy_folder()).mkdir(parents=True, exist_ok=True)
+            for name, _, _ in NOTE_EXPORT_COLUMNS:
+                self.files[name] = open(self.get_npy_folder() + name + ".npy", 'wb')
+                self.files[name].write(get_npy_header(self.descrs[name], 0))
+        elif export_format == "arrow":
+            import pyarrow
+            self.arrow_schema = pyarrow.schema([(name, getattr(pyarrow, arrow_type)())
+                                                for name, _, arrow_type in NOTE_EXPORT_COLUMNS])
+            self.arrow_writer = pyarrow.ipc.new_file("output/" + output_name + ".notes.arrow", self.arrow_schema)
+
+    @staticmethod
+    def new_columns():
+        return {name: array(typecode) if typecode is not None else [] for name, typecode, _ in NOTE_EXPORT_COLUMNS}
+
+    def get_npy_folder(self):
+        return "output/" + self.output_name + ".notes/"
+
+    def add(self, job, melody):
+        rows = get_melody_note_rows(melody)
+        with self.lock:
+            columns = self.columns
+            columns["job_id"].extend(itertools.repeat(job.index, len(rows)))
+            columns["seed"].extend(itertools.repeat(job.seed, len(rows)))
+            columns["note_index"].extend(range(len(rows)))
+            for name, values in zip(["pitch", "duration_ticks", "rest_ticks"], zip(*rows)):
+                columns[name].extend(values)
+            columns["scale"].extend(itertools.repeat(job.scale, len(rows)))
+            columns["key"].extend(itertools.repeat(job.key, len(rows)))
+            while len(self.columns["job_id"]) >= self.chunk_rows:
+                self.write_chunk(self.chunk_rows)
+
+    def write_chunk(self, row_count=None):
+        """ Writes the first row_count rows waiting, or all of them """
+        columns = self.columns
+        if row_count is not None and row_count < len(columns["job_id"]):
+            self.columns = {name: values[row_count:] for name, values in columns.items()}
+            columns = {name: values[:row_count] for name, values in columns.items()}
+        else:
+            self.columns = self.new_columns()
+        chunk_size = len(columns["job_id"])
+        if chunk_size == 0:
+            return
+        if self.export_format == "csv":
+            import csv
+            with open("output/" + self.output_name + ".notes." + str(self.chunk_count) + ".csv", 'w',
+                      newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow([name for name, _, _ in NOTE_EXPORT_COLUMNS])
+                writer.writerows(zip(*(columns[name] for name, _, _ in NOTE_EXPORT_COLUMNS)))
+        elif self.export_format in ["npy", "npz"]:
+            for name, typecode, _ in NOTE_EXPORT_COLUMNS:
+                if typecode is not None:
+                    columns[name].tofile(self.files[name])
+                else:
+                    self.files[name].write(b"".join(text.encode("utf-32-le").ljust(self.text_width * 4, b"\0")
+                                                    for text in columns[name]))
+        else:
+            import pyarrow
+            self.arrow_writer.write_batch(pyarrow.record_batch([list(columns[name]) for name, _, _
+                                                                in NOTE_EXPORT_COLUMNS], schema=self.arrow_schema))
+        self.row_count += chunk_size
+        self.chunk_count += 1
+
+    def close(self):
+        """ Writes the rows still waiting and finishes the files, returns the paths written """
+        with self.lock:
+            self.write_chunk()
+        if self.export_format == "csv":
+            return ["output/" + self.output_name + ".notes." + str(i) + ".csv" for i in range(self.chunk_count)]
+        if self.export_format == "arrow":
+            self.arrow_writer.close()
+            return ["output/" + self.output_name + ".notes.arrow"]
+
+        for name, file in self.files.items():
+            file.seek(0)
+            file.write(get_npy_header(self.descrs[name], self.row_count))
+            file.close()
+        paths = [self.get_npy_folder() + name + ".npy" for name, _, _ in NOTE_EXPORT_COLUMNS]
+        if self.export_format == "npy":
+            return paths
+        # an .npz file is a zip of the .npy files, named after their columns
+        import zipfile
+        npz_path = "output/" + self.output_name + ".notes.npz"
+        with zipfile.ZipFile(npz_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for path in paths:
+                archive.write(path, Path(path).name)
+                os.remove(path)
+        os.rmdir(self.get_npy_folder())
+        return [npz_path]
+
+
+# endregion
+
+# region Batch generation
+
+# the pattern generators draw from the shared random module, so jobs generating patterns take turns
+generated_pattern_files_lock = threading.Lock()
+
+
+class BatchPipelineMetrics:
+    def __init__(self, queue_size):
+        """
+        queue_size: int - the most rendered MIDI buffers waiting to be written at once\n
+        producer_stall_seconds: float - time generator workers were blocked on a full queue\n
+        writer_stall_seconds: float - time writer workers were blocked on an empty queue
+        """
+        self.lock = threading.Lock()
+        self.queue_size = queue_size
+        self.queue_depth_samples = 0
+        self.queue_depth_total = 0
+        self.queue_depth_max = 0
+        self.producer_stall_seconds = 0.0
+        self.writer_stall_seconds = 0.0
+        self.jobs_generated = 0
+        self.jobs_written = 0
+        self.jobs_failed = 0
+        self.jobs_duplicate = 0
+        self.wall_seconds = 0.0
+
+    def sample_queue_depth(self, depth):
+        metric_queue_depth.set(depth)
+        with self.lock:
+            self.queue_depth_samples += 1
+            self.queue_depth_total += depth
+            self.queue_depth_max = max(self.queue_depth_max, depth)
+
+    def add(self, name, value):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self):
+        average_depth = 0
+        if self.queue_depth_samples > 0:
+            average_depth = self.queue_depth_total / self.queue_depth_samples
+        return {
+            "queue_size": self.queue_size,
+            "queue_depth_average": round(average_depth, 3),
+            "queue_depth_max": self.queue_depth_max,
+            "producer_stall_seconds": round(self.producer_stall_seconds, 6),
+            "writer_stall_seconds": round(self.writer_stall_seconds, 6),
+            "jobs_generated": self.jobs_generated,
+            "jobs_written": self.jobs_written,
+            "jobs_failed": self.jobs_failed,
+            "jobs_duplicate": self.jobs_duplicate,
+            "wall_seconds": round(self.wall_seconds, 6),
+        }
+
+
+def get_batch_jobs(batch_file):
+    if not batch_file.endswith(".batch"):
+        batch_file += ".batch"
+    lines = read_file("batches/" + batch_file)
+    if lines is None:
+        return None
+
+    batch_name = batch_file[:-len(".batch")]
+    jobs = []
+    for line in lines:
+        data = line.strip()
+        if len(data) < 3 or data[0] == '#':
+            continue
+        segments = split_run_commands(data)
+        # jobs without their own output file are named after the batch, the job's own command overrides this
+        segments.insert(0, "-output_file " + batch_name + "_" + str(len(jobs)))
+        jobs.append(BatchJob(len(jobs), segments))
+    return jobs
+
+
+def generate_batch_job(job):
+    settings = parse_melody_run_commands(job.segments)
+    job.output_filename = settings.output_filename + ".mid"
+    job.seed, job.scale, job.key = settings.seed, settings.scale, settings.key.name
+    return run_job_melody_settings(settings)
+
+
+def get_batch_pattern_files(jobs):
+    """ The (file path, table kind) of every pattern file the jobs read as it is, without generating it first """
+    pattern_files = set()
+    for job in jobs:
+        try:
+            settings = parse_melody_run_commands(job.segments)
+        except GenerationStopped:
+            # the job fails with the error once it is generated, the other jobs still share their files
+            continue
+        if uses_generated_pattern_files(settings):
+            continue
+        if settings.direction_query is None:
+            file_name = settings.direction_patterns_file
+            if not file_name.endswith(".directionpatterns"):
+                file_name += ".directionpatterns"
+            pattern_files.add(("direction_patterns/" + file_name, SHARED_TABLE_DIRECTIONS))
+        if settings.time_query is None:
+            file_name = settings.time_patterns_file
+            if not file_name.endswith(".timepatterns"):
+                file_name += ".timepatterns"
+            pattern_files.add(("time_patterns/" + file_name, SHARED_TABLE_TIMES))
+    return sorted(pattern_files)
+
+
+def start_batch_process(table_names):
+    """ Runs once inside every batch worker process, attaching to the pattern tables of the batch """
+    for file_path, name in table_names.items():
+        shared_pattern_tables[file_path] = attach_shared_pattern_table(name)
+
+
+def generate_batch_job_in_process(job):
+    start = time.perf_counter()
+    try:
+        melody = generate_batch_job(job)
+        midi_bytes = midi_to_bytes(build_midi_file(melody, melody.beat_count))
+    except (Exception, SystemExit) as e:
+        return job.index, job.output_filename, None, None, time.perf_counter() - start, str(e), None
+    return job.index, job.output_filename, melody, midi_bytes, time.perf_counter() - start, None, \
+        (job.seed, job.scale, job.key)
+
+
+def write_output_bytes(filename, data):
+    start = time.perf_counter()
+    path = Path("output/" + filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    metric_write_seconds.observe(time.perf_counter() - start)
+    metric_bytes_written.inc(len(data))
+
+
+def run_batch_with_memory_report(jobs, profiler, sink=write_output_bytes):
+    """
+    Runs the jobs one at a time, measuring every stage of each job with the MemoryProfiler. Nothing runs at
+    the same time, so the memory of a stage is only its own. Returns the pipeline metrics and the memory
+    numbers of each job.
+    """
+    metrics = BatchPipelineMetrics(0)
+    job_reports = []
+    wall_start = time.perf_counter()
+    profiler.start()
+    try:
+        for job in jobs:
+            job_stages = {}
+            job_reports.append({"index": job.index, "stages": job_stages})
+            start = time.perf_counter()
+            try:
+                settings = profiler.measure("parse", job_stages, parse_melody_run_commands, job.segments)
+                job.output_filename = settings.output_filename + ".mid"
+                if uses_generated_pattern_files(settings):
+                    profiler.measure("generate", job_stages, prepare_generated_pattern_files, settings)
+                melody = profiler.measure("generate", job_stages, run_melody_settings, settings, False)
+                midi = profiler.measure("encode", job_stages, build_midi_file, melody, melody.beat_count)
+                job.midi_bytes = profiler.measure("encode", job_stages, midi_to_bytes, midi)
+                del melody, midi
+            except (Exception, SystemExit) as e:
+                job.error = str(e)
+                metrics.add("jobs_failed", 1)
+                metric_jobs_failed.inc()
+                print("ERROR: batch job " + str(job.index) + " failed: " + str(e))
+                continue
+            job.generate_seconds = time.perf_counter() - start
+            metrics.add("jobs_generated", 1)
+
+            start = time.perf_counter()
+            try:
+                profiler.measure("write", job_stages, sink, job.output_filename, job.midi_bytes)
+                metrics.add("jobs_written", 1)
+            except OSError as e:
+                job.error = str(e)
+                metrics.add("jobs_failed", 1)
+                metric_jobs_failed.inc()
+                print("ERROR: writing " + str(job.output_filename) + " failed: " + str(e))
+            job.write_seconds = time.perf_counter() - start
+            metric_job_seconds.observe(job.generate_seconds + job.write_seconds)
+            job.midi_bytes = None
+    finally:
+        profiler.stop()
+    metrics.wall_seconds = time.perf_counter() - wall_start
+    return metrics, job_reports
+
+
+def run_batch_pipeline(jobs, generator_workers, writer_workers, queue_size, sink=write_output_bytes,
+                       deduplicator=None, drop_duplicates=False, processes=0, note_writer=None, write_midi=True):
+    """
+    Generator workers render each job into MIDI bytes and push them into a bounded queue, while writer
+    workers drain that queue into the sink, so generating and writing overlap. With a deduplicator every
+    melody is checked as soon as it is generated, near duplicates are flagged on their job or dropped.
+    With processes above 0, the jobs are generated by that many worker processes instead, which read the
+    pattern files from tables shared between them. With a note_writer the notes of every kept melody are
+    added to its columns as well, and with write_midi off they are the only thing written.
+    """
+    metrics = BatchPipelineMetrics(queue_size)
+    pending_jobs = queue.Queue()
+    for job in jobs:
+        pending_jobs.put(job)
+    rendered_jobs = queue.Queue(maxsize=queue_size)
+
+    def queue_generated_job(job, melody):
+        if deduplicator is not None:
+            job.duplicate_of, job.similarity = deduplicator.add(job.index, melody)
+            if job.duplicate_of is not None:
+                metrics.add("jobs_duplicate", 1)
+                if drop_duplicates:
+                    job.midi_bytes = None
+                    return
+        metrics.add("jobs_generated", 1)
+        if note_writer is not None:
+            note_writer.add(job, melody)
+
+        start = time.perf_counter()
+        rendered_jobs.put(job)
+        metrics.add("producer_stall_seconds", time.perf_counter() - start)
+        metrics.sample_queue_depth(rendered_jobs.qsize())
+
+    def generator_worker():
+        while True:
+            try:
+                job = pending_jobs.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            try:
+                melody = generate_batch_job(job)
+            except (Exception, SystemExit) as e:
+                # exit() is used for bad input inside generation, one bad job should not stop the batch
+                job.error = str(e)
+                metrics.add("jobs_failed", 1)
+                metric_jobs_failed.inc()
+                print("ERROR: batch job " + str(job.index) + " failed: " + str(e))
+                continue
+            if write_midi:
+                job.midi_bytes = midi_to_bytes(build_midi_file(melody, melody.beat_count))
+            job.generate_seconds = time.perf_counter() - start
+            queue_generated_job(job, melody)
+
+    def process_feeder():
+        import multiprocessing
+        jobs_by_index = {job.index: job for job in jobs}
+        table_names = {file_path: table.name for file_path, table in tables.items()}
+        with multiprocessing.Pool(processes, initializer=start_batch_process, initargs=(table_names,)) as pool:
+            for index, output_filename, melody, midi_bytes, generate_seconds, error, job_settings in \
+                    pool.imap_unordered(generate_batch_job_in_process, jobs):
+                job = jobs_by_index[index]
+                job.output_filename = output_filename
+                job.generate_seconds = generate_seconds
+                if error is not None:
+                    job.error = error
+                    metrics.add("jobs_failed", 1)
+                    metric_jobs_failed.inc()
+                    print("ERROR: batch job " + str(job.index) + " failed: " + error)
+                    continue
+                # the worker processes count into their own registries, so their melodies are counted here
+                metric_melodies_generated.inc()
+                metric_notes_generated.inc(len(melody.notes))
+                job.seed, job.scale, job.key = job_settings
+                job.midi_bytes = midi_bytes
+                queue_generated_job(job, melody)
+
+    def writer_worker():
+        while True:
+            start = time.perf_counter()
+            job = rendered_jobs.get()
+            metrics.add("writer_stall_seconds", time.perf_counter() - start)
+            if job is None:
+                return
+            metrics.sample_queue_depth(rendered_jobs.qsize())
+            start = time.perf_counter()
+            try:
+                if write_midi:
+                    sink(job.output_filename, job.midi_bytes)
+                metrics.add("jobs_written", 1)
+            except OSError as e:
+                job.error = str(e)
+                metrics.add("jobs_failed", 1)
+                metric_jobs_failed.inc()
+                print("ERROR: writing " + str(job.output_filename) + " failed: " + str(e))
+            job.write_seconds = time.perf_counter() - start
+            metric_job_seconds.observe(job.generate_seconds + job.write_seconds)
+            # the buffer is on disk now, no need to keep it around
+            job.midi_bytes = None
+
+    wall_start = time.perf_counter()
+    tables = {}
+    if processes > 0:
+        # every pattern file is parsed once here, the worker processes only map the tables
+        for file_path, kind in get_batch_pattern_files(jobs):
+            if Path(file_path).exists():
+                try:
+                    tables[file_path] = create_shared_pattern_table(file_path, kind)
+                except DataFileError as e:
+                    # the jobs using the file read it themselves and fail with the error, the others go on
+                    print("WARNING: not sharing " + file_path + " with the worker processes: " + str(e))
+        generators = [threading.Thread(target=process_feeder)]
+    else:
+        generators = [threading.Thread(target=generator_worker) for _ in range(generator_workers)]
+    writers = [threading.Thread(target=writer_worker) for _ in range(writer_workers)]
+    try:
+        for thread in generators + writers:
+            thread.start()
+        for thread in generators:
+            thread.join()
+    finally:
+        # one stop marker per writer once everything has been generated
+        for _ in writers:
+            rendered_jobs.put(None)
+        for thread in writers:
+            thread.join()
+        for table in tables.values():
+            table.close()
+            table.memory.unlink()
+    metrics.wall_seconds = time.perf_counter() - wall_start
+
+    return metrics
+
+
+def generate_batch_command(segments):
+    print("RUNNING  ARGUMENTS FOR generate_batch_command ")
+
+    # region Setting defaults
+
+    batch_file = "example"
+    generator_workers = 2
+    writer_workers = 2
+    queue_size = 8
+    dedup = "off"
+    dedup_threshold = 0.8
+    recipe_store = ""
+    processes = 0
+    memory_report = False
+    memory_budget = 0
+    watch = False
+    watch_interval = 0.5
+    debounce = 0.3
+    work_queue = ""
+    max_attempts = 3
+    metrics_file = ""
+    metrics_address = ""
+    metrics_interval = 10.0
+    export_format = "off"
+    export_only = False
+    export_chunk_rows = 65536
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-generate batch':
+            i += 1
+        elif segment.startswith('-export_only'):
+            export_only = True
+            i += 1
+        elif segment.startswith('-export_chunk_rows'):
+            export_chunk_rows = int(segments[i][len('-export_chunk_rows'):].strip())
+            i += 1
+        elif segment.startswith('-export'):
+            export_format = segments[i][len('-export'):].strip()
+            i += 1
+        elif segment.startswith('-batch_file'):
+            batch_file = segments[i][len('-batch_file'):].strip()
+            i += 1
+        elif segment.startswith('-generator_workers'):
+            generator_workers = int(segments[i][len('-generator_workers'):].strip())
+            i += 1
+        elif segment.startswith('-writer_workers'):
+            writer_workers = int(segments[i][len('-writer_workers'):].strip())
+            i += 1
+        elif segment.startswith('-queue_size'):
+            queue_size = int(segments[i][len('-queue_size'):].strip())
+            i += 1
+        elif segment.startswith('-recipe_store'):
+            recipe_store = segments[i][len('-recipe_store'):].strip()
+            i += 1
+        elif segment.startswith('-metrics_file'):
+            metrics_file = segments[i][len('-metrics_file'):].strip()
+            i += 1
+        elif segment.startswith('-metrics_address'):
+            metrics_address = segments[i][len('-metrics_address'):].strip()
+            i += 1
+        elif segment.startswith('-metrics_interval'):
+            metrics_interval = float(segments[i][len('-metrics_interval'):].strip())
+            i += 1
+        elif segment.startswith('-work_queue'):
+            work_queue = segments[i][len('-work_queue'):].strip()
+            i += 1
+        elif segment.startswith('-max_attempts'):
+            max_attempts = int(segments[i][len('-max_attempts'):].strip())
+            i += 1
+        elif segment.startswith('-watch_interval'):
+            watch_interval = float(segments[i][len('-watch_interval'):].strip())
+            i += 1
+        elif segment.startswith('-watch'):
+            watch = True
+            i += 1
+        elif segment.startswith('-debounce'):
+            debounce = float(segments[i][len('-debounce'):].strip())
+            i += 1
+        elif segment.startswith('-memory_report'):
+            memory_report = True
+            i += 1
+        elif segment.startswith('-memory_budget'):
+            memory_budget = float(segments[i][len('-memory_budget'):].strip())
+            memory_report = True
+            i += 1
+        elif segment.startswith('-processes'):
+            processes = int(segments[i][len('-processes'):].strip())
+            i += 1
+        elif segment.startswith('-dedup_threshold'):
+            dedup_threshold = float(segments[i][len('-dedup_threshold'):].strip())
+            i += 1
+        elif segment.startswith('-dedup'):
+            dedup = segments[i][len('-dedup'):].strip()
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    print("batch_file=" + str(batch_file))
+    print("generator_workers=" + str(generator_workers))
+    print("writer_workers=" + str(writer_workers))
+    print("queue_size=" + str(queue_size))
+    print("dedup=" + str(dedup))
+    print("dedup_threshold=" + str(dedup_threshold))
+    print("recipe_store=" + str(recipe_store))
+    print("processes=" + str(processes))
+    print("memory_report=" + str(memory_report))
+    print("memory_budget=" + str(memory_budget))
+    print("watch=" + str(watch))
+    print("watch_interval=" + str(watch_interval))
+    print("debounce=" + str(debounce))
+    print("work_queue=" + str(work_queue))
+    print("max_attempts=" + str(max_attempts))
+    print("metrics_file=" + str(metrics_file))
+    print("metrics_address=" + str(metrics_address))
+    print("metrics_interval=" + str(metrics_interval))
+    print("export_format=" + str(export_format))
+    print("export_only=" + str(export_only))
+    print("export_chunk_rows=" + str(export_chunk_rows))
+
+    # endregion
+
+    # region Error checking
+
+    if generator_workers < 1 or writer_workers < 1 or queue_size < 1:
+        print("ERROR: -generator_workers, -writer_workers and -queue_size must all be at least 1")
+        sys.exit(1)
+
+    if processes < 0:
+        print("ERROR: -processes can not be below 0")
+        sys.exit(1)
+
+    if memory_report and (processes > 0 or dedup != "off"):
+        print("ERROR: -memory_report runs the jobs one at a time, it cannot be combined with -processes or -dedup")
+        sys.exit(1)
+
+    if watch and (processes > 0 or dedup != "off" or memory_report or len(recipe_store) > 0):
+        print("ERROR: -watch cannot be combined with -processes, -dedup, -memory_report or -recipe_store")
+        sys.exit(1)
+
+    if watch_interval <= 0 or debounce < 0:
+        print("ERROR: -watch_interval must be above 0 and -debounce can not be below 0")
+        sys.exit(1)
+
+    if len(work_queue) > 0 and (watch or memory_report or len(recipe_store) > 0):
+        print("ERROR: -work_queue cannot be combined with -watch, -memory_report or -recipe_store")
+        sys.exit(1)
+
+    if max_attempts < 1:
+        print("ERROR: -max_attempts must be at least 1")
+        sys.exit(1)
+
+    if metrics_interval <= 0:
+        print("ERROR: -metrics_interval must be above 0")
+        sys.exit(1)
+
+    if dedup not in ["off", "flag", "drop"]:
+        print("ERROR: Invalid value for -dedup command: " + dedup + ", must use 'off', 'flag' or 'drop'")
+        sys.exit(1)
+
+    if not 0 < dedup_threshold <= 1:
+        print("ERROR: -dedup_threshold must be above 0 and at most 1")
+        sys.exit(1)
+
+    if export_format not in ["off"] + NOTE_EXPORT_FORMATS:
+        print("ERROR: Invalid value for -export command: " + export_format + ", must use 'off', " +
+              ", ".join("'" + name + "'" for name in NOTE_EXPORT_FORMATS))
+        sys.exit(1)
+
+    if export_format != "off" and (watch or memory_report or len(recipe_store) > 0 or len(work_queue) > 0):
+        print("ERROR: -export cannot be combined with -watch, -memory_report, -recipe_store or -work_queue")
+        sys.exit(1)
+
+    if export_only and export_format == "off":
+        print("ERROR: -export_only needs an -export format to write instead of the MIDI files")
+        sys.exit(1)
+
+    if export_chunk_rows < 1:
+        print("ERROR: -export_chunk_rows must be at least 1")
+        sys.exit(1)
+
+    if export_format == "arrow":
+        try:
+            import pyarrow
+        except ImportError:
+            print("ERROR: -export arrow needs the pyarrow package, install it or use -export npz")
+            sys.exit(1)
+
+    jobs = get_batch_jobs(batch_file)
+    if jobs is None or len(jobs) == 0:
+        print("ERROR, cannot find file in batches folder or nothing is inside the file.")
+        sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    if len(recipe_store) > 0:
+        # nothing is generated, every job is stored as a recipe to render later with -render recipes
+        with closing(open_recipe_store(recipe_store)) as connection:
+            recipe_ids = add_recipes(connection, ((parse_melody_run_commands(job.segments), job.segments)
+                                                  for job in jobs))
+        print("STORED RECIPES " + str(recipe_ids[0]) + " TO " + str(recipe_ids[len(recipe_ids) - 1]) + " IN " +
+              get_recipe_store_path(recipe_store))
+        return
+
+    if len(work_queue) > 0:
+        # nothing is generated here, workers started with -work queue lease the jobs from the queue
+        with closing(open_work_queue(work_queue)) as connection:
+            added = add_work_queue_jobs(connection, batch_file, jobs, max_attempts)
+        print("QUEUED " + str(added) + " JOBS IN " + get_work_queue_path(work_queue))
+        return
+
+    # the metrics are exported while the batch runs, and once more when it is done
+    exporter = MetricsExporter(metrics_file, metrics_address, metrics_interval)
+    exporter.start()
+    try:
+        batch_name = Path(batch_file).stem if batch_file.endswith(".batch") else batch_file
+        profiler = None
+        if memory_report:
+            profiler = MemoryProfiler()
+            metrics, job_memory = run_batch_with_memory_report(jobs, profiler)
+        else:
+            deduplicator = MelodyDeduplicator(dedup_threshold) if dedup != "off" else None
+            note_writer = None
+            if export_format != "off":
+                note_writer = NoteColumnWriter(batch_name, export_format, export_chunk_rows)
+            metrics = run_batch_pipeline(jobs, generator_workers, writer_workers, queue_size,
+                                         deduplicator=deduplicator, drop_duplicates=dedup == "drop", processes=processes,
+                                         note_writer=note_writer, write_midi=not export_only)
+            if note_writer is not None:
+                export_paths = note_writer.close()
+                print("EXPORTED " + str(note_writer.row_count) + " NOTES TO " + ", ".join(export_paths))
+
+        report = metrics.to_dict()
+        report["jobs"] = [{"index": job.index,
+                           "output_file": job.output_filename,
+                           "generate_seconds": round(job.generate_seconds, 6),
+                           "write_seconds": round(job.write_seconds, 6),
+                           "duplicate_of": job.duplicate_of,
+                           "similarity": job.similarity,
+                           "error": job.error} for job in jobs]
+        write_output_bytes(batch_name + ".timing.json", json.dumps(report, indent=2).encode())
+
+        print("BATCH FINISHED")
+        for name, value in metrics.to_dict().items():
+            print("     " + name + "=" + str(value))
+        print_throughput(metrics.wall_seconds)
+
+        if profiler is not None:
+            memory = profiler.to_dict()
+            memory["jobs"] = job_memory
+            write_output_bytes(batch_name + ".memory.json", json.dumps(memory, indent=2).encode())
+            print("MEMORY REPORT")
+            print("     peak_rss_bytes=" + str(memory["peak_rss_bytes"]))
+            for stage_name, stage in memory["stages"].items():
+                print("     " + stage_name + ": peak_bytes_max=" + str(stage["peak_bytes_max"]) +
+                      ", retained_bytes_total=" + str(stage["retained_bytes_total"]))
+            if memory_budget > 0 and memory["peak_rss_bytes"] is not None and \
+                    memory["peak_rss_bytes"] > memory_budget * 1024 * 1024:
+                print("ERROR: the batch used " + str(round(memory["peak_rss_bytes"] / 1024 / 1024, 1)) +
+                      " MB, over the -memory_budget of " + str(memory_budget) + " MB")
+                sys.exit(1)
+
+        if watch:
+            watch_batch(batch_file, jobs, generator_workers, writer_workers, queue_size, watch_interval, debounce)
+    finally:
+        exporter.stop()
+
+    # endregion
+
+
+# endregion
+
+# region Watching pattern files
+
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+# IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE
+INOTIFY_WATCH_MASK = 0x002 | 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+
+# file path -> SharedPatternSource (None until first opened) of the pattern files a watched batch reads as they are,
+# used by open_pattern_file
+watched_pattern_files = {}
+
+
+class InotifyWatcher:
+    def __init__(self, folders):
+        """
+        Reports the files changed inside the folders from the Linux inotify events of the folders, read
+        through ctypes. Raises OSError where inotify can not be used.\n
+        folders: string[]
+        """
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = {}
+        for folder in folders:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), INOTIFY_WATCH_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed for " + folder)
+            self.folders[wd] = folder
+
+    def wait(self, timeout):
+        """ The paths changed within timeout seconds of waiting, an empty set if none were """
+        import select
+        changed = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        position = 0
+        while position + INOTIFY_EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, name_size = INOTIFY_EVENT_HEADER.unpack_from(data, position)
+            position += INOTIFY_EVENT_HEADER.size
+            name = data[position:position + name_size].rstrip(b"\0")
+            position += name_size
+            if wd in self.folders and len(name) > 0:
+                changed.add(os.path.normpath(os.path.join(self.folders[wd], os.fsdecode(name))))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, folders, interval):
+        """
+        Reports the files changed inside the folders by comparing the size and modification time of every
+        file each interval seconds, wherever inotify is not available.\n
+        folders: string[]\n
+        interval: float
+        """
+        self.folders = folders
+        self.interval = interval
+        self.files = self.scan()
+
+    def scan(self):
+        files = {}
+        for folder in self.folders:
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            status = entry.stat()
+                            files[os.path.normpath(entry.path)] = (status.st_mtime_ns, status.st_size)
+            except OSError:
+                continue
+        return files
+
+    def wait(self, timeout):
+        """ The paths changed within timeout seconds of waiting, an empty set if none were """
+        time.sleep(max(min(self.interval, timeout), 0))
+        files = self.scan()
+        changed = {path for path in files.keys() | self.files.keys() if files.get(path) != self.files.get(path)}
+        self.files = files
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_file_watcher(folders, interval):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folders)
+        except (OSError, AttributeError) as e:
+            print("inotify can not be used (" + str(e) + "), checking the files every " + str(interval) + " seconds")
+    return PollingWatcher(folders, interval)
+
+
+def get_batch_dependencies(jobs):
+    """ Normalized file path -> indexes of the jobs generated from that file """
+    dependencies = collections.defaultdict(set)
+    for job in jobs:
+        try:
+            settings = parse_melody_run_commands(job.segments)
+        except GenerationStopped:
+            # a job with bad run commands only changes once the batch file changes
+            continue
+        for query, file_path in get_melody_sources(settings):
+            dependencies[os.path.normpath(file_path)].add(job.index)
+    return dependencies
+
+
+def wait_for_changes(watcher, debounce):
+    """
+    Waits for files to change, then keeps collecting changes until none came for debounce seconds, so a
+    burst of saves is handled at once. Returns the changed paths.
+    """
+    changed = set()
+    while len(changed) == 0:
+        changed = watcher.wait(1.0)
+    while True:
+        more = watcher.wait(debounce)
+        if len(more) == 0:
+            return changed
+        changed |= more
+
+
+def watch_batch(batch_file, jobs, generator_workers, writer_workers, queue_size, watch_interval, debounce):
+    """
+    Regenerates the jobs of a batch every time a file they are generated from changes, only the jobs
+    depending on the changed files. A change to the batch file itself regenerates the jobs whose run
+    commands changed. Runs until interrupted.
+    """
+    global scale_registry
+    if not batch_file.endswith(".batch"):
+        batch_file += ".batch"
+    batch_path = os.path.normpath("batches/" + batch_file)
+    dependencies = get_batch_dependencies(jobs)
+    watched_pattern_files.clear()
+    watched_pattern_files.update((file_path, None) for file_path, kind in get_batch_pattern_files(jobs))
+
+    folders = sorted({os.path.dirname(file_path) or "." for file_path in dependencies} | {"batches"})
+    watcher = open_file_watcher(folders, watch_interval)
+    print("WATCHING " + ", ".join(folders) + " (press Ctrl+C to stop)")
+    try:
+        while True:
+            changed = wait_for_changes(watcher, debounce)
+            affected = set()
+            for file_path in changed:
+                affected |= dependencies.get(file_path, set())
+            if any(file_path.startswith("scales" + os.sep) for file_path in changed):
+                scale_registry = None
+
+            if batch_path in changed:
+                new_jobs = get_batch_jobs(batch_file)
+                if new_jobs is None or len(new_jobs) == 0:
+                    print("ERROR, cannot read " + batch_path + ", waiting for it to change again")
+                    continue
+                affected |= {job.index for job in new_jobs
+                             if job.index >= len(jobs) or job.segments != jobs[job.index].segments}
+                jobs = new_jobs
+                dependencies = get_batch_dependencies(jobs)
+                pattern_files = [file_path for file_path, kind in get_batch_pattern_files(jobs)]
+                for file_path in list(watched_pattern_files):
+                    if file_path not in pattern_files:
+                        del watched_pattern_files[file_path]
+                for file_path in pattern_files:
+                    watched_pattern_files.setdefault(file_path, None)
+                # files the new jobs depend on may be in folders that were not watched yet
+                new_folders = sorted({os.path.dirname(file_path) or "." for file_path in dependencies} | {"batches"})
+                if new_folders != folders:
+                    watcher.close()
+                    folders = new_folders
+                    watcher = open_file_watcher(folders, watch_interval)
+
+            # the parsed patterns of a changed file are read again the next time they are used
+            for file_path in watched_pattern_files:
+                if os.path.normpath(file_path) in changed:
+                    watched_pattern_files[file_path] = None
+
+            affected = sorted(index for index in affected if index < len(jobs))
+            if len(affected) == 0:
+                continue
+            print("CHANGED " + ", ".join(sorted(changed)) + ", REGENERATING JOBS " +
+                  " ".join(str(index) for index in affected))
+            rerun_jobs = [BatchJob(index, jobs[index].segments) for index in affected]
+            metrics = run_batch_pipeline(rerun_jobs, generator_workers, writer_workers, queue_size)
+            print("REGENERATED " + str(metrics.jobs_written) + " OF " + str(len(rerun_jobs)) +
+                  " JOBS IN " + format(metrics.wall_seconds, ".3f") + " SECONDS")
+    except KeyboardInterrupt:
+        print("STOPPED WATCHING")
+    finally:
+        watcher.close()
+        watched_pattern_files.clear()
+
+
+# endregion
+
+# region Work queue
+
+
+def get_work_queue_path(queue_name):
+    if not queue_name.endswith(".db"):
+        queue_name += ".db"
+    return "work_queues/" + queue_name
+
+
+def open_work_queue(queue_name):
+    import sqlite3
+    path = Path(get_work_queue_path(queue_name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # several hosts can open the file at once, a busy database is waited on instead of failing
+    connection = sqlite3.connect(str(path), timeout=60, isolation_level=None)
+    connection.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                       "id INTEGER PRIMARY KEY, batch_file TEXT, job_index INTEGER, segments TEXT, "
+                       "pattern_hashes TEXT, status TEXT, worker TEXT, lease_expires REAL, attempts INTEGER, "
+                       "max_attempts INTEGER, output_file TEXT, error TEXT, finished REAL)")
+    connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+    return connection
+
+
+def add_work_queue_jobs(connection, batch_file, jobs, max_attempts):
+    """ Adds every job of a batch to the queue as pending, returns how many were added """
+    rows = []
+    for job in jobs:
+        try:
+            pattern_hashes = get_recipe_pattern_hashes(parse_melody_run_commands(job.segments))
+        except GenerationStopped:
+            # queued anyway, the worker taking it fails it with the error so it shows up with the other jobs
+            pattern_hashes = {}
+        rows.append((batch_file, job.index, json.dumps(job.segments), json.dumps(pattern_hashes), max_attempts))
+    connection.execute("BEGIN IMMEDIATE")
+    connection.executemany("INSERT INTO jobs (batch_file, job_index, segments, pattern_hashes, status, attempts, "
+                           "max_attempts) VALUES (?, ?, ?, ?, 'pending', 0, ?)", rows)
+    connection.execute("COMMIT")
+    return len(rows)
+
+
+def lease_work_queue_job(connection, worker, lease_seconds):
+    """
+    Takes the first pending job, or a job whose lease expired because its worker stopped, for the worker.
+    Jobs that already used all their attempts fail instead. Returns (id, segments, pattern_hashes) or None.
+    """
+    now = time.time()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute("UPDATE jobs SET status = 'failed', error = 'the lease of ' || worker || ' expired' "
+                           "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now,))
+        row = connection.execute("SELECT id, segments, pattern_hashes FROM jobs WHERE status = 'pending' OR "
+                                 "(status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+        if row is not None:
+            connection.execute("UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, "
+                               "attempts = attempts + 1 WHERE id = ?", (worker, now + lease_seconds, row[0]))
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    return row
+
+
+def finish_work_queue_job(connection, job_id, worker, output_file, error):
+    """
+    Marks a leased job done, or on an error pending again until it used all its attempts. Returns False
+    when the worker had lost the lease, the job then belongs to another worker.
+    """
+    if error is None:
+        cursor = connection.execute("UPDATE jobs SET status = 'done', output_file = ?, error = NULL, finished = ? "
+                                    "WHERE id = ? AND worker = ? AND status = 'leased'",
+                                    (output_file, time.time(), job_id, worker))
+    else:
+        cursor = connection.execute("UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' "
+                                    "ELSE 'pending' END, error = ?, lease_expires = NULL "
+                                    "WHERE id = ? AND worker = ? AND status = 'leased'", (error, job_id, worker))
+    return cursor.rowcount == 1
+
+
+def get_work_queue_counts(connection):
+    counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+    for status, count in connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+        counts[status] = count
+    return counts
+
+
+class LeaseHeartbeat:
+    def __init__(self, queue_name, job_id, worker, lease_seconds, heartbeat_seconds):
+        """
+        Keeps extending the lease of a job from its own thread and connection while the job is generated,
+        so only jobs of stopped workers expire. lost is set once the lease could not be extended.
+        """
+        self.queue_name = queue_name
+        self.job_id = job_id
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stopped = threading.Event()
+        self.lost = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        with closing(open_work_queue(self.queue_name)) as connection:
+            while not self.stopped.wait(self.heartbeat_seconds):
+                cursor = connection.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND "
+                                            "status = 'leased'",
+                                            (time.time() + self.lease_seconds, self.job_id, self.worker))
+                if cursor.rowcount != 1:
+                    self.lost = True
+                    return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+
+
+def run_work_queue_worker(queue_name, worker, lease_seconds, heartbeat_seconds, poll_seconds):
+    """
+    Leases and generates jobs of the queue until none are pending or leased. Returns how many jobs this
+    worker finished and how many of its attempts failed.
+    """
+    done = 0
+    failed = 0
+    with closing(open_work_queue(queue_name)) as connection:
+        while True:
+            row = lease_work_queue_job(connection, worker, lease_seconds)
+            if row is None:
+                counts = get_work_queue_counts(connection)
+                metric_queue_depth.set(counts["pending"])
+                if counts["pending"] == 0 and counts["leased"] == 0:
+                    return done, failed
+                # jobs leased by other workers are taken over once their lease expires
+                time.sleep(poll_seconds)
+                continue
+
+            job_id, segments, pattern_hashes = row
+            job = BatchJob(job_id, json.loads(segments))
+            error = None
+            start = time.perf_counter()
+            with LeaseHeartbeat(queue_name, job_id, worker, lease_seconds, heartbeat_seconds) as heartbeat:
+                try:
+                    settings = parse_melody_run_commands(job.segments)
+                    if get_recipe_pattern_hashes(settings) != json.loads(pattern_hashes):
+                        raise ValueError("the pattern files of " + worker + " are not the ones the job was queued "
+                                         "with: " + pattern_hashes)
+                    melody = generate_batch_job(job)
+                    midi_bytes = midi_to_bytes(build_midi_file(melody, melody.beat_count))
+                except SystemExit:
+                    error = "the run commands stopped with an error, see the output of " + worker
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+            if error is None and not heartbeat.lost:
+                try:
+                    write_output_bytes(job.output_filename, midi_bytes)
+                except OSError as e:
+                    error = str(e)
+
+            metric_job_seconds.observe(time.perf_counter() - start)
+            if error is not None:
+                metric_jobs_failed.inc()
+            if not finish_work_queue_job(connection, job_id, worker, job.output_filename, error):
+                print("LOST THE LEASE OF JOB " + str(job_id) + ", another worker generates it")
+            elif error is None:
+                done += 1
+                print("JOB " + str(job_id) + " DONE: " + str(job.output_filename))
+            else:
+                failed += 1
+                print("ERROR: job " + str(job_id) + " failed: " + error)
+
+
+def work_queue_command(segments):
+    import socket
+    print("RUNNING  ARGUMENTS FOR work_queue_command ")
+
+    # region Setting defaults
+
+    queue_name = "example"
+    lease_seconds = 60.0
+    heartbeat_seconds = 10.0
+    poll_seconds = 2.0
+    show_status = False
+    metrics_file = ""
+    metrics_address = ""
+    metrics_interval = 10.0
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-work queue':
+            i += 1
+        elif segment.startswith('-name'):
+            queue_name = segments[i][len('-name'):].strip()
+            i += 1
+        elif segment.startswith('-lease'):
+            lease_seconds = float(segments[i][len('-lease'):].strip())
+            i += 1
+        elif segment.startswith('-heartbeat'):
+            heartbeat_seconds = float(segments[i][len('-heartbeat'):].strip())
+            i += 1
+        elif segment.startswith('-poll'):
+            poll_seconds = float(segments[i][len('-poll'):].strip())
+            i += 1
+        elif segment.startswith('-status'):
+            show_status = True
+            i += 1
+        elif segment.startswith('-metrics_file'):
+            metrics_file = segments[i][len('-metrics_file'):].strip()
+            i += 1
+        elif segment.startswith('-metrics_address'):
+            metrics_address = segments[i][len('-metrics_address'):].strip()
+            i += 1
+        elif segment.startswith('-metrics_interval'):
+            metrics_interval = float(segments[i][len('-metrics_interval'):].strip())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    print("name=" + str(queue_name))
+    print("lease=" + str(lease_seconds))
+    print("heartbeat=" + str(heartbeat_seconds))
+    print("poll=" + str(poll_seconds))
+    print("status=" + str(show_status))
+    print("metrics_file=" + str(metrics_file))
+    print("metrics_address=" + str(metrics_address))
+    print("metrics_interval=" + str(metrics_interval))
+
+    # endregion
+
+    # region Error checking
+
+    if not Path(get_work_queue_path(queue_name)).exists():
+        print("ERROR: there is no work queue " + get_work_queue_path(queue_name) +
+              ", jobs are queued with -generate batch -work_queue " + queue_name)
+        sys.exit(1)
+
+    if heartbeat_seconds <= 0 or lease_seconds <= heartbeat_seconds:
+        print("ERROR: -heartbeat must be above 0 and below -lease")
+        sys.exit(1)
+
+    if poll_seconds <= 0 or metrics_interval <= 0:
+        print("ERROR: -poll and -metrics_interval must be above 0")
+        sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    if not show_status:
+        worker = socket.gethostname() + ":" + str(os.getpid())
+        print("WORKER " + worker + " STARTED")
+        exporter = MetricsExporter(metrics_file, metrics_address, metrics_interval)
+        exporter.start()
+        start = time.perf_counter()
+        try:
+            done, failed = run_work_queue_worker(queue_name, worker, lease_seconds, heartbeat_seconds,
+                                                 poll_seconds)
+        finally:
+            exporter.stop()
+        print("WORKER " + worker + " FINISHED: " + str(done) + " DONE, " + str(failed) + " FAILED ATTEMPTS")
+        print_throughput(time.perf_counter() - start)
+
+    with closing(open_work_queue(queue_name)) as connection:
+        counts = get_work_queue_counts(connection)
+        print("QUEUE " + get_work_queue_path(queue_name))
+        for status, count in counts.items():
+            print("     " + status + "=" + str(count))
+        for job_id, job_index, error in connection.execute("SELECT id, job_index, error FROM jobs "
+                                                           "WHERE status = 'failed' ORDER BY id"):
+            print("     failed job " + str(job_id) + " (line " + str(job_index) + "): " + str(error))
+
+    # endregion
+
+
+# endregion
+
+# region Startup benchmark
+
+
+def parse_import_times(lines, module_name):
+    """
+    Reads the '-X importtime' lines of an import of module_name. Returns (cumulative microseconds of the module,
+    (name, cumulative microseconds)[] of the modules it imported itself).
+    """
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        entries.append((len(name) - len(name.lstrip()), name.strip(), int(parts[1])))
+
+    for i in range(len(entries)):
+        if entries[i][0] == 1 and entries[i][1] == module_name:
+            # the modules it imported are listed before it, one level deeper, back to the previous top level entry
+            imported = []
+            j = i - 1
+            while j >= 0 and entries[j][0] > 1:
+                if entries[j][0] == 3:
+                    imported.append((entries[j][1], entries[j][2]))
+                j -= 1
+            return entries[i][2], imported
+    return None, []
+
+
+# the script that starts the program by importing this module
+LAUNCHER_FILE_NAME = "MIDIMelodyGenerator.py"
+
+
+def benchmark_startup_command(segments):
+    import subprocess
+    print("RUNNING  ARGUMENTS FOR benchmark_startup_command ")
+
+    # region Setting defaults
+
+    runs = 5
+    budget_ms = 150
+    top_count = 10
+
+    # endregion
+
+    # region reading command arguments
+
+    i = 0
+    while i < len(segments):
+        segment = segments[i].strip()
+
+        if segment == '-benchmark startup':
+            i += 1
+        elif segment.startswith('-runs'):
+            runs = int(segments[i][len('-runs'):].strip())
+            i += 1
+        elif segment.startswith('-budget_ms'):
+            budget_ms = float(segments[i][len('-budget_ms'):].strip())
+            i += 1
+        elif segment.startswith('-top'):
+            top_count = int(segments[i][len('-top'):].strip())
+            i += 1
+        else:
+            print(f"Warning: Unrecognized command: {segment}")
+            i += 1
+
+    print("runs=" + str(runs))
+    print("budget_ms=" + str(budget_ms))
+    print("top=" + str(top_count))
+
+    # endregion
+
+    # region Error checking
+
+    if runs < 1:
+        print("ERROR: -runs must be at least 1")
+        sys.exit(1)
+
+    # endregion
+
+    # region Running command
+
+    # the program is started the way a user starts it, through the launcher script without any command, so it
+    # imports this module and only shows the instructions
+    module_path = Path(os.path.abspath(__file__))
+    module_name = module_path.stem
+    launcher_path = module_path.parent / LAUNCHER_FILE_NAME
+    results = []
+    for run in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", str(launcher_path)],
+                                 cwd=str(module_path.parent), capture_output=True, text=True)
+        wall_ms = (time.perf_counter() - start) * 1000
+        if process.returncode != 0:
+            print("ERROR: running " + LAUNCHER_FILE_NAME + " failed:\n" + process.stderr)
+            sys.exit(1)
+        import_microseconds, imported = parse_import_times(process.stderr.splitlines(), module_name)
+        if import_microseconds is None:
+            print("ERROR: no import time was reported for " + module_name)
+            sys.exit(1)
+        results.append((import_microseconds / 1000, wall_ms, imported))
+        print("run " + str(run + 1) + ": import_ms=" + format(import_microseconds / 1000, ".1f") +
+              ", process_ms=" + format(wall_ms, ".1f"))
+
+    results.sort(key=lambda result: result[0])
+    import_ms, wall_ms, imported = results[len(results) // 2]
+    print("BENCHMARK FINISHED")
+    print("     median_import_ms=" + format(import_ms, ".1f"))
+    print("     median_run_process_ms=" + format(wall_ms, ".1f"))
+    print("     slowest imports of the median run:")
+    for name, microseconds in sorted(imported, key=lambda entry: -entry[1])[:top_count]:
+        print("       " + name + " " + format(microseconds / 1000, ".1f") + " ms")
+
+    if import_ms > budget_ms:
+        print("ERROR: importing took " + format(import_ms, ".1f") + " ms, over the -budget_ms of " +
+              str(budget_ms) + " ms")
+        sys.exit(1)
+
+    # endregion
+
+
+# endregion
+
+# region User prompts
+
+def show_instructions():
+    global scales
+    help_text = "\n\nWelcome to the MIDI Melody Generator, a program that allows for generation\n " \
+                "of MIDI files based on input parameters.\n\n"
+    help_text += "-----------------------------------------------------\n"
+    help_text += "Getting started:\n\n"
+    help_text += "This program is run by run parameters and data files. To get started\n"
+    help_text += "first look at the example data files inside the folders:\n"
+    help_text += "   direction_patterns, direction_probabilities, and time_patterns.\n"
+    help_text += "direction_probabilities folder contains data for how direction_patterns are generated.\n"
+    help_text += "direction_patterns folder contains data that determines how the generator travels\n"
+    help_text += "around the scale.\n"
+    help_text += "time_patterns folder contains data that determines how long beats and rests last.\n"
+    help_text += "scales folder contains extra scales that can be used with -scale.\n"
+    help_text += "\nThe '-generate direction pattern' command shown below can be used to assist with generation of \n"
+    help_text += "the direction_patterns. Both time_patterns and direction_patterns can also be taken from existing MIDI\n"
+    help_text += "files with the '-extract patterns' command.\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+
+    help_text += "Generate Melody Run Command: \n\n"
+    help_text += "  # 1. Command starts with this -----------------------------------------------------------------\n"
+    help_text += "  -generate melody\n" \
+                 "  # 2. Setting the musical scale to use ---------------------------------------------------------\n" \
+                 "  -scale scale_name (default 'major', see below for all options.)\n" \
+                 "  # 3. Setting the key to play in ---------------------------------------------------------------\n" \
+                 "  -key keyname (default 'C', see below for all options.)\n" \
+                 "  # 4. Setting the octave to start in -----------------------------------------------------------\n" \
+                 "  -octave number (default '3')\n" \
+                 "  # 5.1 Option A Setting the direction patterns filename if using your own data. ----------------\n" \
+                 "  -directions filename min_to_use max_to_use (default 'example 1 3')\n" \
+                 "           NOTE: This is for using your own direction_patterns data only. Use\n" \
+                 "           '-direction_probabilities' instead to auto generate data. \n" \
+                 "  # 5.2 Option B Setting the direction pattern probabilities file to use to  --------------------\n" \
+                 "  # auto generate data. The numbers are for pattern size and count.\n" \
+                 "  -direction_probabilities filename pattern_size pattern_count (default 'example 8 60')\n" \
+                 "           NOTE: This overwrites the '-directions' command.\n" \
+                 "  # 6.1 Option A Setting the time patterns filename if using your own data. ---------------------\n" \
+                 "  -times filename min_to_use max_to_use (default 'example 1 3')\n" \
+                 "  # 6.2 Option B Setting the time pattern probabilities file to use to --------------------------\n" \
+                 "  # auto generate data. The numbers are for pattern size and count.\n" \
+                 "  -time_probabilities filename pattern_size pattern_count (default 'example' 8 60)\n" \
+                 "           NOTE: This overwrites the '-times' command.\n" \
+                 "  # 6.3 Option C Picking patterns from a pattern database instead of a file ----------------------\n" \
+                 "  -direction_query database conditions (no default, e.g. 'example max_jump <= 2, range_size < 5')\n" \
+                 "  -time_query database conditions (no default, e.g. 'example syncopation > 0.25')\n" \
+                 "           NOTE: These overwrite the '-directions' and '-times' commands.\n" \
+                 "  # 7. Setting the ouput file name with appears in the output folder ----------------------------\n" \
+                 "  -output_file filename (default 'melody_generated')\n" \
+                 "  # 8. Setting the % of the notes in the scale to use in generation.-----------------------------\n" \
+                 "  -scale_percentage value (by default 1, must be between 0.0 and 1.0)\n" \
+                 "  # 9. Setting the seed to use for generation if needed. ----------------------------------------\n" \
+                 "  -seed value (default uses a random number)\n" \
+                 "  # 10. Adding random keys from outside of the scale if needed. ---------------------------------\n" \
+                 "  -add_random_keys amount (default 0)\n" \
+                 "  # 11. Adding specific key to the scale by force, can be used multiple times for different keys.\n" \
+                 "  -add_extra_key keyname (no default)\n" \
+                 "  # 12. Rendering the same melody into many keys, scales and octaves at once (fan out). -----------\n" \
+                 "  -fan_out_keys keyname keyname ... (or 'all', by default only the '-key' value)\n" \
+                 "  -fan_out_scales scale_name scale_name ... (or 'all', by default only the '-scale' value)\n" \
+                 "  -fan_out_octaves number number ... (by default only the '-octave' value)\n" \
+                 "  -fan_out_output files|multitrack (default 'files', multitrack takes at most 15 targets)\n" \
+                 "  # 13. Keeping every note between a lowest and highest MIDI note.\n" \
+                 "  -min_note number (0 to 127, default no limit)\n" \
+                 "  -max_note number (0 to 127, default no limit)\n" \
+                 "  # 14. Generating many candidate melodies and only keeping the best scoring ones.\n" \
+                 "  -candidates amount (default 1)\n" \
+                 "  -keep amount (default 1)\n" \
+                 "  -metric range|steps|interval_entropy|tonic_ending weight (default all with weight 1)\n" \
+                 "  # 15. Writing variations of the generated melody as well.\n" \
+                 "  -variation_file file_name (the file inside the variations folder, default none)\n" \
+                 "  # 16. Storing the melody as a recipe to generate later, instead of generating it now.\n" \
+                 "  -recipe_store name (the file inside the recipe_stores folder, default none)\n" \
+                 "  # 17. Stopping generating when input can never finish a melody.\n" \
+                 "  -step_budget amount (default 200000. the most notes planned or pattern values rolled)\n" \
+                 "  -time_budget seconds (default 0, no limit)\n" \
+                 "  # 18. Option D Walking pitch patterns (semitone changes) from the key instead of the scale.\n" \
+                 "  -pitches filename min_to_use max_to_use (no default, e.g. 'example 1 3')\n" \
+                 "  -length_seconds seconds (default 0, the usual 8 beats at 90 bpm)\n" \
+                 "           NOTE: This replaces the scale and the directions, the times are still used.\n" \
+                 "-------------------------------------------------------------------------------------------------\n" \
+                 "\n" \
+                 "Starting with '-generate melody', enter command after command on a single line.\n\n" \
+                 "The times file must exist inside the 'time_patterns' folder, and the directions file must exist\n" \
+                 "inside the 'direction_patterns' folder. That is unless using the auto generation functions. " \
+                 " \n\n"
+
+    help_text += get_all_scale_values_print()
+    help_text += "\n"
+
+    help_text += get_all_key_values_print()
+    help_text += "\n"
+
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Generate Direction Pattern Run Command: \n\n"
+    help_text += "-generate direction pattern\n" \
+                 "commands:\n" \
+                 "  -probabilities file_name (default 'example'. the file inside the\n " \
+                 "     direction_probabilities folder)\n" \
+                 "  -size number (default 8. the size of each generated pattern.)\n" \
+                 "  -patterns number (default 60. the number of patterns to generate.)\n" \
+                 "\n" \
+                 "Starting with '-generate direction pattern', enter command after command on a single line.\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Import Patterns Run Command: \n\n"
+    help_text += "-import patterns\n" \
+                 "commands:\n" \
+                 "  -database name (default 'example'. the file inside the pattern_databases folder)\n" \
+                 "  -directions file_name (the file inside the direction_patterns folder, can be used multiple times)\n" \
+                 "  -times file_name (the file inside the time_patterns folder, can be used multiple times)\n" \
+                 "\n" \
+                 "Direction pattern query columns: " + ", ".join(DIRECTION_PATTERN_COLUMNS) + "\n" \
+                 "Time pattern query columns: " + ", ".join(TIME_PATTERN_COLUMNS) + "\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Learn Probabilities Run Command: \n\n"
+    help_text += "-learn probabilities\n" \
+                 "commands:\n" \
+                 "  -corpus folder (default 'corpus'. the folder of .mid files to learn from, sub folders are included)\n" \
+                 "  -scale scale_name (default 'major'. every note is moved to the nearest key of this scale)\n" \
+                 "  -key keyname (default 'C')\n" \
+                 "  -output name (default 'learned'. the name of the probability files written)\n" \
+                 "  -max_jump number (default 7. larger jumps around the scale are counted as this size)\n" \
+                 "  -workers number (default is the number of CPU cores. the processes reading MIDI files)\n" \
+                 "  -chunk_size number (default 16. the MIDI files handed to a worker at a time)\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Tune Probabilities Run Command: \n\n"
+    help_text += "-tune probabilities\n" \
+                 "commands:\n" \
+                 "  -type direction|time (default 'direction')\n" \
+                 "  -probabilities file_name (default 'example'. the file to start from)\n" \
+                 "  -output name (default 'tuned'. the name of the probability file written)\n" \
+                 "  -target statistic value (can be used multiple times, at least once)\n" \
+                 "      direction: average_leap, stay_ratio, up_ratio. time: average_beats, rest_density, average_rest\n" \
+                 "  -notes number (default 1000000. notes simulated each round)\n" \
+                 "  -size number (default 8. notes in each simulated pattern)\n" \
+                 "  -patterns number (default 60. patterns in each simulated file)\n" \
+                 "  -rounds number (default 20. the most rounds of changing the weights)\n" \
+                 "  -tolerance number (default 0.01. how close to the targets is close enough, 0.01 is 1%)\n" \
+                 "  -verify number (default 0. pattern files to generate from the result to check the simulation)\n" \
+                 "  -seed value (default uses a random number)\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Extract Patterns Run Command: \n\n"
+    help_text += "-extract patterns\n" \
+                 "commands:\n" \
+                 "  -corpus folder (default 'corpus'. the folder of .mid files to extract from, sub folders are included)\n" \
+                 "  -scale scale_name (default 'major'. every note is moved to the nearest key of this scale)\n" \
+                 "  -key keyname (default 'C')\n" \
+                 "  -output name (default 'extracted'. the name of the pattern files written)\n" \
+                 "  -phrase_notes number (default 8. the number of notes in each extracted pattern)\n" \
+                 "  -workers number (default is the number of CPU cores. the processes reading MIDI files)\n" \
+                 "  -chunk_size number (default 16. the MIDI files handed to a worker at a time)\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Generate Ensemble Run Command: \n\n"
+    help_text += "-generate ensemble\n" \
+                 "commands:\n" \
+                 "  -output_file filename (default 'ensemble_generated'. the file written to the output folder)\n" \
+                 "  -seed value (default uses a random number. every voice gets a seed drawn from it)\n" \
+                 "  -workers number (default 4. threads generating the voices)\n" \
+                 "  -voice name (starts a voice, every command after it up to the next '-voice' belongs to it)\n" \
+                 "\n" \
+                 "Every voice takes the '-generate melody' run commands, the ones before the first '-voice' are\n" \
+                 "used by every voice. All voices are written as tracks of one MIDI file sharing a tempo track,\n" \
+                 "each on its own channel, skipping the drum channel 10, so there can be up to 15 voices.\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Stream Melody Run Command: \n\n"
+    help_text += "-stream melody\n" \
+                 "commands:\n" \
+                 "  -to stdout|unix:path|tcp:[host:]port (default 'stdout'. where the raw MIDI bytes are sent)\n" \
+                 "  -count number (default 1. melodies streamed one after another, 0 streams until Ctrl+C)\n" \
+                 "  -seed value (default uses a random number. the first melody's seed, the rest are drawn from it)\n" \
+                 "  -buffer number (default 512. the most note events generated ahead of playback)\n" \
+                 "  -spin milliseconds (default 1. time before each event spent busy waiting instead of sleeping)\n" \
+                 "  -connect_timeout seconds (default 10. how long to try connecting to a socket)\n" \
+                 "  -report name (save the scheduled and sent time of every event to output/<name>.stream.json)\n" \
+                 "\n" \
+                 "Every other command is a '-generate melody' run command of the streamed melodies.\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Receive MIDI Run Command: \n\n"
+    help_text += "-receive midi\n" \
+                 "commands:\n" \
+                 "  -from stdin|unix:path|tcp:[host:]port (default 'tcp:5555'. where to listen for a stream)\n" \
+                 "  -report name (default 'received'. the events are saved to output/<name>.received.json)\n" \
+                 "  -expect name (compare the arrivals with the schedule in output/<name>.stream.json)\n" \
+                 "  -accept_timeout seconds (default 30. how long to wait for a stream to connect)\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Generate Batch Run Command: \n\n"
+    help_text += "-generate batch\n" \
+                 "commands:\n" \
+                 "  -batch_file file_name (default 'example'. the file inside the batches folder)\n" \
+                 "  -generator_workers number (default 2. threads that generate melodies into MIDI buffers.)\n" \
+                 "  -writer_workers number (default 2. threads that write finished MIDI buffers to the output folder.)\n" \
+                 "  -queue_size number (default 8. the most finished MIDI buffers that can wait to be written.)\n" \
+                 "  -dedup off|flag|drop (default 'off'. what to do with melodies that nearly repeat an earlier one.)\n" \
+                 "  -dedup_threshold number (default 0.8. similarity from 0 to 1 from which a melody is a repeat.)\n" \
+                 "  -recipe_store name (store every job as a recipe in recipe_stores/<name>.db instead of generating)\n" \
+                 "  -processes number (default 0. above 0, worker processes generate instead of the generator workers)\n" \
+                 "  -memory_report (measure the memory of every stage of every job into output/<batch>.memory.json)\n" \
+                 "  -memory_budget megabytes (turns on -memory_report, fails when the process used more memory)\n" \
+                 "  -watch (after the batch, keep regenerating the jobs whose files change, until Ctrl+C)\n" \
+                 "  -watch_interval number (default 0.5. seconds between file checks where inotify can not be used)\n" \
+                 "  -debounce number (default 0.3. seconds without changes to wait for before regenerating)\n" \
+                 "  -work_queue name (put every job into work_queues/<name>.db for -work queue workers instead)\n" \
+                 "  -max_attempts number (default 3. times a queued job is tried before it counts as failed)\n" \
+                 "  -metrics_file path (write the metrics in the Prometheus text format to this file)\n" \
+                 "  -metrics_address [host:]port (serve the metrics on http://host:port/metrics while running)\n" \
+                 "  -metrics_interval number (default 10. seconds between rewrites of -metrics_file)\n" \
+                 "  -export off|csv|npy|npz|arrow (default 'off'. also write the notes of every melody as columns)\n" \
+                 "  -export_only (write only the -export columns, no MIDI files)\n" \
+                 "  -export_chunk_rows number (default 65536. rows written at a time, and the rows in each CSV file)\n" \
+                 "\n" \
+                 "Each line of a batch file holds the run commands of one melody. Queue depth and stall times are\n" \
+                 "saved to output/<batch name>.timing.json.\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Work Queue Run Command: \n\n"
+    help_text += "-work queue\n" \
+                 "commands:\n" \
+                 "  -name name (default 'example'. the queue inside the work_queues folder)\n" \
+                 "  -lease number (default 60. seconds a taken job belongs to the worker)\n" \
+                 "  -heartbeat number (default 10. seconds between extending the lease of the job being generated)\n" \
+                 "  -poll number (default 2. seconds between looking for jobs while other workers hold the rest)\n" \
+                 "  -status (only print how many jobs are pending, leased, done and failed)\n" \
+                 "  -metrics_file path (write the metrics of the worker in the Prometheus text format to this file)\n" \
+                 "  -metrics_address [host:]port (serve the metrics on http://host:port/metrics while running)\n" \
+                 "  -metrics_interval number (default 10. seconds between rewrites of -metrics_file)\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Render Recipes Run Command: \n\n"
+    help_text += "-render recipes\n" \
+                 "commands:\n" \
+                 "  -store name (default 'example'. the file inside the recipe_stores folder)\n" \
+                 "  -ids id id ... (or 'all'. the recipes to generate into the output folder)\n" \
+                 "  -cache_size number (default 128. the most recently rendered recipes kept in memory)\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+    help_text += "Benchmark Startup Run Command: \n\n"
+    help_text += "-benchmark startup\n" \
+                 "commands:\n" \
+                 "  -runs number (default 5. times the program is started, the median is used)\n" \
+                 "  -budget_ms number (default 150. fails when importing the program takes longer)\n" \
+                 "  -top number (default 10. the slowest imports that are shown)\n"
+    help_text += "-------------------------------------------------------------------------------------------------\n"
+
+    # leave here for creating more elements here
+    # help_text += "Command    \n"
+    # help_text += "     -mode \n"
+    # help_text += "Description:\n"
+    # help_text += "     -d is the \n"
+
+    print(help_text)
+
+
+
+# endregion
+
+
+
+
+def run_program(arguments):
+    """ Runs the command line arguments, MIDIMelodyGenerator.py starts the program with this """
+    # the instructions are only built and shown when no command is given
+    if len(arguments) > 2:
+        try:
+            main_function(arguments)
+        except GenerationStopped as e:
+            print("ERROR: " + str(e))
+            sys.exit(1)
+    else:
+        show_instructions()
+
+    exit(0)
+
+
+if __name__ == '__main__':
+
+    # region (Not implemented yet) using command line parameters for running
+
+    run_program(sys.argv)
+
+    # Check if the correct number of command-line arguments is provided
+    # if len(sys.argv) < 2:
+    #     print("Usage: python script.py <file_path>")
+    #     sys.exit(1)  # Exit with an error code
+
+    # Get the file path from the command-line argument and load patterns
+    # file_path = "time_patterns/" + sys.argv[1]
+
+    # Check if the file exists (currently parameters are not used, so not implemented)
+
+    # if not os.path.isfile(file_path):
+    #     print(f"Error: File '{file_path}' not found.")
+    #     sys.exit(1)  # Exit with an error code
+
+    # endregion
+
+    # region 0. Other stuff
+
+    # region 0.1 Generate Direction Patterns
+
+    do_this = False
+    if do_this:
+        # region Main
+        '''
+        # getting probabilities of each step's outcome
+        probabilities = get_direction_probabilities("example")
+
+        # number of values in the pattern
+        pattern_count = 60
+        # number of values in the pattern
+        pattern_size = 8
+
+        weights = []
+        total_weight = 0
+        for x in probabilities:
+            total_weight += x[1]
+            weights.append(total_weight)
+
+        for i in range(pattern_count):
+            pattern = [0]
+            j = 0
+            while j < pattern_size:
+                reset = False
+                rand_number = random.uniform(0.0, total_weight)
+                last_move = 0
+                # checking which value to use next
+                for w in range(len(weights)):
+                    if rand_number < weights[w]:
+                        value = probabilities[w][0]
+
+                        # region Wildcards
+
+                        # repeat last move wildcard, which moves in the same direction again
+                        if value == 9999:
+                            # in this case the wildcard will not be viable, try another roll
+                            if i == 0:
+                                reset = True
+                                break
+                            else:
+                                # repeat the last move
+                                pattern.append(pattern[len(pattern) - 1])
+                                # print("WILDCARD 0 WAS USED")
+
+                        # endregion
+
+                        # standard, just add the value found
+                        else:
+                            pattern.append(probabilities[w][0])
+
+                        break
+
+                # if resetting, continue and try again
+                if reset:
+                    continue
+
+                j += 1
+
+            print("pattern=Pattern " + str(i))
+            print(' '.join(map(str, pattern)) + "\n")
+        '''
+        # endregion
+
+    # endregion
+
+    # endregion
+
+    # region Try 1: scale to midi example
+
+    do_this = False
+    if do_this:
+        scale_to_midi_example('scale_example', 'minor', Key.A, 2)
+
+    # endregion
+
+    # region Try 2: generate_from_time_and_pitch_patterns
+    ''' This method works okay, although it was a cheap shortcut and not much better then
+     just using music AI. My original idea of using scales is better, I may still use the time 
+     patterns. But the pitch patterns that ChatGPT gives are not the best, its almost like
+     they all come from stock music themselves. '''
+
+    do_this = False
+    if do_this:
+        # this will only work when both files have the same name
+        patterns_to_use = "example"
+        generate_from_time_and_pitch_patterns('melody_generated',
+                                              # in the key of
+                                              Key.C,
+                                              # starting octave
+                                              4,
+                                              # max length in seconds
+                                              60,
+                                              # seed
+                                              random.randint(100000000, 999999999),
+                                              # time patterns file ---------------------
+                                              patterns_to_use,
+                                              [1, 3],  # ^^ min to max possible to use
+                                              # pitch patterns file --------------------
+                                              patterns_to_use,
+                                              [1, 3],  # ^^ min to max possible to use
+                                              )
+
+    # endregion
+
+    # region Try 3: generate_from_scale_and_direction_patterns
+
+    # -generate melody -scale mixolydian -key C -octave 4 -times germaniccelticanglo 1 3 -directions tiny_jumps 2 6 -sp 0.4
+
+    # -generate melody
+    # mandatory commands:
+    #   -scale scale_name
+    #   -key keyname
+    #   -octave number
+    #   -d filename min_to_use max_to_use
+    #   -t filename min_to_use max_to_use
+    # optional commands:
+    #   -sp value (scale percentage, by default 1, between 0.0 and 1.0)
+    #   -seed value (random by default, or 0 for random if using an output filename and a random seed)
+    #   -output_file filename
+
+    # endregion